@@ -0,0 +1,165 @@
+"""partition edges by network
+
+Revision ID: 3d81c5f07a6e
+Revises: 7f4c09b3e8a2
+Create Date: 2026-10-16 17:55:43.602117
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+# revision identifiers, used by Alembic.
+revision: str = "3d81c5f07a6e"
+down_revision: Union[str, None] = "7f4c09b3e8a2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# fixed at migration time; changing it means repartitioning the table
+EDGE_PARTITIONS = 16
+
+COLUMNS = """id, network_version_id, geom, properties, created_at,
+             network_id, valid_from, valid_to, source_node, target_node"""
+
+
+def _create_edges(partitioned: bool) -> None:
+    op.execute(
+        f"""
+        CREATE TABLE edges (
+            id uuid NOT NULL DEFAULT gen_random_uuid(),
+            network_version_id uuid {"" if partitioned else "NOT NULL"},
+            geom geometry(LINESTRING, 4326) NOT NULL,
+            properties jsonb NOT NULL DEFAULT '{{}}'::jsonb,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            content_hash bytea NOT NULL GENERATED ALWAYS AS
+                (digest(ST_AsHEXEWKB(geom) || properties::text, 'sha256')) STORED,
+            geom_hash bytea NOT NULL GENERATED ALWAYS AS
+                (digest(ST_AsHEXEWKB(geom), 'sha256')) STORED,
+            network_id uuid {"NOT NULL" if partitioned else ""},
+            valid_from timestamptz,
+            valid_to timestamptz,
+            source_node bigint,
+            target_node bigint
+        ) {"PARTITION BY HASH (network_id)" if partitioned else ""}
+    """
+    )
+
+
+def _create_edge_indexes(delta: str) -> None:
+    # delta: predicate telling delta-stored rows apart from full-version rows
+    op.create_foreign_key(
+        "edges_network_version_id_fkey",
+        "edges",
+        "network_versions",
+        ["network_version_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_foreign_key(
+        "fk_edges_network",
+        "edges",
+        "networks",
+        ["network_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_index("ix_edges_geom", "edges", ["geom"], postgresql_using="gist")
+    op.create_index("ix_edges_version", "edges", ["network_version_id"])
+    op.create_index(
+        "ix_edges_delta_live",
+        "edges",
+        ["network_id", "content_hash"],
+        postgresql_where=sa.text(f"{delta} AND valid_to IS NULL"),
+    )
+    op.create_index(
+        "ix_edges_delta_window",
+        "edges",
+        ["network_id", "valid_from"],
+        postgresql_where=sa.text(delta),
+    )
+    op.create_index(
+        "ix_edges_delta_closed",
+        "edges",
+        ["network_id", "valid_to"],
+        postgresql_where=sa.text(f"{delta} AND valid_to IS NOT NULL"),
+    )
+
+
+def upgrade() -> None:
+    # edges becomes HASH-partitioned on network_id, so every row needs one: rows of
+    # full versions get their version's network, and delta rows are told apart by
+    # valid_from instead of network_id. Delta rows may outlive the version that
+    # introduced them (retention), so network_version_id is only required for full rows.
+    op.execute("ALTER TABLE edges RENAME TO edges_unpartitioned")
+    _create_edges(partitioned=True)
+    for i in range(EDGE_PARTITIONS):
+        op.execute(
+            f"CREATE TABLE edges_p{i} PARTITION OF edges"
+            f" FOR VALUES WITH (MODULUS {EDGE_PARTITIONS}, REMAINDER {i})"
+        )
+    op.execute(
+        f"""
+        INSERT INTO edges ({COLUMNS})
+        SELECT e.id, e.network_version_id, e.geom, e.properties, e.created_at,
+               v.network_id, e.valid_from, e.valid_to, e.source_node, e.target_node
+          FROM edges_unpartitioned e
+          JOIN network_versions v ON v.id = e.network_version_id
+    """
+    )
+    op.execute("DROP TABLE edges_unpartitioned")
+
+    # a partitioned table's primary key must contain the partition key
+    op.create_primary_key("edges_pkey", "edges", ["id", "network_id"])
+    op.create_check_constraint(
+        "ck_edge_window",
+        "edges",
+        "valid_to IS NULL OR (valid_from IS NOT NULL AND valid_to > valid_from)",
+    )
+    op.create_check_constraint(
+        "ck_edge_version",
+        "edges",
+        "network_version_id IS NOT NULL OR valid_from IS NOT NULL",
+    )
+    _create_edge_indexes("valid_from IS NOT NULL")
+
+    # per-network retention policy (NULL: keep everything)
+    op.add_column("networks", sa.Column("retain_versions", sa.Integer(), nullable=True))
+    op.add_column(
+        "networks",
+        sa.Column("retain_for", pg.INTERVAL(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("networks", "retain_for")
+    op.drop_column("networks", "retain_versions")
+
+    op.execute("ALTER TABLE edges RENAME TO edges_partitioned")
+    _create_edges(partitioned=False)
+    # rows whose version was removed by retention go to the oldest remaining one
+    op.execute(
+        f"""
+        INSERT INTO edges ({COLUMNS})
+        SELECT id,
+               COALESCE(network_version_id, (
+                   SELECT v.id FROM network_versions v
+                    WHERE v.network_id = p.network_id
+                    ORDER BY v.valid_from LIMIT 1)),
+               geom, properties, created_at,
+               CASE WHEN valid_from IS NOT NULL THEN network_id END,
+               valid_from, valid_to, source_node, target_node
+          FROM edges_partitioned p
+    """
+    )
+    op.execute("DROP TABLE edges_partitioned")
+
+    op.create_primary_key("edges_pkey", "edges", ["id"])
+    op.create_check_constraint(
+        "ck_edge_window",
+        "edges",
+        "network_id IS NULL OR (valid_from IS NOT NULL"
+        " AND (valid_to IS NULL OR valid_to > valid_from))",
+    )
+    _create_edge_indexes("network_id IS NOT NULL")
@@ -0,0 +1,87 @@
+"""delta versioning
+
+Revision ID: 4b7e1d2a9f30
+Revises: c52a3952ac29
+Create Date: 2026-10-16 09:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+# revision identifiers, used by Alembic.
+revision: str = "4b7e1d2a9f30"
+down_revision: Union[str, None] = "c52a3952ac29"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # network_versions: how the version stores its edges
+    op.add_column(
+        "network_versions",
+        sa.Column(
+            "storage", sa.Text(), server_default=sa.text("'full'"), nullable=False
+        ),
+    )
+    op.create_check_constraint(
+        "ck_version_storage", "network_versions", "storage IN ('full', 'delta')"
+    )
+
+    # edges: content address + validity window (set only for delta-stored edges)
+    op.add_column(
+        "edges",
+        sa.Column(
+            "content_hash",
+            pg.BYTEA(),
+            sa.Computed("digest(ST_AsHEXEWKB(geom) || properties::text, 'sha256')"),
+            nullable=False,
+        ),
+    )
+    op.add_column("edges", sa.Column("network_id", pg.UUID(as_uuid=True)))
+    op.add_column("edges", sa.Column("valid_from", pg.TIMESTAMP(timezone=True)))
+    op.add_column("edges", sa.Column("valid_to", pg.TIMESTAMP(timezone=True)))
+    op.create_foreign_key(
+        "fk_edges_network",
+        "edges",
+        "networks",
+        ["network_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_check_constraint(
+        "ck_edge_window",
+        "edges",
+        "network_id IS NULL OR (valid_from IS NOT NULL"
+        " AND (valid_to IS NULL OR valid_to > valid_from))",
+    )
+    # live delta edges, matched by content on every update
+    op.create_index(
+        "ix_edges_delta_live",
+        "edges",
+        ["network_id", "content_hash"],
+        postgresql_where=sa.text("network_id IS NOT NULL AND valid_to IS NULL"),
+    )
+    # time-travel over delta edges
+    op.create_index(
+        "ix_edges_delta_window",
+        "edges",
+        ["network_id", "valid_from"],
+        postgresql_where=sa.text("network_id IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_edges_delta_window", table_name="edges")
+    op.drop_index("ix_edges_delta_live", table_name="edges")
+    op.drop_constraint("ck_edge_window", "edges", type_="check")
+    op.drop_constraint("fk_edges_network", "edges", type_="foreignkey")
+    op.drop_column("edges", "valid_to")
+    op.drop_column("edges", "valid_from")
+    op.drop_column("edges", "network_id")
+    op.drop_column("edges", "content_hash")
+
+    op.drop_constraint("ck_version_storage", "network_versions", type_="check")
+    op.drop_column("network_versions", "storage")
@@ -0,0 +1,116 @@
+"""version stats
+
+Revision ID: 5a8e2f61c9d4
+Revises: e1f0a7c4d2b8
+Create Date: 2026-10-16 14:21:30.116482
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+# revision identifiers, used by Alembic.
+revision: str = "5a8e2f61c9d4"
+down_revision: Union[str, None] = "e1f0a7c4d2b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# edges e that belong to version v, for either storage mode
+VERSION_EDGES = """
+    (v.storage = 'full' AND e.network_version_id = v.id)
+    OR (v.storage = 'delta'
+        AND e.network_id = v.network_id
+        AND e.valid_from <= v.valid_from
+        AND (e.valid_to IS NULL OR e.valid_to > v.valid_from))
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "version_stats",
+        sa.Column("version_id", pg.UUID(as_uuid=True), nullable=False),
+        sa.Column("edge_count", sa.BigInteger(), nullable=False),
+        sa.Column("total_length_m", sa.Float(), nullable=False),
+        sa.Column("min_x", sa.Float(), nullable=True),
+        sa.Column("min_y", sa.Float(), nullable=True),
+        sa.Column("max_x", sa.Float(), nullable=True),
+        sa.Column("max_y", sa.Float(), nullable=True),
+        sa.Column(
+            "highway",
+            pg.JSONB(),
+            server_default=sa.text("'{}'::jsonb"),
+            nullable=False,
+        ),
+        sa.Column(
+            "property_keys",
+            pg.JSONB(),
+            server_default=sa.text("'{}'::jsonb"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["version_id"], ["network_versions.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("version_id"),
+    )
+
+    # backfill versions loaded before this revision
+    op.execute(
+        f"""
+        INSERT INTO version_stats
+            (version_id, edge_count, total_length_m, min_x, min_y, max_x, max_y)
+        SELECT v.id,
+               count(e.id),
+               COALESCE(sum(ST_Length(e.geom::geography)), 0),
+               ST_XMin(ST_Extent(e.geom)), ST_YMin(ST_Extent(e.geom)),
+               ST_XMax(ST_Extent(e.geom)), ST_YMax(ST_Extent(e.geom))
+          FROM network_versions v
+          LEFT JOIN edges e ON {VERSION_EDGES}
+         GROUP BY v.id
+        """
+    )
+    op.execute(
+        f"""
+        UPDATE version_stats s
+           SET highway = h.highway
+          FROM (
+                SELECT id, jsonb_object_agg(
+                           cls, jsonb_build_object('count', n, 'length_m', len)
+                       ) AS highway
+                  FROM (
+                        SELECT v.id,
+                               COALESCE(e.properties->>'highway', '') AS cls,
+                               count(*) AS n,
+                               sum(ST_Length(e.geom::geography)) AS len
+                          FROM network_versions v
+                          JOIN edges e ON {VERSION_EDGES}
+                         GROUP BY v.id, cls
+                  ) per_class
+                 GROUP BY id
+          ) h
+         WHERE s.version_id = h.id
+        """
+    )
+    op.execute(
+        f"""
+        UPDATE version_stats s
+           SET property_keys = k.property_keys
+          FROM (
+                SELECT id, jsonb_object_agg(key, n) AS property_keys
+                  FROM (
+                        SELECT v.id, key, count(*) AS n
+                          FROM network_versions v
+                          JOIN edges e ON {VERSION_EDGES}
+                          CROSS JOIN LATERAL jsonb_object_keys(e.properties) AS key
+                         GROUP BY v.id, key
+                  ) per_key
+                 GROUP BY id
+          ) k
+         WHERE s.version_id = k.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("version_stats")
@@ -0,0 +1,90 @@
+"""version validity range
+
+Revision ID: 7f4c09b3e8a2
+Revises: b62d94e0a1f5
+Create Date: 2026-10-16 16:40:05.218934
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+# revision identifiers, used by Alembic.
+revision: str = "7f4c09b3e8a2"
+down_revision: Union[str, None] = "b62d94e0a1f5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _check_versions() -> None:
+    # The constraint below cannot be added over bad history; name the rows instead of
+    # failing with a bare constraint error, and leave the repair to the operator.
+    conn = op.get_bind()
+    backwards = (
+        conn.execute(
+            sa.text(
+                """
+        SELECT id::text FROM network_versions
+         WHERE valid_to < valid_from
+         LIMIT 20
+    """
+            )
+        )
+        .scalars()
+        .all()
+    )
+    overlaps = []
+    if not backwards:
+        # the same overlap test the constraint applies
+        overlaps = conn.execute(
+            sa.text(
+                """
+            SELECT a.network_id::text, a.id::text, b.id::text
+              FROM network_versions a
+              JOIN network_versions b
+                ON b.network_id = a.network_id AND b.id > a.id
+             WHERE tstzrange(a.valid_from, a.valid_to, '[)')
+                && tstzrange(b.valid_from, b.valid_to, '[)')
+             LIMIT 20
+        """
+            )
+        ).all()
+    if not backwards and not overlaps:
+        return
+    lines = [f"version {v} ends before it starts" for v in backwards]
+    lines += [f"network {n}: versions {a} and {b} overlap" for n, a, b in overlaps]
+    raise RuntimeError(
+        "network_versions has invalid validity ranges; fix valid_from/valid_to of "
+        "these rows (at most 20 shown) and run the upgrade again:\n  "
+        + "\n  ".join(lines)
+    )
+
+
+def upgrade() -> None:
+    _check_versions()
+    # uuid equality inside a GiST index
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist;")
+    op.add_column(
+        "network_versions",
+        sa.Column(
+            "validity",
+            pg.TSTZRANGE(),
+            sa.Computed("tstzrange(valid_from, valid_to, '[)')", persisted=True),
+            nullable=False,
+        ),
+    )
+    # no two versions of a network overlap; its GiST index serves version_at
+    op.create_exclude_constraint(
+        "ex_version_validity",
+        "network_versions",
+        ("network_id", "="),
+        ("validity", "&&"),
+        using="gist",
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("ex_version_validity", "network_versions")
+    op.drop_column("network_versions", "validity")
@@ -0,0 +1,73 @@
+"""ingest jobs
+
+Revision ID: 9d3c6a0e5b17
+Revises: 4b7e1d2a9f30
+Create Date: 2026-10-16 11:40:07.552913
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+# revision identifiers, used by Alembic.
+revision: str = "9d3c6a0e5b17"
+down_revision: Union[str, None] = "4b7e1d2a9f30"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingest_jobs",
+        sa.Column(
+            "id",
+            pg.UUID(as_uuid=True),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+        sa.Column("customer_id", pg.UUID(as_uuid=True), nullable=False),
+        sa.Column("kind", sa.Text(), nullable=False),
+        sa.Column("network_name", sa.Text(), nullable=False),
+        sa.Column(
+            "status", sa.Text(), server_default=sa.text("'queued'"), nullable=False
+        ),
+        sa.Column("spool_path", sa.Text(), nullable=True),
+        sa.Column(
+            "features_parsed",
+            sa.BigInteger(),
+            server_default=sa.text("0"),
+            nullable=False,
+        ),
+        sa.Column(
+            "edges_inserted",
+            sa.BigInteger(),
+            server_default=sa.text("0"),
+            nullable=False,
+        ),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("network_id", pg.UUID(as_uuid=True), nullable=True),
+        sa.Column("version_id", pg.UUID(as_uuid=True), nullable=True),
+        sa.Column(
+            "created_at",
+            pg.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("started_at", pg.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("finished_at", pg.TIMESTAMP(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["customer_id"], ["customers.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.CheckConstraint("kind IN ('create', 'update')", name="ck_job_kind"),
+        sa.CheckConstraint(
+            "status IN ('queued', 'running', 'succeeded', 'failed')",
+            name="ck_job_status",
+        ),
+    )
+    op.create_index("ix_ingest_jobs_customer", "ingest_jobs", ["customer_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ingest_jobs_customer", table_name="ingest_jobs")
+    op.drop_table("ingest_jobs")
@@ -0,0 +1,26 @@
+"""ingest job report
+
+Revision ID: a4e8c1f9d305
+Revises: 3d81c5f07a6e
+Create Date: 2026-10-16 19:12:28.340516
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+# revision identifiers, used by Alembic.
+revision: str = "a4e8c1f9d305"
+down_revision: Union[str, None] = "3d81c5f07a6e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("ingest_jobs", sa.Column("report", pg.JSONB(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("ingest_jobs", "report")
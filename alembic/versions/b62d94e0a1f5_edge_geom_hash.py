@@ -0,0 +1,43 @@
+"""edge geom hash
+
+Revision ID: b62d94e0a1f5
+Revises: 5a8e2f61c9d4
+Create Date: 2026-10-16 15:02:18.770351
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+# revision identifiers, used by Alembic.
+revision: str = "b62d94e0a1f5"
+down_revision: Union[str, None] = "5a8e2f61c9d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # geometry-only content address, pairs property edits in version diffs
+    op.add_column(
+        "edges",
+        sa.Column(
+            "geom_hash",
+            pg.BYTEA(),
+            sa.Computed("digest(ST_AsHEXEWKB(geom), 'sha256')"),
+            nullable=False,
+        ),
+    )
+    # delta edges closed within a time window (diffs between delta versions)
+    op.create_index(
+        "ix_edges_delta_closed",
+        "edges",
+        ["network_id", "valid_to"],
+        postgresql_where=sa.text("network_id IS NOT NULL AND valid_to IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_edges_delta_closed", table_name="edges")
+    op.drop_column("edges", "geom_hash")
@@ -0,0 +1,87 @@
+"""topology nodes
+
+Revision ID: e1f0a7c4d2b8
+Revises: 9d3c6a0e5b17
+Create Date: 2026-10-16 13:05:52.904117
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+import geoalchemy2
+
+# revision identifiers, used by Alembic.
+revision: str = "e1f0a7c4d2b8"
+down_revision: Union[str, None] = "9d3c6a0e5b17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# grid used to backfill existing edges (app default TOPOLOGY_SNAP_TOLERANCE)
+BACKFILL_TOLERANCE = 1e-7
+
+
+def upgrade() -> None:
+    # nodes: snapped edge endpoints, shared by all versions of a network
+    op.create_table(
+        "nodes",
+        sa.Column("id", sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column("network_id", pg.UUID(as_uuid=True), nullable=False),
+        sa.Column("x", sa.Float(), nullable=False),
+        sa.Column("y", sa.Float(), nullable=False),
+        sa.Column(
+            "geom",
+            geoalchemy2.types.Geometry(
+                geometry_type="POINT",
+                srid=4326,
+                spatial_index=False,
+            ),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["network_id"], ["networks.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("network_id", "x", "y", name="uq_node_per_network_xy"),
+    )
+    op.create_index(
+        "ix_nodes_geom", "nodes", ["geom"], unique=False, postgresql_using="gist"
+    )
+
+    op.add_column("edges", sa.Column("source_node", sa.BigInteger(), nullable=True))
+    op.add_column("edges", sa.Column("target_node", sa.BigInteger(), nullable=True))
+
+    # backfill nodes for edges loaded before this revision
+    op.execute(
+        f"""
+        INSERT INTO nodes (network_id, x, y, geom)
+        SELECT DISTINCT v.network_id, ST_X(q.p), ST_Y(q.p), q.p
+          FROM edges e
+          JOIN network_versions v ON v.id = e.network_version_id
+          CROSS JOIN LATERAL (VALUES
+                (ST_SnapToGrid(ST_StartPoint(e.geom), {BACKFILL_TOLERANCE})),
+                (ST_SnapToGrid(ST_EndPoint(e.geom), {BACKFILL_TOLERANCE}))
+          ) AS q(p)
+        ON CONFLICT (network_id, x, y) DO NOTHING
+        """
+    )
+    op.execute(
+        f"""
+        UPDATE edges e
+           SET source_node = s.id, target_node = t.id
+          FROM network_versions v, nodes s, nodes t
+         WHERE v.id = e.network_version_id
+           AND s.network_id = v.network_id
+           AND s.x = ST_X(ST_SnapToGrid(ST_StartPoint(e.geom), {BACKFILL_TOLERANCE}))
+           AND s.y = ST_Y(ST_SnapToGrid(ST_StartPoint(e.geom), {BACKFILL_TOLERANCE}))
+           AND t.network_id = v.network_id
+           AND t.x = ST_X(ST_SnapToGrid(ST_EndPoint(e.geom), {BACKFILL_TOLERANCE}))
+           AND t.y = ST_Y(ST_SnapToGrid(ST_EndPoint(e.geom), {BACKFILL_TOLERANCE}))
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("edges", "target_node")
+    op.drop_column("edges", "source_node")
+    op.drop_index("ix_nodes_geom", table_name="nodes")
+    op.drop_table("nodes")
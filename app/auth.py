@@ -1,30 +1,116 @@
 # app/auth.py
+import hashlib
+from typing import Dict, Optional
+
 from fastapi import Depends, Header, HTTPException, status
 import sqlalchemy as sa
-from app.db import get_db
+from app.cache import TTLCache
+from app.config import (
+    API_KEY_CACHE_NEGATIVE_TTL,
+    API_KEY_CACHE_SIZE,
+    API_KEY_CACHE_TTL,
+)
+from app.db import SessionLocal, get_read_db, is_primary
+from app.metrics import CallbackGauge, stage
 
+# token_hash -> customer_id, and token hashes known to be invalid
+_valid_keys = TTLCache(API_KEY_CACHE_SIZE, API_KEY_CACHE_TTL)
+_invalid_keys = TTLCache(API_KEY_CACHE_SIZE, API_KEY_CACHE_NEGATIVE_TTL)
 
-def withApiAuth(
-    x_api_key: str | None = Header(None, alias="X-API-Key"),
-    db=Depends(get_db),
-) -> str:
-    if not x_api_key:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing API key",
-        )
-    cid = db.execute(
+
+def hash_api_key(token: str) -> str:
+    # Same digest as encode(digest(:tok, 'sha256'), 'hex') in Postgres
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def invalidate_api_key(token_hash: Optional[str] = None) -> None:
+    # Call when a key is revoked; without a hash the whole cache is dropped
+    if token_hash is None:
+        _valid_keys.clear()
+        _invalid_keys.clear()
+    else:
+        _valid_keys.discard(token_hash)
+
+
+def revoke_api_key(db, token_hash: str) -> bool:
+
+    # Delete a key and drop it from this process's cache once the delete commits.
+    # Other API processes stop accepting it within API_KEY_CACHE_TTL.
+
+    deleted = db.execute(
+        sa.text("DELETE FROM api_keys WHERE token_hash = :hash"),
+        {"hash": token_hash},
+    ).rowcount
+    db.commit()
+    invalidate_api_key(token_hash)
+    # a replica may still have the row for a moment; don't cache it as valid again
+    _invalid_keys.put(token_hash, True)
+    return bool(deleted)
+
+
+def api_key_cache_stats() -> Dict[str, int]:
+    return {
+        "hits": _valid_keys.hits + _invalid_keys.hits,
+        "misses": _invalid_keys.misses,
+        "negative_hits": _invalid_keys.hits,
+        "entries": len(_valid_keys),
+        "negative_entries": len(_invalid_keys),
+    }
+
+
+# exported on GET /metrics
+for _name, _key, _kind in (
+    ("api_key_cache_hits_total", "hits", "counter"),
+    ("api_key_cache_misses_total", "misses", "counter"),
+    ("api_key_cache_negative_hits_total", "negative_hits", "counter"),
+    ("api_key_cache_entries", "entries", "gauge"),
+    ("api_key_cache_negative_entries", "negative_entries", "gauge"),
+):
+    CallbackGauge(
+        _name,
+        f"API key cache {_key.replace('_', ' ')}.",
+        lambda key=_key: api_key_cache_stats()[key],
+        kind=_kind,
+    )
+
+
+def _lookup_key(db, token_hash: str) -> Optional[str]:
+    return db.execute(
         sa.text(
             """
             SELECT customer_id
               FROM api_keys
-             WHERE token_hash = encode(digest(:tok, 'sha256'), 'hex')
+             WHERE token_hash = :hash
              LIMIT 1
         """
         ),
-        {"tok": x_api_key},
+        {"hash": token_hash},
     ).scalar_one_or_none()
 
+
+def withApiAuth(
+    x_api_key: str | None = Header(None, alias="X-API-Key"),
+    db=Depends(get_read_db),
+) -> str:
+    if not x_api_key:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing API key",
+        )
+    token_hash = hash_api_key(x_api_key)
+    cid = _valid_keys.get(token_hash)
+    if cid is None and _invalid_keys.get(token_hash) is None:
+        with stage("auth"):
+            cid = _lookup_key(db, token_hash)
+            if not cid and not is_primary(db):
+                # a key created moments ago may not have reached the replica yet
+                with SessionLocal() as primary:
+                    cid = _lookup_key(primary, token_hash)
+            if cid:
+                _valid_keys.put(token_hash, str(cid))
+            else:
+                _invalid_keys.put(token_hash, True)
+
     if not cid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
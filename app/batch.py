@@ -0,0 +1,196 @@
+# app/batch.py
+#
+# Edges of many networks of one customer at one point in time (POST
+# /networks/edges:batch): ownership and versions are resolved in one query and the
+# features of every version are read with one statement.
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+
+from app.config import EDGES_FETCH_SIZE
+from app.db import open_session
+from app.services import dump_json, edges_query_filter
+
+_GEOJSON = """ST_AsGeoJSON(
+                CASE
+                    WHEN ST_SRID(e.geom) = 4326 THEN e.geom
+                    ELSE ST_Transform(e.geom, 4326)
+                END
+            )::jsonb"""
+
+
+def resolve_versions(
+    db, customer_id: str, network_ids: Optional[Sequence[str]], ts: datetime
+) -> List[sa.Row]:
+
+    # (network_id, name, version_id, valid_from, delta) of the customer's networks at
+    # ts; version_id is None where no version covers ts. Without network_ids every
+    # network of the customer is returned (by name), otherwise the requested ones
+    # that belong to the customer, in request order.
+
+    params: Dict[str, Any] = {"cid": customer_id, "ts": ts}
+    where = "n.customer_id = :cid"
+    order = "n.name, n.id"
+    if network_ids is not None:
+        where += " AND n.id = ANY(CAST(:ids AS uuid[]))"
+        order = "array_position(CAST(:ids AS uuid[]), n.id)"
+        params["ids"] = [str(nid) for nid in network_ids]
+    return db.execute(
+        sa.text(
+            f"""
+            SELECT n.id::text AS network_id, n.name, v.id::text AS version_id,
+                   v.valid_from, (v.storage = 'delta') AS delta
+              FROM networks n
+              LEFT JOIN network_versions v
+                ON v.network_id = n.id AND v.validity @> :ts
+             WHERE {where}
+             ORDER BY {order}
+        """
+        ),
+        params,
+    ).all()
+
+
+def batch_edges_query(
+    networks: Sequence[sa.Row],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    tagged: bool = False,
+) -> Tuple[str, Dict[str, Any]]:
+
+    # SQL and params yielding (ord, jsonb Feature) for the edges of every resolved
+    # version, grouped by ord (1-based position in networks). Each network is read
+    # through its own lateral subquery, pinned to its partition; the branch of the
+    # other storage mode is skipped by its one-time filter. tagged adds a network_id
+    # member to every Feature.
+
+    full, params = edges_query_filter(
+        "e.network_id = s.network_id AND e.network_version_id = s.version_id",
+        {},
+        bbox=bbox,
+    )
+    delta, _ = edges_query_filter(
+        """e.network_id = s.network_id
+           AND e.valid_from <= s.ts
+           AND (e.valid_to IS NULL OR e.valid_to > s.ts)""",
+        {},
+        bbox=bbox,
+    )
+    params.update(
+        nids=[n.network_id for n in networks],
+        vids=[n.version_id for n in networks],
+        tss=[n.valid_from for n in networks],
+        deltas=[bool(n.delta) for n in networks],
+    )
+    tag = "'network_id', s.network_id," if tagged else ""
+    sql = f"""
+        SELECT s.ord, jsonb_build_object(
+            'type','Feature',
+            'id', e.id,
+            {tag}
+            'geometry', {_GEOJSON},
+            'properties', e.properties
+        )
+        FROM unnest(
+                CAST(:nids AS uuid[]),
+                CAST(:vids AS uuid[]),
+                CAST(:tss AS timestamptz[]),
+                CAST(:deltas AS boolean[])
+             ) WITH ORDINALITY AS s(network_id, version_id, ts, delta, ord)
+        CROSS JOIN LATERAL (
+            SELECT e.id, e.geom, e.properties
+              FROM edges e
+             WHERE NOT s.delta AND {full}
+            UNION ALL
+            SELECT e.id, e.geom, e.properties
+              FROM edges e
+             WHERE s.delta AND {delta}
+        ) e
+        ORDER BY s.ord
+    """
+    return sql, params
+
+
+def _iter_rows(
+    networks: Sequence[sa.Row],
+    bbox: Optional[Tuple[float, float, float, float]],
+    tagged: bool,
+    fetch_size: int,
+    bind: Optional[Engine],
+) -> Iterator[List[sa.Row]]:
+    # partitions of (ord, feature) rows; nothing to read when no network has a version
+    versioned = [n for n in networks if n.version_id is not None]
+    if not versioned:
+        return
+    sql, params = batch_edges_query(versioned, bbox=bbox, tagged=tagged)
+    # ord counts versioned networks only; map it back to positions in networks
+    position = [i for i, n in enumerate(networks) if n.version_id is not None]
+    db = open_session(bind)
+    try:
+        result = db.execute(
+            sa.text(sql), params, execution_options={"yield_per": fetch_size}
+        )
+        for rows in result.partitions():
+            yield [(position[row[0] - 1], row[1]) for row in rows]
+    finally:
+        db.close()
+
+
+def iter_network_collections(
+    networks: Sequence[sa.Row],
+    ts: datetime,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    fetch_size: int = EDGES_FETCH_SIZE,
+    bind: Optional[Engine] = None,
+) -> Iterator[bytes]:
+
+    # {"datetime": ..., "networks": [FeatureCollection + network_id/name/version_id,
+    # ...]} with one entry per network, in order (empty ones included), streamed
+    # from a server-side cursor
+
+    def head(n: sa.Row) -> bytes:
+        meta = dump_json(
+            {"network_id": n.network_id, "name": n.name, "version_id": n.version_id}
+        )
+        return meta[:-1] + b',"type":"FeatureCollection","features":['
+
+    yield b'{"datetime":' + dump_json(ts.isoformat()) + b',"networks":['
+    current = -1
+    sep = b""
+    for rows in _iter_rows(networks, bbox, False, fetch_size, bind):
+        parts = []
+        for i, feature in rows:
+            while current < i:
+                if current >= 0:
+                    parts.append(b"]}")
+                current += 1
+                parts.append((b"," if current else b"") + head(networks[current]))
+                sep = b""
+            parts.append(sep + dump_json(feature))
+            sep = b","
+        yield b"".join(parts)
+    parts = [b"]}"] if current >= 0 else []
+    while current < len(networks) - 1:
+        current += 1
+        parts.append((b"," if current else b"") + head(networks[current]) + b"]}")
+    yield b"".join(parts) + b"]}"
+
+
+def iter_tagged_collection(
+    networks: Sequence[sa.Row],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    fetch_size: int = EDGES_FETCH_SIZE,
+    bind: Optional[Engine] = None,
+) -> Iterator[bytes]:
+
+    # One FeatureCollection of every network's edges; each Feature has a network_id
+
+    yield b'{"type":"FeatureCollection","features":['
+    sep = b""
+    for rows in _iter_rows(networks, bbox, True, fetch_size, bind):
+        yield sep + b",".join(dump_json(feature) for _, feature in rows)
+        sep = b","
+    yield b"]}"
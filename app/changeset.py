@@ -0,0 +1,343 @@
+# app/changeset.py
+#
+# Incremental updates (PATCH /networks/{id}): a changeset of added features, removed
+# edge ids and modified edges becomes a new version without re-uploading the network.
+# Full versions copy the unchanged edges forward with one INSERT ... SELECT; delta
+# versions only close and write the changed rows.
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import sqlalchemy as sa
+from psycopg2.extras import execute_values
+
+from app.config import (
+    CHANGESET_MAX_ENTRIES,
+    INGEST_COORD_PRECISION,
+    INGEST_REPAIR_GEOMETRY,
+    VERSION_STORAGE,
+)
+from app.db import raw_cursor_from_session
+from app.metrics import stage
+from app.normalize import normalize_chunk
+from app.services import (
+    build_topology,
+    derive_version_stats,
+    materialize_version_stats,
+    open_new_version,
+    version_edges_filter,
+)
+
+
+class InvalidChangeset(ValueError):
+    """Raised when a changeset is malformed or refers to edges it cannot change."""
+
+    def __init__(self, message: str, errors: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+class VersionConflict(RuntimeError):
+    """Raised when the changeset's base is not the network's current version."""
+
+    pass
+
+
+@dataclass
+class Changeset:
+    # (geometry, properties) of new edges
+    added: List[Tuple[Dict[str, Any], Dict[str, Any]]] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # (edge id, new geometry or None, new properties or None)
+    modified: List[Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]] = (
+        field(default_factory=list)
+    )
+    repaired: int = 0
+
+    def changed_ids(self) -> List[str]:
+        return self.removed + [edge_id for edge_id, _, _ in self.modified]
+
+
+def _edge_id(value: Any) -> str:
+    try:
+        return str(UUID(str(value)))
+    except ValueError:
+        raise ValueError("not an edge id") from None
+
+
+def parse_changeset(
+    add: Optional[List[Any]],
+    remove: Optional[List[Any]],
+    modify: Optional[List[Any]],
+    precision: Optional[int] = INGEST_COORD_PRECISION,
+    repair: bool = INGEST_REPAIR_GEOMETRY,
+    max_entries: int = CHANGESET_MAX_ENTRIES,
+) -> Changeset:
+
+    # Validate a changeset. Geometries go through the same normalization as uploads,
+    # but a changeset is applied as a whole: any invalid entry rejects all of it.
+
+    add, remove, modify = add or [], remove or [], modify or []
+    total = len(add) + len(remove) + len(modify)
+    if not total:
+        raise InvalidChangeset("Empty changeset")
+    if total > max_entries:
+        raise InvalidChangeset(
+            f"More than {max_entries} changes; upload the network instead"
+        )
+    errors: List[Dict[str, Any]] = []
+    cs = Changeset()
+
+    cs.added, failed, cs.repaired = normalize_chunk(
+        list(enumerate(add)), None, precision, repair
+    )
+    errors.extend({"add": index, "error": error} for index, error in failed)
+
+    seen = set()
+    for index, value in enumerate(remove):
+        try:
+            edge_id = _edge_id(value)
+        except ValueError as e:
+            errors.append({"remove": index, "error": str(e)})
+            continue
+        if edge_id in seen:
+            errors.append({"remove": index, "error": "edge changed twice"})
+        seen.add(edge_id)
+        cs.removed.append(edge_id)
+
+    geometries = []
+    for index, entry in enumerate(modify):
+        if not isinstance(entry, dict):
+            errors.append({"modify": index, "error": "must be an object"})
+            continue
+        try:
+            edge_id = _edge_id(entry.get("id"))
+        except ValueError as e:
+            errors.append({"modify": index, "error": str(e)})
+            continue
+        if edge_id in seen:
+            errors.append({"modify": index, "error": "edge changed twice"})
+        seen.add(edge_id)
+        geom, props = entry.get("geometry"), entry.get("properties")
+        if geom is None and props is None:
+            errors.append({"modify": index, "error": "needs geometry or properties"})
+            continue
+        if props is not None and not isinstance(props, dict):
+            errors.append({"modify": index, "error": "properties must be an object"})
+            continue
+        if geom is not None:
+            if not isinstance(geom, dict) or geom.get("type") != "LineString":
+                errors.append(
+                    {"modify": index, "error": "geometry must be a LineString"}
+                )
+                continue
+            geometries.append(
+                (index, {"type": "Feature", "geometry": geom, "properties": {}})
+            )
+        cs.modified.append((edge_id, geom, props))
+
+    # replacement geometries are normalized in one go
+    replacements: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    if geometries:
+        replacements, failed, repaired = normalize_chunk(
+            geometries, None, precision, repair
+        )
+        cs.repaired += repaired
+        errors.extend({"modify": index, "error": error} for index, error in failed)
+    if errors:
+        raise InvalidChangeset("Invalid changeset", errors)
+
+    # a valid LineString normalizes to exactly one edge, in input order
+    normalized = iter(geom for geom, _ in replacements)
+    cs.modified = [
+        (edge_id, next(normalized) if geom is not None else None, props)
+        for edge_id, geom, props in cs.modified
+    ]
+    return cs
+
+
+def _stage_changes(db, cs: Changeset) -> None:
+
+    # Temp table of the new and modified rows; edge_id is NULL for added edges and
+    # geom/properties are NULL where a modified edge keeps its own
+
+    db.execute(sa.text("DROP TABLE IF EXISTS _edge_changes"))
+    db.execute(
+        sa.text(
+            """
+            CREATE TEMP TABLE _edge_changes (
+                edge_id uuid,
+                geom geometry(LineString, 4326),
+                properties jsonb
+            ) ON COMMIT DROP
+        """
+        )
+    )
+    rows = [
+        (None, json.dumps(geom, separators=(",", ":")), json.dumps(props))
+        for geom, props in cs.added
+    ] + [
+        (
+            edge_id,
+            json.dumps(geom, separators=(",", ":")) if geom is not None else None,
+            json.dumps(props) if props is not None else None,
+        )
+        for edge_id, geom, props in cs.modified
+    ]
+    if not rows:
+        return
+    with raw_cursor_from_session(db) as cur:
+        execute_values(
+            cur,
+            "INSERT INTO _edge_changes (edge_id, geom, properties) VALUES %s",
+            rows,
+            template="(%s::uuid, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s::jsonb)",
+            page_size=1000,
+        )
+
+
+def apply_changeset(
+    db,
+    network_id: str,
+    cs: Changeset,
+    base_version_id: Optional[str] = None,
+    storage: str = VERSION_STORAGE,
+) -> Dict[str, Any]:
+
+    # Write cs as a new version of the network on top of its current version (which
+    # must be base_version_id when given). Edge ids refer to the current version.
+    # The network row is locked before the current version is read (as in
+    # open_new_version), so concurrent changesets and uploads of the network are
+    # applied one after another, each on top of the one before.
+
+    db.execute(
+        sa.text("SELECT 1 FROM networks WHERE id = :nid FOR UPDATE"),
+        {"nid": network_id},
+    )
+    base = db.execute(
+        sa.text(
+            """
+            SELECT id::text, storage
+              FROM network_versions
+             WHERE network_id = :nid AND valid_to IS NULL
+        """
+        ),
+        {"nid": network_id},
+    ).one_or_none()
+    if base is None:
+        raise VersionConflict("The network has no current version")
+    if base_version_id is not None and str(base_version_id) != base.id:
+        raise VersionConflict(f"The current version is {base.id}")
+
+    scope, params = version_edges_filter(db, base.id, prefix="base")
+    changed = cs.changed_ids()
+    if changed:
+        found = set(
+            db.execute(
+                sa.text(
+                    f"""
+                    SELECT e.id::text FROM edges e
+                     WHERE {scope} AND e.id = ANY(CAST(:changed AS uuid[]))
+                """
+                ),
+                {**params, "changed": changed},
+            ).scalars()
+        )
+        unknown = [edge_id for edge_id in changed if edge_id not in found]
+        if unknown:
+            raise InvalidChangeset(
+                "Not edges of the current version",
+                [{"edge": edge_id, "error": "not found"} for edge_id in unknown],
+            )
+
+    # delta on delta references the unchanged rows; otherwise they are copied
+    incremental = storage == "delta" and base.storage == "delta"
+    with stage("insert"):
+        version_id, ts = open_new_version(db, network_id, storage=storage)
+        params.update(
+            nid=network_id,
+            vid=str(version_id),
+            ts=ts,
+            valid_from=ts if storage == "delta" else None,
+            changed=changed,
+            removed=cs.removed,
+        )
+        _stage_changes(db, cs)
+        if storage == "delta":
+            # close the changed rows, or every live row when this starts a new
+            # delta baseline (as in insert_edges_delta)
+            only_changed = (
+                "AND id = ANY(CAST(:changed AS uuid[]))" if incremental else ""
+            )
+            db.execute(
+                sa.text(
+                    f"""
+                    UPDATE edges SET valid_to = :ts
+                     WHERE network_id = :nid
+                       AND valid_from IS NOT NULL AND valid_to IS NULL
+                       {only_changed}
+                """
+                ),
+                params,
+            )
+        if incremental:
+            # modified rows only; the unchanged ones stay live
+            source = """_edge_changes c
+                  JOIN edges e ON e.network_id = :nid AND e.id = c.edge_id"""
+        else:
+            # copy the base version forward, minus removed rows
+            source = f"""edges e
+                  LEFT JOIN _edge_changes c ON c.edge_id = e.id
+                 WHERE {scope}
+                   AND e.id <> ALL(CAST(:removed AS uuid[]))"""
+        # rows keeping their geometry keep their nodes
+        db.execute(
+            sa.text(
+                f"""
+                INSERT INTO edges (network_version_id, network_id, geom, properties,
+                                   valid_from, source_node, target_node)
+                SELECT :vid, :nid, COALESCE(c.geom, e.geom),
+                       COALESCE(c.properties, e.properties), :valid_from,
+                       CASE WHEN c.geom IS NULL THEN e.source_node END,
+                       CASE WHEN c.geom IS NULL THEN e.target_node END
+                  FROM {source}
+            """
+            ),
+            params,
+        )
+        db.execute(
+            sa.text(
+                """
+                INSERT INTO edges (network_version_id, network_id, geom, properties,
+                                   valid_from)
+                SELECT :vid, :nid, c.geom, c.properties, :valid_from
+                  FROM _edge_changes c
+                 WHERE c.edge_id IS NULL
+            """
+            ),
+            params,
+        )
+    with stage("topology"):
+        build_topology(db, network_id, version_id, unlinked_only=True)
+    with stage("stats"):
+        if not incremental or not derive_version_stats(
+            db, network_id, base.id, version_id, changed
+        ):
+            materialize_version_stats(db, version_id)
+        edge_count = db.execute(
+            sa.text("SELECT edge_count FROM version_stats WHERE version_id = :vid"),
+            {"vid": str(version_id)},
+        ).scalar_one()
+    return {
+        "network_id": network_id,
+        "version_id": str(version_id),
+        "base_version_id": base.id,
+        "added": len(cs.added),
+        "removed": len(cs.removed),
+        "modified": len(cs.modified),
+        "repaired": cs.repaired,
+        "edge_count": edge_count,
+    }
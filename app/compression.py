@@ -0,0 +1,325 @@
+# app/compression.py
+from __future__ import annotations
+
+import gzip
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+import brotli
+import zstandard
+from fastapi import HTTPException
+
+from app.config import RESPONSE_ENCODINGS, UPLOAD_MAX_DECOMPRESSED_BYTES
+
+# fast levels: responses are compressed while they stream, cached ones only once
+_LEVELS = {"gzip": 6, "zstd": 3, "br": 4}
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# zstd input fed per call when output is bounded (zstd decompressobj has no
+# max_length): a 4-byte block decodes to at most 128 KiB, so one call yields at most
+# 32 MiB. Request bodies are handed on in pieces of about _CHUNK bytes.
+_ZSTD_STEP = 1 << 10
+_CHUNK = 1 << 20
+
+
+class DecompressedTooLarge(ValueError):
+    """Raised when an upload decompresses to more than UPLOAD_MAX_DECOMPRESSED_BYTES."""
+
+    pass
+
+
+class _ZstdReader:
+    """Read-only zstd stream over every frame of fh that fails on truncated input.
+
+    (ZstdDecompressor.stream_reader ends silently when the input stops mid-frame.)
+    """
+
+    def __init__(self, fh: BinaryIO):
+        self._fh = fh
+        self._decoder = StreamDecoder("zstd")
+        self._buf = b""
+        self._eof = False
+
+    def read(self, n: int = -1) -> bytes:
+        while not self._eof and (n < 0 or len(self._buf) < n):
+            data = b"" if self._decoder.pending else self._fh.read(_CHUNK)
+            if not data and not self._decoder.pending:
+                self._decoder.finish()
+                self._eof = True
+                break
+            self._buf += self._decoder.decompress(
+                data, None if n < 0 else n - len(self._buf)
+            )
+        if n < 0:
+            n = len(self._buf)
+        out, self._buf = self._buf[:n], self._buf[n:]
+        return out
+
+
+class _Limited:
+    """Read-only wrapper counting decompressed bytes against the upload limit."""
+
+    def __init__(self, fh: BinaryIO, limit: int):
+        self._fh = fh
+        self._limit = limit
+        self._size = 0
+
+    def read(self, n: int = -1) -> bytes:
+        try:
+            data = self._fh.read(n)
+        except (EOFError, gzip.BadGzipFile, zlib.error, zstandard.ZstdError) as e:
+            # truncated or corrupt input is the client's fault, not a server error
+            raise ValueError(f"Invalid compressed upload: {e}") from None
+        self._size += len(data)
+        if self._limit and self._size > self._limit:
+            raise DecompressedTooLarge(
+                f"Upload decompresses to more than {self._limit} bytes"
+            )
+        return data
+
+
+def open_decompressed(fh: BinaryIO) -> BinaryIO:
+
+    # Wrap an upload in a streaming decompressor when it starts with a gzip or zstd
+    # magic number (.geojson.gz / .geojson.zst files); plain uploads are returned as-is
+
+    head = fh.read(4)
+    fh.seek(0)
+    if head.startswith(_GZIP_MAGIC):
+        return _Limited(
+            gzip.GzipFile(fileobj=fh, mode="rb"), UPLOAD_MAX_DECOMPRESSED_BYTES
+        )
+    if head == _ZSTD_MAGIC:
+        return _Limited(_ZstdReader(fh), UPLOAD_MAX_DECOMPRESSED_BYTES)
+    return fh
+
+
+def _accepted(accept_encoding: Optional[str]) -> Dict[str, float]:
+    # coding -> q from an Accept-Encoding header
+    out: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[name] = q
+    return out
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+
+    # Best of RESPONSE_ENCODINGS the client accepts: highest q, ties go to the
+    # configured order. None means identity.
+
+    accepted = _accepted(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in RESPONSE_ENCODINGS:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Encoder:
+    """Incremental compressor with a common compress/flush interface."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(_LEVELS["gzip"], zlib.DEFLATED, 31)
+        elif encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=_LEVELS["zstd"]).compressobj()
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=_LEVELS["br"])
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def encode(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding is None:
+        return body
+    enc = _Encoder(encoding)
+    return enc.compress(body) + enc.flush()
+
+
+def decode(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding is None:
+        return body
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "zstd":
+        dec = StreamDecoder(encoding)
+        body = dec.decompress(body)
+        dec.finish()
+        return body
+    if encoding == "br":
+        return brotli.decompress(body)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def iter_encoded(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+
+    # Compress a streamed body chunk by chunk; empty outputs are not sent
+
+    if encoding is None:
+        yield from chunks
+        return
+    enc = _Encoder(encoding)
+    for chunk in chunks:
+        out = enc.compress(chunk)
+        if out:
+            yield out
+    yield enc.flush()
+
+
+class StreamDecoder:
+    """Incremental gzip or zstd decoder for bodies of several members or frames.
+
+    decompress() stops once about max_length bytes came out and keeps the rest of
+    its input for the next call (see pending).
+    """
+
+    def __init__(self, encoding: str):
+        if encoding not in ("gzip", "zstd"):
+            raise ValueError(f"Unsupported encoding: {encoding}")
+        self.encoding = encoding
+        self._obj = self._new()
+        self._input = b""
+        self._started = False
+
+    def _new(self):
+        if self.encoding == "gzip":
+            return zlib.decompressobj(31)
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._input)
+
+    def decompress(self, data: bytes, max_length: Optional[int] = None) -> bytes:
+        self._input += data
+        out: List[bytes] = []
+        size = 0
+        while self._input and (max_length is None or size < max_length):
+            if self._obj.eof:
+                # the next gzip member / zstd frame
+                self._obj = self._new()
+            self._started = True
+            if self.encoding == "gzip":
+                piece = self._obj.decompress(
+                    self._input, 0 if max_length is None else max_length - size
+                )
+                rest = self._obj.unconsumed_tail
+            else:
+                step = len(self._input) if max_length is None else _ZSTD_STEP
+                piece = self._obj.decompress(self._input[:step])
+                rest = self._input[step:]
+            if self._obj.eof:
+                rest = self._obj.unused_data + rest
+            self._input = rest
+            out.append(piece)
+            size += len(piece)
+        return b"".join(out)
+
+    def finish(self) -> None:
+        # the input ended: fail when it stopped inside a member or frame
+        if self._input or (self._started and not self._obj.eof):
+            raise ValueError(f"Truncated {self.encoding} data")
+
+
+class RequestDecompressionMiddleware:
+    """ASGI middleware decoding request bodies sent with Content-Encoding gzip or zstd.
+
+    The body is decompressed as it is received, so multipart uploads stream into the
+    form parser (and from there into the GeoJSON parser) without being buffered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        coding = None
+        for name, value in scope["headers"]:
+            if name == b"content-encoding":
+                coding = value.decode("latin-1").strip().lower()
+        if coding in (None, "", "identity"):
+            return await self.app(scope, receive, send)
+        if coding not in ("gzip", "zstd"):
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 415,
+                    "headers": [(b"content-type", b"application/json")],
+                }
+            )
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": b'{"detail":"Unsupported Content-Encoding"}',
+                }
+            )
+            return
+        decoder = StreamDecoder(coding)
+
+        # the decoded length is unknown
+        headers = [
+            (name, value)
+            for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+
+        size = 0
+        more = True
+
+        async def receive_decoded():
+            # A body may decode to much more than it sent, so the output is handed on
+            # in pieces: input left over from one message is decoded on the next call
+            nonlocal size, more
+            data = b""
+            if not decoder.pending:
+                message = await receive()
+                if message["type"] != "http.request":
+                    return message
+                data = message.get("body", b"")
+                more = message.get("more_body", False)
+            try:
+                body = decoder.decompress(data, _CHUNK)
+                if not more and not decoder.pending:
+                    decoder.finish()
+            except (zlib.error, zstandard.ZstdError, ValueError):
+                raise HTTPException(
+                    status_code=400, detail=f"Invalid {coding} request body"
+                ) from None
+            size += len(body)
+            if UPLOAD_MAX_DECOMPRESSED_BYTES and size > UPLOAD_MAX_DECOMPRESSED_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail="Request body decompresses to more than "
+                    f"{UPLOAD_MAX_DECOMPRESSED_BYTES} bytes",
+                )
+            return {
+                "type": "http.request",
+                "body": body,
+                "more_body": more or decoder.pending,
+            }
+
+        await self.app(dict(scope, headers=headers), receive_decoded, send)
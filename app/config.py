@@ -0,0 +1,157 @@
+# app/config.py
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    return int(raw) if raw else default
+
+
+def _bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Connection pools, per engine: connections kept, extra connections allowed under
+# load, seconds before a connection is replaced, and seconds to wait for one.
+# Read replicas (DATABASE_REPLICA_URLS) default to the primary's settings.
+DB_POOL_SIZE = _int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _int("DB_MAX_OVERFLOW", 10)
+DB_POOL_RECYCLE = _int("DB_POOL_RECYCLE", 1800)
+DB_POOL_TIMEOUT = _int("DB_POOL_TIMEOUT", 30)
+DB_REPLICA_POOL_SIZE = _int("DB_REPLICA_POOL_SIZE", DB_POOL_SIZE)
+DB_REPLICA_MAX_OVERFLOW = _int("DB_REPLICA_MAX_OVERFLOW", DB_MAX_OVERFLOW)
+DB_REPLICA_POOL_RECYCLE = _int("DB_REPLICA_POOL_RECYCLE", DB_POOL_RECYCLE)
+DB_REPLICA_POOL_TIMEOUT = _int("DB_REPLICA_POOL_TIMEOUT", DB_POOL_TIMEOUT)
+# Reads of a network go to the primary for this many seconds after this process
+# committed a new version of it (read-your-writes), and a replica that failed to
+# connect is skipped for DB_REPLICA_RETRY_SECONDS. The primary's newest version of
+# a network, which a replica must have before it serves the network's reads, is
+# cached for DB_REPLICA_VERSION_CACHE_SECONDS.
+DB_REPLICA_STICKY_SECONDS = _int("DB_REPLICA_STICKY_SECONDS", 10)
+DB_REPLICA_RETRY_SECONDS = _int("DB_REPLICA_RETRY_SECONDS", 10)
+DB_REPLICA_VERSION_CACHE_SECONDS = _int("DB_REPLICA_VERSION_CACHE_SECONDS", 1)
+
+# Upload ingest: bytes read from the upload per step and edges per INSERT batch.
+INGEST_CHUNK_SIZE = _int("INGEST_CHUNK_SIZE", 1 << 20)
+INGEST_BATCH_SIZE = _int("INGEST_BATCH_SIZE", 5000)
+# Feature validation/normalization: worker processes (0 = in the request's thread;
+# by default one per spare CPU, at most 4),
+# decimal places coordinates are quantized to (unset = keep full precision), whether
+# repeated points are dropped (otherwise such features are rejected), and how many
+# per-feature errors an ingest report lists.
+INGEST_NORMALIZE_WORKERS = _int(
+    "INGEST_NORMALIZE_WORKERS", max(0, min(4, (os.cpu_count() or 1) - 1))
+)
+INGEST_COORD_PRECISION = (
+    int(os.environ["INGEST_COORD_PRECISION"])
+    if os.getenv("INGEST_COORD_PRECISION")
+    else None
+)
+INGEST_REPAIR_GEOMETRY = _bool("INGEST_REPAIR_GEOMETRY", True)
+INGEST_MAX_REPORTED_ERRORS = _int("INGEST_MAX_REPORTED_ERRORS", 1000)
+# Uploads processed at once per worker; each holds a thread and a DB connection.
+INGEST_CONCURRENCY = _int("INGEST_CONCURRENCY", 2)
+
+# How edges are written: "insert" (execute_values + ST_GeomFromGeoJSON) or
+# "copy" (binary COPY with EWKB encoded client-side by shapely).
+INGEST_LOADER = os.getenv("INGEST_LOADER", "insert").lower()
+if INGEST_LOADER not in ("insert", "copy"):
+    raise RuntimeError("INGEST_LOADER must be 'insert' or 'copy'.")
+
+# How new versions store edges: "full" copies every edge into the version,
+# "delta" only writes added/changed edges and closes removed ones.
+VERSION_STORAGE = os.getenv("VERSION_STORAGE", "full").lower()
+if VERSION_STORAGE not in ("full", "delta"):
+    raise RuntimeError("VERSION_STORAGE must be 'full' or 'delta'.")
+
+# GET /networks/{id}/edges: stream features from a server-side cursor instead of
+# aggregating the whole FeatureCollection in Postgres; rows fetched per round trip.
+EDGES_STREAMING = _bool("EDGES_STREAMING", True)
+EDGES_FETCH_SIZE = _int("EDGES_FETCH_SIZE", 2000)
+
+# Keyset pagination on the edges endpoint (?limit=&cursor=).
+EDGES_DEFAULT_PAGE_SIZE = _int("EDGES_DEFAULT_PAGE_SIZE", 1000)
+EDGES_MAX_PAGE_SIZE = _int("EDGES_MAX_PAGE_SIZE", 50000)
+
+# Networks accepted per POST /networks/edges:batch request.
+EDGES_BATCH_MAX_NETWORKS = _int("EDGES_BATCH_MAX_NETWORKS", 1000)
+
+# Entries (added + removed + modified) accepted per PATCH /networks/{id} changeset;
+# larger changes go through POST /networks/update.
+CHANGESET_MAX_ENTRIES = _int("CHANGESET_MAX_ENTRIES", 100000)
+
+# Vector tiles: upper bound on cached tile bytes (LRU, keyed by version/z/x/y).
+TILE_CACHE_MAX_BYTES = _int("TILE_CACHE_MAX_BYTES", 256 << 20)
+
+# withApiAuth: in-process cache of sha256(token) -> customer_id. Unknown keys are
+# remembered separately, for a shorter time, so they can't evict valid ones.
+API_KEY_CACHE_SIZE = _int("API_KEY_CACHE_SIZE", 10000)
+API_KEY_CACHE_TTL = _int("API_KEY_CACHE_TTL", 60)
+API_KEY_CACHE_NEGATIVE_TTL = _int("API_KEY_CACHE_NEGATIVE_TTL", 5)
+
+# Full-version responses of the edges endpoint, cached by version id: memory budget,
+# largest response buffered in memory while it streams, optional spill directory for
+# evicted and larger payloads, and gzip before storing.
+RESPONSE_CACHE_MAX_BYTES = _int("RESPONSE_CACHE_MAX_BYTES", 512 << 20)
+RESPONSE_CACHE_ENTRY_MAX_BYTES = _int("RESPONSE_CACHE_ENTRY_MAX_BYTES", 16 << 20)
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR") or None
+RESPONSE_CACHE_DISK_MAX_BYTES = _int("RESPONSE_CACHE_DISK_MAX_BYTES", 8 << 30)
+RESPONSE_CACHE_GZIP = _bool("RESPONSE_CACHE_GZIP", False)
+
+# Ingest jobs (?job=true): uploads are spooled here and loaded by a process pool.
+JOBS_SPOOL_DIR = os.getenv("JOBS_SPOOL_DIR") or os.path.join(
+    tempfile.gettempdir(), "road-networks-jobs"
+)
+JOBS_WORKERS = _int("JOBS_WORKERS", 2)
+
+# Routing: graphs kept in memory (LRU by version) and decimal places used to snap
+# edge endpoints into shared nodes (7 ~ 1 cm).
+ROUTING_CACHE_GRAPHS = _int("ROUTING_CACHE_GRAPHS", 4)
+ROUTING_SNAP_DIGITS = _int("ROUTING_SNAP_DIGITS", 7)
+
+# POST /networks/{id}/snap: points accepted per request and points per KNN query.
+SNAP_MAX_POINTS = _int("SNAP_MAX_POINTS", 500000)
+SNAP_BATCH_SIZE = _int("SNAP_BATCH_SIZE", 10000)
+
+# Topology: grid size (degrees) edge endpoints are snapped to when building nodes.
+TOPOLOGY_SNAP_TOLERANCE = float(os.getenv("TOPOLOGY_SNAP_TOLERANCE") or 1e-7)
+
+# Version timelines (owner + validity windows per network) cached in-process for
+# time-travel lookups. Versions opened by another process show up after the TTL.
+TIMELINE_CACHE_SIZE = _int("TIMELINE_CACHE_SIZE", 10000)
+TIMELINE_CACHE_TTL = _int("TIMELINE_CACHE_TTL", 5)
+
+# Retention (python -m app.retention): optional directory that receives every removed
+# version as gzipped GeoJSON lines before its edges are deleted.
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR") or None
+
+# Edges export (?format=parquet): rows per GeoParquet row group, which is also how
+# many rows are buffered before bytes are sent.
+EXPORT_PARQUET_ROW_GROUP_SIZE = _int("EXPORT_PARQUET_ROW_GROUP_SIZE", 65536)
+
+# Content codings offered on the edges endpoint, in order of preference when a client
+# accepts several equally; empty disables response compression.
+RESPONSE_ENCODINGS = [
+    c.strip().lower()
+    for c in os.getenv("RESPONSE_ENCODINGS", "zstd,br,gzip").split(",")
+    if c.strip()
+]
+if not set(RESPONSE_ENCODINGS) <= {"zstd", "br", "gzip"}:
+    raise RuntimeError("RESPONSE_ENCODINGS may only list zstd, br and gzip.")
+
+# Compressed uploads (Content-Encoding bodies and .gz / .zst files): most bytes they
+# may decompress to, so a small bomb cannot fill the disk or the parser; 0 = no limit
+UPLOAD_MAX_DECOMPRESSED_BYTES = _int("UPLOAD_MAX_DECOMPRESSED_BYTES", 4 << 30)
+
+# Metrics: GET /metrics (Prometheus text format, per process) and a Server-Timing
+# header with the stage breakdown of each response.
+METRICS_ENABLED = _bool("METRICS_ENABLED", True)
+SERVER_TIMING_HEADER = _bool("SERVER_TIMING_HEADER", True)
@@ -1,16 +1,82 @@
+import itertools
 import os
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+import threading
+import time
 from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
 
 from dotenv import load_dotenv
 
+from app.cache import TTLCache
+from app.config import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_REPLICA_MAX_OVERFLOW,
+    DB_REPLICA_POOL_RECYCLE,
+    DB_REPLICA_POOL_SIZE,
+    DB_REPLICA_POOL_TIMEOUT,
+    DB_REPLICA_RETRY_SECONDS,
+    DB_REPLICA_STICKY_SECONDS,
+    DB_REPLICA_VERSION_CACHE_SECONDS,
+)
+from app.metrics import CallbackGauge, Counter, instrument_engine
+
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set. Please check your .env file.")
+# Comma-separated read replicas (streaming standbys of DATABASE_URL)
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+
+
+def _create_engine(
+    url: str, name: str, size: int, overflow: int, recycle: int, timeout: int
+) -> Engine:
+    eng = create_engine(
+        url,
+        future=True,
+        pool_pre_ping=True,
+        pool_size=size,
+        max_overflow=overflow,
+        pool_recycle=recycle,
+        pool_timeout=timeout,
+    )
+    instrument_engine(eng, name)
+    return eng
 
-engine = create_engine(DATABASE_URL, future=True, pool_pre_ping=True)
+
+engine = _create_engine(
+    DATABASE_URL,
+    "primary",
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_TIMEOUT,
+)
+replica_engines: List[Engine] = [
+    _create_engine(
+        url,
+        f"replica{i}",
+        DB_REPLICA_POOL_SIZE,
+        DB_REPLICA_MAX_OVERFLOW,
+        DB_REPLICA_POOL_RECYCLE,
+        DB_REPLICA_POOL_TIMEOUT,
+    )
+    for i, url in enumerate(DATABASE_REPLICA_URLS)
+]
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
 
@@ -28,6 +94,186 @@ def get_db():
         db.close()
 
 
+class _Replicas:
+    """Round-robin over the replicas, skipping ones that recently failed to connect."""
+
+    def __init__(self, engines: List[Engine], retry_seconds: float):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self._down_until: Dict[int, float] = {}
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def candidates(self) -> List[Engine]:
+        if not self.engines:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._next)
+        n = len(self.engines)
+        order = [self.engines[(start + i) % n] for i in range(n)]
+        return [e for e in order if self._down_until.get(id(e), 0.0) <= now]
+
+    def mark_down(self, eng: Engine) -> None:
+        self._down_until[id(eng)] = time.monotonic() + self.retry_seconds
+
+    def healthy(self, eng: Engine) -> bool:
+        return self._down_until.get(id(eng), 0.0) <= time.monotonic()
+
+
+_replicas = _Replicas(replica_engines, DB_REPLICA_RETRY_SECONDS)
+# network_id -> True while reads of it go to the primary without asking the replicas
+_recent_writes = TTLCache(100000, DB_REPLICA_STICKY_SECONDS)
+_last_write = float("-inf")
+# network_id -> the primary's newest version id of it ("" while it has none)
+_latest = TTLCache(100000, DB_REPLICA_VERSION_CACHE_SECONDS)
+
+READ_ROUTING = Counter(
+    "db_read_sessions_total",
+    "Read sessions by where they were routed and why.",
+    ("target",),
+)
+CallbackGauge(
+    "db_replica_healthy",
+    "1 while a replica accepts connections, 0 while it is skipped.",
+    lambda: {
+        (f"replica{i}",): int(_replicas.healthy(e))
+        for i, e in enumerate(replica_engines)
+    },
+    labels=("pool",),
+)
+
+
+def note_write(network_id: str) -> None:
+    # A new version of network_id was committed; keep its reads on the primary
+    # until replicas have had time to replay it
+    global _last_write
+    if replica_engines:
+        _recent_writes.put(str(network_id), True)
+        _latest.discard(str(network_id))
+        _last_write = time.monotonic()
+
+
+def _latest_versions(network_ids: List[str]) -> Dict[str, str]:
+    # network_id -> newest version id according to the primary
+    with engine.connect() as conn:
+        return {
+            str(nid): str(vid)
+            for nid, vid in conn.execute(
+                text(
+                    """
+                SELECT DISTINCT ON (network_id) network_id, id
+                  FROM network_versions
+                 WHERE network_id = ANY(CAST(:ids AS uuid[]))
+                 ORDER BY network_id, valid_from DESC
+            """
+                ),
+                {"ids": network_ids},
+            )
+        }
+
+
+def _cached_latest_versions(network_ids: List[str]) -> List[str]:
+
+    # Newest version of each network that has one. Answers come from _latest; the
+    # primary is only asked about networks missing from it, in one query
+
+    latest: List[str] = []
+    missing: List[str] = []
+    for nid in network_ids:
+        vid = _latest.get(nid)
+        if vid is None:
+            missing.append(nid)
+        elif vid:
+            latest.append(vid)
+    if missing:
+        found = _latest_versions(missing)
+        for nid in missing:
+            vid = found.get(nid, "")
+            _latest.put(nid, vid)
+            if vid:
+                latest.append(vid)
+    return latest
+
+
+def _has_versions(db: Session, version_ids: List[str]) -> bool:
+    # the replica has replayed the commits that created version_ids
+    found = db.execute(
+        text(
+            "SELECT count(*) FROM network_versions WHERE id = ANY(CAST(:ids AS uuid[]))"
+        ),
+        {"ids": version_ids},
+    ).scalar_one()
+    return found == len(version_ids)
+
+
+def read_session(network_ids: Optional[Iterable[str]] = ()) -> Session:
+
+    # Session for read-only work: a healthy replica, or the primary when there is
+    # none or the replicas are behind. For network_ids the primary's newest version
+    # of each network must exist on the replica, which covers writes of any process
+    # (job workers included) once DB_REPLICA_VERSION_CACHE_SECONDS have passed since
+    # this process last asked the primary about that network. network_ids=None stands for reads that may touch any
+    # network; they stay on the primary while a write of this process is recent,
+    # writes of other processes may take replication lag to show up there. The
+    # connection is checked out (and pinged) here, so an unreachable replica falls
+    # back to the next one.
+
+    if not replica_engines:
+        return SessionLocal()
+    ids = None if network_ids is None else [str(nid) for nid in network_ids]
+    if ids is None:
+        recent = time.monotonic() - _last_write < DB_REPLICA_STICKY_SECONDS
+    else:
+        recent = any(_recent_writes.get(nid) for nid in ids)
+    if recent:
+        READ_ROUTING.inc("primary_recent_write")
+        return SessionLocal()
+    latest = _cached_latest_versions(ids) if ids else []
+    behind = False
+    for eng in _replicas.candidates():
+        db = SessionLocal(bind=eng)
+        try:
+            db.connection()
+        except OperationalError:
+            db.close()
+            _replicas.mark_down(eng)
+            continue
+        if latest and not _has_versions(db, latest):
+            db.close()
+            behind = True
+            continue
+        READ_ROUTING.inc("replica")
+        return db
+    READ_ROUTING.inc("primary_replica_behind" if behind else "primary_fallback")
+    return SessionLocal()
+
+
+def get_read_db(request: Request):
+    # read-only endpoints; a network_id path parameter enables read-your-writes
+    # (path parameters are validated after dependencies run, so check it here)
+    network_id = request.path_params.get("network_id")
+    try:
+        ids = [str(UUID(network_id))] if network_id else []
+    except ValueError:
+        ids = []
+    db = read_session(ids)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def open_session(bind: Optional[Engine] = None) -> Session:
+    # A session of its own on bind (the engine a request was routed to), for response
+    # bodies streamed after the request's session is closed
+    return SessionLocal(bind=bind) if bind is not None else SessionLocal()
+
+
+def is_primary(db: Session) -> bool:
+    return db.get_bind() is engine
+
+
 @contextmanager
 def raw_cursor_from_session(db):
     sa_conn = db.connection()
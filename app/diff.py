@@ -0,0 +1,110 @@
+# app/diff.py
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+import sqlalchemy as sa
+
+from app.services import version_edges_filter
+
+
+def _side(db, version_id: Optional[str], prefix: str) -> Tuple[str, Dict[str, Any]]:
+    if version_id is None:
+        return "false", {}
+    return version_edges_filter(db, version_id, prefix=prefix)
+
+
+def diff_query(
+    db, old_version: Optional[str], new_version: Optional[str]
+) -> Tuple[str, Dict[str, Any]]:
+
+    # SQL (one jsonb Feature per row) and params for the changes old -> new.
+    #
+    # Edges are compared as multisets of content_hash, pairing duplicates by
+    # row_number(). Leftovers that share a geom_hash are property edits ("modified");
+    # the rest are "added" or "removed". Between two delta versions only rows whose
+    # validity window starts or ends between the two version starts can differ, so
+    # the compared sets shrink to the change and are read through the window indexes.
+
+    old_scope, old_params = _side(db, old_version, "old")
+    new_scope, new_params = _side(db, new_version, "new")
+    params = {**old_params, **new_params}
+    # both versions belong to one network (and so one edges partition)
+    params["nid"] = params.get("new_nid") or params.get("old_nid")
+
+    if old_version and new_version:
+        rows = dict(
+            db.execute(
+                sa.text(
+                    """
+                    SELECT id::text, (storage = 'delta')
+                      FROM network_versions
+                     WHERE id IN (CAST(:a AS uuid), CAST(:b AS uuid))
+                """
+                ),
+                {"a": str(old_version), "b": str(new_version)},
+            ).all()
+        )
+        if rows.get(str(old_version)) and rows.get(str(new_version)):
+            lo, hi = sorted((params["old_ts"], params["new_ts"]))
+            params.update(lo_ts=lo, hi_ts=hi)
+            # rows in both versions cancel out; keep those changing in (lo, hi]
+            window = """((e.valid_from > :lo_ts AND e.valid_from <= :hi_ts)
+                         OR (e.valid_to > :lo_ts AND e.valid_to <= :hi_ts))"""
+            old_scope = f"({old_scope}) AND {window}"
+            new_scope = f"({new_scope}) AND {window}"
+
+    sql = f"""
+        WITH a AS (
+            SELECT e.id, e.content_hash, e.geom_hash,
+                   row_number() OVER (PARTITION BY e.content_hash ORDER BY e.id) AS ord
+              FROM edges e
+             WHERE {old_scope}
+        ), b AS (
+            SELECT e.id, e.content_hash, e.geom_hash,
+                   row_number() OVER (PARTITION BY e.content_hash ORDER BY e.id) AS ord
+              FROM edges e
+             WHERE {new_scope}
+        ), removed AS (
+            SELECT a.id, a.geom_hash,
+                   row_number() OVER (PARTITION BY a.geom_hash ORDER BY a.id) AS gord
+              FROM a
+              LEFT JOIN b ON b.content_hash = a.content_hash AND b.ord = a.ord
+             WHERE b.id IS NULL
+        ), added AS (
+            SELECT b.id, b.geom_hash,
+                   row_number() OVER (PARTITION BY b.geom_hash ORDER BY b.id) AS gord
+              FROM b
+              LEFT JOIN a ON a.content_hash = b.content_hash AND a.ord = b.ord
+             WHERE a.id IS NULL
+        ), changes AS (
+            SELECT COALESCE(ad.id, rm.id) AS id,
+                   rm.id AS old_id,
+                   CASE
+                       WHEN ad.id IS NULL THEN 'removed'
+                       WHEN rm.id IS NULL THEN 'added'
+                       ELSE 'modified'
+                   END AS change
+              FROM added ad
+              FULL JOIN removed rm
+                ON rm.geom_hash = ad.geom_hash AND rm.gord = ad.gord
+        )
+        SELECT jsonb_build_object(
+            'type','Feature',
+            'id', c.id,
+            'geometry', ST_AsGeoJSON(e.geom)::jsonb,
+            'properties', e.properties
+                || jsonb_build_object('_change', c.change)
+                || CASE
+                       WHEN c.change = 'modified' THEN jsonb_build_object(
+                           '_previous_id', c.old_id,
+                           '_previous_properties', o.properties)
+                       ELSE '{{}}'::jsonb
+                   END
+        )
+          FROM changes c
+          JOIN edges e ON e.network_id = :nid AND e.id = c.id
+          LEFT JOIN edges o ON o.network_id = :nid AND o.id = c.old_id
+         ORDER BY c.change, c.id
+    """
+    return sql, params
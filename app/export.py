@@ -0,0 +1,271 @@
+# app/export.py
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterator, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+
+from app.config import EDGES_FETCH_SIZE, EXPORT_PARQUET_ROW_GROUP_SIZE
+from app.db import open_session
+from app.services import dump_json
+
+# format= value -> media type of the response
+EXPORT_MEDIA_TYPES = {
+    "geojson": "application/geo+json",
+    "ndjson": "application/x-ndjson",
+    "fgb": "application/flatgeobuf",
+    "parquet": "application/vnd.apache.parquet",
+}
+FORMAT_ALIASES = {
+    "json": "geojson",
+    "geojsonl": "ndjson",
+    "geojsonseq": "ndjson",
+    "flatgeobuf": "fgb",
+    "geoparquet": "parquet",
+}
+_ACCEPTED = {
+    **{media: fmt for fmt, media in EXPORT_MEDIA_TYPES.items()},
+    "application/json": "geojson",
+    "application/geo+json-seq": "ndjson",
+    "application/x-parquet": "parquet",
+}
+FILE_EXTENSIONS = {"ndjson": "geojsonl", "fgb": "fgb", "parquet": "parquet"}
+
+# GeoParquet 1.0 file metadata; CRS omitted means OGC:CRS84 (lon/lat, like SRID 4326)
+_GEO_METADATA = {
+    "version": "1.0.0",
+    "primary_column": "geometry",
+    "columns": {
+        "geometry": {"encoding": "WKB", "geometry_types": ["LineString"]},
+    },
+}
+_PARQUET_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("geometry", pa.binary()),
+        ("properties", pa.string()),
+    ],
+    metadata={"geo": json.dumps(_GEO_METADATA)},
+)
+_CHUNK = 1 << 20
+
+
+class NotAcceptable(ValueError):
+    """Raised when no media type in Accept is one the edges endpoint can produce."""
+
+    pass
+
+
+def negotiate_format(format_param: Optional[str], accept: Optional[str]) -> str:
+
+    # format= wins over Accept; Accept is matched in q order, */* means GeoJSON.
+    # ValueError for an unknown format=, NotAcceptable when Accept rules out all.
+
+    if format_param:
+        fmt = format_param.strip().lower()
+        fmt = FORMAT_ALIASES.get(fmt, fmt)
+        if fmt not in EXPORT_MEDIA_TYPES:
+            raise ValueError(
+                "format must be one of " + ", ".join(sorted(EXPORT_MEDIA_TYPES))
+            )
+        return fmt
+    if not accept:
+        return "geojson"
+    ranges = []
+    for i, part in enumerate(accept.split(",")):
+        media, *params = (p.strip() for p in part.split(";"))
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranges.append((-q, i, media.lower()))
+    for _, _, media in sorted(ranges):
+        if media in _ACCEPTED:
+            return _ACCEPTED[media]
+        if media in ("*/*", "application/*"):
+            return "geojson"
+    raise NotAcceptable("None of the accepted media types can be produced")
+
+
+def iter_ndjson(
+    scope: str,
+    params: Dict[str, Any],
+    fetch_size: int = EDGES_FETCH_SIZE,
+    bind: Optional[Engine] = None,
+) -> Iterator[bytes]:
+
+    # One GeoJSON Feature per line, streamed from a server-side cursor in its own
+    # session (the request's is closed before the body is sent)
+
+    db = open_session(bind)
+    try:
+        result = db.execute(
+            sa.text(
+                f"""
+                SELECT jsonb_build_object(
+                    'type','Feature',
+                    'id', e.id,
+                    'geometry', ST_AsGeoJSON(e.geom)::jsonb,
+                    'properties', e.properties
+                )
+                FROM edges e
+                WHERE {scope}
+            """
+            ),
+            params,
+            execution_options={"yield_per": fetch_size},
+        )
+        for rows in result.partitions():
+            yield b"".join(dump_json(row[0]) + b"\n" for row in rows)
+    finally:
+        db.close()
+
+
+def flatgeobuf_body(
+    scope: str, params: Dict[str, Any], bind: Optional[Engine] = None
+) -> Optional[bytes]:
+
+    # FlatGeobuf with its packed Hilbert R-tree. The index precedes the features, so
+    # PostGIS assembles the file (as with MVT tiles); properties becomes a single Json
+    # column. None when no edge matches: ST_AsFlatGeobuf over no rows is NULL.
+
+    db = open_session(bind)
+    try:
+        return db.execute(
+            sa.text(
+                f"""
+                SELECT ST_AsFlatGeobuf(f, true, 'geom')
+                  FROM (
+                        SELECT e.id::text AS id, e.geom, e.properties
+                          FROM edges e
+                         WHERE {scope}
+                  ) f
+            """
+            ),
+            params,
+        ).scalar_one()
+    finally:
+        db.close()
+
+
+def iter_chunks(body: bytes) -> Iterator[bytes]:
+    view = memoryview(body)
+    for start in range(0, len(view), _CHUNK):
+        yield bytes(view[start : start + _CHUNK])
+
+
+class _Drain:
+    """Write-only file object handing what pyarrow wrote so far to the caller."""
+
+    def __init__(self):
+        self.closed = False
+        self._buf = bytearray()
+        self._pos = 0
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to an aborted export")
+        self._buf += data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def iter_geoparquet(
+    scope: str,
+    params: Dict[str, Any],
+    fetch_size: int = EDGES_FETCH_SIZE,
+    row_group_size: int = EXPORT_PARQUET_ROW_GROUP_SIZE,
+    bind: Optional[Engine] = None,
+) -> Iterator[bytes]:
+
+    # GeoParquet (WKB geometry, properties as JSON text), one row group per
+    # row_group_size rows read from a server-side cursor; each row group is sent as
+    # soon as it is encoded, so memory stays bounded by one row group.
+
+    db = open_session(bind)
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, _PARQUET_SCHEMA, compression="zstd")
+    try:
+        result = db.execute(
+            sa.text(
+                f"""
+                SELECT e.id::text, ST_AsBinary(e.geom), e.properties::text
+                  FROM edges e
+                 WHERE {scope}
+            """
+            ),
+            params,
+            execution_options={"yield_per": fetch_size},
+        )
+        ids, geoms, props = [], [], []
+
+        def row_group() -> bytes:
+            writer.write_table(
+                pa.Table.from_arrays(
+                    [
+                        pa.array(ids, pa.string()),
+                        pa.array(geoms, pa.binary()),
+                        pa.array(props, pa.string()),
+                    ],
+                    schema=_PARQUET_SCHEMA,
+                ),
+                row_group_size=row_group_size,
+            )
+            ids.clear()
+            geoms.clear()
+            props.clear()
+            return sink.take()
+
+        for rows in result.partitions():
+            for eid, wkb, properties in rows:
+                ids.append(eid)
+                geoms.append(bytes(wkb))
+                props.append(properties)
+            if len(ids) >= row_group_size:
+                yield row_group()
+        if ids:
+            yield row_group()
+        writer.close()
+        yield sink.take()
+    except BaseException:
+        # abort without a footer: that would pass a truncated body off as a complete
+        # file, and an error from close() would hide the original one
+        sink.close()
+        writer.is_open = False
+        raise
+    finally:
+        db.close()
+
+
+def iter_export(
+    fmt: str, scope: str, params: Dict[str, Any], bind: Optional[Engine] = None
+) -> Iterator[bytes]:
+    if fmt == "ndjson":
+        return iter_ndjson(scope, params, bind=bind)
+    if fmt == "fgb":
+        return iter_chunks(flatgeobuf_body(scope, params, bind=bind) or b"")
+    if fmt == "parquet":
+        return iter_geoparquet(scope, params, bind=bind)
+    raise ValueError(f"Not an export format: {fmt}")
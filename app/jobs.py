@@ -0,0 +1,322 @@
+# app/jobs.py
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Optional
+
+import sqlalchemy as sa
+
+from app.compression import open_decompressed
+from app.config import INGEST_CHUNK_SIZE, JOBS_SPOOL_DIR, JOBS_WORKERS
+from app.db import SessionLocal, engine
+from app.normalize import IngestReport
+from app.services import (
+    GeoJSONParseError,
+    ensure_network,
+    find_network,
+    iter_geojson_features,
+    store_version,
+)
+
+log = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+# Advisory lock class of running jobs: a worker holds (class, hashtext(job id)) on its
+# own session for as long as it runs the job, so the lock is gone once it exits or dies
+_JOB_LOCK_CLASS = 0x6A6F62
+# unreferenced spool files younger than this may belong to a job being created
+_ORPHAN_SPOOL_AGE = 3600
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=JOBS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def spool_upload(src: BinaryIO) -> str:
+
+    # Copy an upload to local disk in chunks and return the file path
+
+    os.makedirs(JOBS_SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=JOBS_SPOOL_DIR, suffix=".geojson")
+    with os.fdopen(fd, "wb") as dst:
+        shutil.copyfileobj(src, dst, INGEST_CHUNK_SIZE)
+    return path
+
+
+def create_job(db, customer_id: str, kind: str, name: str, src: BinaryIO) -> str:
+
+    # Spool the upload, record a queued job and hand it to the worker pool
+
+    path = spool_upload(src)
+    try:
+        job_id = db.execute(
+            sa.text(
+                """
+            INSERT INTO ingest_jobs(customer_id, kind, network_name, spool_path)
+            VALUES (:cid, :kind, :name, :path)
+            RETURNING id
+        """
+            ),
+            {"cid": customer_id, "kind": kind, "name": name, "path": path},
+        ).scalar_one()
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.remove(path)
+        raise
+    _get_pool().submit(run_job, str(job_id))
+    return str(job_id)
+
+
+def _update_job(job_id: str, **fields: Any) -> None:
+    # Progress is written on its own connection so it is visible before the load commits
+    sets = ", ".join(f"{k} = :{k}" for k in fields)
+    with engine.begin() as conn:
+        conn.execute(
+            sa.text(f"UPDATE ingest_jobs SET {sets} WHERE id = :id"),
+            {"id": job_id, **fields},
+        )
+
+
+class _Progress:
+    """Reports parsed features together with inserted edges."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.report = IngestReport()
+
+    def __call__(self, inserted: int) -> None:
+        _update_job(
+            self.job_id,
+            features_parsed=self.report.features,
+            edges_inserted=inserted,
+        )
+
+
+def _claim_job(job_id: str):
+    # queued -> running exactly once, even when recovery submitted the job again
+    with engine.begin() as conn:
+        return conn.execute(
+            sa.text(
+                """
+            UPDATE ingest_jobs SET status = 'running', started_at = :now
+             WHERE id = :id AND status = 'queued'
+            RETURNING customer_id, kind, network_name, spool_path
+        """
+            ),
+            {"id": job_id, "now": datetime.now(timezone.utc)},
+        ).one_or_none()
+
+
+def _remove_spool(job_id: str, path: Optional[str]) -> None:
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        _update_job(job_id, spool_path=None)
+
+
+def run_job(job_id: str) -> None:
+
+    # Worker process entry point: parse, validate and bulk-load one spooled upload
+
+    lock = engine.connect()
+    try:
+        lock.execute(
+            sa.text("SELECT pg_advisory_lock(:cls, hashtext(:id))"),
+            {"cls": _JOB_LOCK_CLASS, "id": job_id},
+        )
+        # the lock is session-level; don't sit idle in a transaction meanwhile
+        lock.commit()
+        job = _claim_job(job_id)
+        if job is not None:
+            _run_claimed_job(job_id, job)
+    finally:
+        try:
+            lock.execute(
+                sa.text("SELECT pg_advisory_unlock(:cls, hashtext(:id))"),
+                {"cls": _JOB_LOCK_CLASS, "id": job_id},
+            )
+            lock.commit()
+        finally:
+            lock.close()
+
+
+def _run_claimed_job(job_id: str, job) -> None:
+    db = SessionLocal()
+    try:
+        progress = _Progress(job_id)
+        with open(job.spool_path, "rb") as fh:
+            features = iter_geojson_features(
+                open_decompressed(fh).read, report=progress.report
+            )
+            if job.kind == "create":
+                network_id = ensure_network(db, str(job.customer_id), job.network_name)
+            else:
+                network_id = find_network(db, str(job.customer_id), job.network_name)
+                if not network_id:
+                    raise LookupError("Network not found")
+            version_id, count = store_version(
+                db, network_id, features, progress=progress
+            )
+            db.commit()
+
+        _update_job(
+            job_id,
+            status="succeeded",
+            features_parsed=progress.report.features,
+            edges_inserted=count,
+            report=json.dumps(progress.report.as_dict()),
+            network_id=str(network_id),
+            version_id=str(version_id),
+            finished_at=datetime.now(timezone.utc),
+        )
+    except Exception as e:
+        db.rollback()
+        if isinstance(e, (GeoJSONParseError, LookupError)):
+            error = str(e)
+        else:
+            log.exception("ingest job %s failed", job_id)
+            error = "Internal error"
+        _update_job(
+            job_id,
+            status="failed",
+            error=error,
+            finished_at=datetime.now(timezone.utc),
+        )
+    finally:
+        db.close()
+        _remove_spool(job_id, job.spool_path)
+
+
+def recover_jobs() -> None:
+
+    # Called at startup. Jobs left running by a process that died are failed (their
+    # worker no longer holds the job lock), queued jobs are submitted again and
+    # spool files no job refers to are removed.
+
+    with engine.connect() as conn:
+        running = conn.execute(
+            sa.text(
+                "SELECT id::text, spool_path FROM ingest_jobs WHERE status = 'running'"
+            )
+        ).all()
+        conn.rollback()
+        for job_id, path in running:
+            params = {"cls": _JOB_LOCK_CLASS, "id": job_id}
+            if not conn.execute(
+                sa.text("SELECT pg_try_advisory_lock(:cls, hashtext(:id))"), params
+            ).scalar_one():
+                continue
+            try:
+                _update_job(
+                    job_id,
+                    status="failed",
+                    error="Interrupted: the worker stopped before the job finished",
+                    finished_at=datetime.now(timezone.utc),
+                )
+                _remove_spool(job_id, path)
+                log.warning("ingest job %s was interrupted, marked failed", job_id)
+            finally:
+                conn.execute(
+                    sa.text("SELECT pg_advisory_unlock(:cls, hashtext(:id))"), params
+                )
+                conn.rollback()
+
+        queued = (
+            conn.execute(
+                sa.text(
+                    """
+            SELECT id::text FROM ingest_jobs
+             WHERE status = 'queued' ORDER BY created_at
+        """
+                )
+            )
+            .scalars()
+            .all()
+        )
+        referenced = set(
+            conn.execute(
+                sa.text(
+                    "SELECT spool_path FROM ingest_jobs WHERE spool_path IS NOT NULL"
+                )
+            ).scalars()
+        )
+        conn.rollback()
+
+    for job_id in queued:
+        _get_pool().submit(run_job, job_id)
+    if queued:
+        log.info("resubmitted %d queued ingest jobs", len(queued))
+
+    if os.path.isdir(JOBS_SPOOL_DIR):
+        cutoff = time.time() - _ORPHAN_SPOOL_AGE
+        for name in os.listdir(JOBS_SPOOL_DIR):
+            path = os.path.join(JOBS_SPOOL_DIR, name)
+            try:
+                if path not in referenced and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def job_status(db, customer_id: str, job_id: str) -> Optional[Dict[str, Any]]:
+
+    # Status document for GET /jobs/{id}, None when the job isn't the customer's
+
+    row = db.execute(
+        sa.text(
+            """
+        SELECT id, kind, network_name, status, features_parsed, edges_inserted,
+               error, report, network_id, version_id, created_at, started_at, finished_at
+          FROM ingest_jobs
+         WHERE id = :id AND customer_id = :cid
+    """
+        ),
+        {"id": job_id, "cid": customer_id},
+    ).one_or_none()
+    if row is None:
+        return None
+
+    rate = None
+    if row.started_at is not None:
+        end = row.finished_at or datetime.now(timezone.utc)
+        elapsed = (end - row.started_at).total_seconds()
+        if elapsed > 0:
+            rate = round(row.edges_inserted / elapsed, 1)
+    return {
+        "job_id": str(row.id),
+        "kind": row.kind,
+        "name": row.network_name,
+        "status": row.status,
+        "features_parsed": row.features_parsed,
+        "edges_inserted": row.edges_inserted,
+        "edges_per_second": rate,
+        "error": row.error,
+        "report": row.report,
+        "network_id": str(row.network_id) if row.network_id else None,
+        "version_id": str(row.version_id) if row.version_id else None,
+        "created_at": row.created_at.isoformat(),
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+    }
@@ -1,49 +1,190 @@
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import anyio
+import logging
 import sqlalchemy as sa
-from datetime import datetime
-from typing import Optional
-from fastapi import Query, Depends, File, Form, UploadFile, HTTPException
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, List, Optional
+from fastapi import (
+    Body,
+    Query,
+    Depends,
+    File,
+    Form,
+    UploadFile,
+    Header,
+    HTTPException,
+    Request,
+)
 from uuid import UUID
-from app.db import get_db
-from app.auth import withApiAuth
+from app.db import get_db, get_read_db, read_session
+from app.auth import hash_api_key, revoke_api_key, withApiAuth
+from app.batch import (
+    iter_network_collections,
+    iter_tagged_collection,
+    resolve_versions,
+)
+from app.changeset import (
+    InvalidChangeset,
+    VersionConflict,
+    apply_changeset,
+    parse_changeset,
+)
+from app.compression import (
+    RequestDecompressionMiddleware,
+    encode,
+    iter_encoded,
+    negotiate_encoding,
+    open_decompressed,
+)
+from app.diff import diff_query
+from app.export import (
+    EXPORT_MEDIA_TYPES,
+    FILE_EXTENSIONS,
+    NotAcceptable,
+    flatgeobuf_body,
+    iter_chunks,
+    iter_export,
+    negotiate_format,
+)
+from app.jobs import create_job, job_status, recover_jobs
+from app.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    MetricsMiddleware,
+    render as render_metrics,
+    stage,
+    timed_iter,
+)
+from app.routing import RouteNotFound, parse_point, route
+from app.snap import parse_points, snap_points
+from app.topology import connected_components, dangling_edges
+from app.tiles import MVT_MEDIA_TYPE, get_tile, valid_tile
+from app.normalize import IngestReport
+from app.timeline import Timeline, network_timeline
+from app.response_cache import (
+    cached_payload,
+    etag_matches,
+    store_payload,
+    tee_into_cache,
+    validator_headers,
+)
+from app.config import (
+    EDGES_BATCH_MAX_NETWORKS,
+    EDGES_DEFAULT_PAGE_SIZE,
+    EDGES_MAX_PAGE_SIZE,
+    EDGES_STREAMING,
+    INGEST_CONCURRENCY,
+    METRICS_ENABLED,
+)
 
 from app.services import (
     ts_or_now,
-    version_at,
-    open_new_version,
     ensure_network,
-    load_geojson_bytes,
-    insert_edges,
+    find_network,
+    list_versions,
+    iter_geojson_features,
+    store_version,
+    version_edges_filter,
+    version_of_network,
+    edges_query_filter,
+    iter_feature_collection,
+    iter_jsonb_features,
+    page_links,
+    parse_bbox,
+    parse_polygon,
+    encode_page_cursor,
+    decode_page_cursor,
     GeoJSONParseError,
 )
 
-app = FastAPI(title="Road Networks API")
+log = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # pick up ingest jobs a previous process left queued or running
+    try:
+        await anyio.to_thread.run_sync(recover_jobs)
+    except Exception:
+        log.exception("ingest job recovery failed")
+    yield
+
+
+app = FastAPI(title="Road Networks API", lifespan=lifespan)
+# request timing and stage breakdown (inside the decompression middleware, which
+# copies the ASGI scope, so the matched route is visible here)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+# Content-Encoding: gzip / zstd request bodies are decoded while they stream in
+app.add_middleware(RequestDecompressionMiddleware)
+
+# Uploads parse and write on worker threads so the event loop keeps serving other
+# requests; the limiter keeps them from taking every thread and pooled connection.
+_ingest_limiter = anyio.CapacityLimiter(INGEST_CONCURRENCY)
+
+
+def require_network(db, network_id: UUID, customer_id: str) -> Timeline:
+    # ownership and versions come from the cached timeline in one step
+    timeline = network_timeline(db, str(network_id))
+    if timeline is None or timeline.customer_id != customer_id:
+        raise HTTPException(status_code=404, detail="Network not found")
+    return timeline
+
+
+async def run_ingest(fn, *args):
+    return await anyio.to_thread.run_sync(partial(fn, *args), limiter=_ingest_limiter)
+
+
+async def enqueue_ingest(db, customer_id: str, kind: str, name: str, file: UploadFile):
+    job_id = await anyio.to_thread.run_sync(
+        partial(create_job, db, customer_id, kind, name, file.file)
+    )
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued"},
+        headers={"Location": f"/jobs/{job_id}"},
+    )
 
 
 @app.post("/networks")
 async def create_network(
     name: str = Form(...),
     file: UploadFile = File(...),
+    job: bool = Query(
+        False, description="Load in the background; returns 202 + job id."
+    ),
     customer_id: str = Depends(withApiAuth),
     db=Depends(get_db),
 ):
+    if job:
+        return await enqueue_ingest(db, customer_id, "create", name, file)
+    return await run_ingest(_create_network, db, customer_id, name, file)
+
+
+def _create_network(db, customer_id: str, name: str, file: UploadFile):
     try:
-        data = await file.read()
+        # features are parsed from the upload in chunks while they are inserted
+        # (.geojson.gz / .zst uploads are decompressed on the fly)
+        report = IngestReport()
+        features = timed_iter(
+            iter_geojson_features(open_decompressed(file.file).read, report=report),
+            "parse",
+        )
         try:
-            features = load_geojson_bytes(data)
+            network_id = ensure_network(db, customer_id, name)
+            version_id, count = store_version(db, network_id, features)
         except GeoJSONParseError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
-        network_id = ensure_network(db, customer_id, name)
-        version_id = open_new_version(db, network_id)
-        count = insert_edges(db, version_id, features)
-
-        db.commit()  # <- commit the existing session txn
+        with stage("commit"):
+            db.commit()  # <- commit the existing session txn
         return {
             "network_id": network_id,
             "version_id": version_id,
             "edges_inserted": count,
+            "report": report.as_dict(),
         }
 
     except Exception:
@@ -55,77 +196,318 @@ async def create_network(
 async def update_network(
     name: str = Form(...),
     file: UploadFile = File(...),
+    job: bool = Query(
+        False, description="Load in the background; returns 202 + job id."
+    ),
     customer_id: str = Depends(withApiAuth),
     db=Depends(get_db),
 ):
+    if job:
+        if not await anyio.to_thread.run_sync(find_network, db, customer_id, name):
+            raise HTTPException(status_code=404, detail="Network not found")
+        return await enqueue_ingest(db, customer_id, "update", name, file)
+    return await run_ingest(_update_network, db, customer_id, name, file)
+
+
+def _update_network(db, customer_id: str, name: str, file: UploadFile):
     try:
         # find the network owned by this customer
-        net_id = db.execute(
-            sa.text(
-                """
-            SELECT id FROM networks
-            WHERE customer_id = :cid AND name = :name
-        """
-            ),
-            {"cid": customer_id, "name": name},
-        ).scalar_one_or_none()
+        net_id = find_network(db, customer_id, name)
         if not net_id:
             raise HTTPException(status_code=404, detail="Network not found")
 
-        data = await file.read()
+        report = IngestReport()
+        features = timed_iter(
+            iter_geojson_features(open_decompressed(file.file).read, report=report),
+            "parse",
+        )
         try:
-            features = load_geojson_bytes(data)
+            # open a new version & insert edges
+            version_id, count = store_version(db, net_id, features)
         except GeoJSONParseError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
-        # open a new version & insert edges
-        version_id = open_new_version(db, net_id)
-        count = insert_edges(db, version_id, features)
+        with stage("commit"):
+            db.commit()
+        return {
+            "network_id": net_id,
+            "version_id": version_id,
+            "edges_inserted": count,
+            "report": report.as_dict(),
+        }
 
-        db.commit()
-        return {"network_id": net_id, "version_id": version_id, "edges_inserted": count}
+    except Exception:
+        db.rollback()
+        raise
+
+
+@app.patch(
+    "/networks/{network_id}",
+    summary="Apply a changeset (added, removed and modified edges) as a new version",
+)
+async def patch_network(
+    network_id: UUID,
+    add: Optional[List[Any]] = Body(None, description="GeoJSON Features to add."),
+    remove: Optional[List[str]] = Body(None, description="Ids of edges to remove."),
+    modify: Optional[List[Any]] = Body(
+        None,
+        description='{"id", "geometry", "properties"} per edge to change; '
+        "an omitted geometry or properties is kept.",
+    ),
+    base_version_id: Optional[UUID] = Body(
+        None, description="Fail with 409 unless this is still the current version."
+    ),
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_db),
+):
+    return await run_ingest(
+        _patch_network,
+        db,
+        network_id,
+        customer_id,
+        add,
+        remove,
+        modify,
+        base_version_id,
+    )
+
+
+def _patch_network(
+    db,
+    network_id: UUID,
+    customer_id: str,
+    add,
+    remove,
+    modify,
+    base_version_id: Optional[UUID],
+):
+    try:
+        # authorize
+        require_network(db, network_id, customer_id)
+
+        try:
+            with stage("parse"):
+                changeset = parse_changeset(add, remove, modify)
+            result = apply_changeset(
+                db,
+                str(network_id),
+                changeset,
+                str(base_version_id) if base_version_id else None,
+            )
+        except InvalidChangeset as e:
+            raise HTTPException(
+                status_code=400, detail={"message": str(e), "errors": e.errors}
+            )
+        except VersionConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+        with stage("commit"):
+            db.commit()
+        return result
 
     except Exception:
         db.rollback()
         raise
 
 
+@app.delete(
+    "/api-keys/current", status_code=204, summary="Revoke the API key of this request"
+)
+def revoke_current_api_key(
+    x_api_key: str = Header(..., alias="X-API-Key"),
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_db),
+):
+    revoke_api_key(db, hash_api_key(x_api_key))
+    return Response(status_code=204)
+
+
+@app.get("/jobs/{job_id}", summary="Status and progress of an ingest job")
+def get_job(
+    job_id: UUID,
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_db),
+):
+    status = job_status(db, customer_id, str(job_id))
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+@app.get(
+    "/networks/{network_id}/versions",
+    summary="Versions of a network with validity windows and summary stats",
+)
+def get_versions(
+    network_id: UUID,
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_read_db),
+):
+    # authorize
+    require_network(db, network_id, customer_id)
+
+    return {
+        "network_id": str(network_id),
+        "versions": list_versions(db, str(network_id)),
+    }
+
+
+@app.put(
+    "/networks/{network_id}/retention",
+    summary="Set how many / how old closed versions are kept",
+)
+def put_retention(
+    network_id: UUID,
+    retain_versions: Optional[int] = Body(
+        None, ge=1, description="Newest versions to keep (current included)."
+    ),
+    retain_for: Optional[timedelta] = Body(
+        None, description="Keep closed versions this long (seconds or ISO 8601)."
+    ),
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_db),
+):
+    # authorize
+    require_network(db, network_id, customer_id)
+
+    # applied by the retention job (python -m app.retention)
+    db.execute(
+        sa.text(
+            """
+            UPDATE networks
+               SET retain_versions = :keep, retain_for = :age
+             WHERE id = :nid
+        """
+        ),
+        {"nid": str(network_id), "keep": retain_versions, "age": retain_for},
+    )
+    db.commit()
+    return {
+        "network_id": str(network_id),
+        "retain_versions": retain_versions,
+        "retain_for": retain_for,
+    }
+
+
 @app.get(
     "/networks/{network_id}/edges",
     response_class=JSONResponse,
     summary="Get edges as GeoJSON at a point in time (Task 3)",
 )
 def get_edges_by_id(
+    request: Request,
     network_id: UUID,
     datetime_param: Optional[datetime] = Query(
         None,
         alias="datetime",
         description="RFC3339 timestamp (e.g., 2025-09-06T05:10:00Z). Default: now (UTC).",
     ),
+    bbox: Optional[str] = Query(
+        None, description="minx,miny,maxx,maxy in lon/lat; edges intersecting it."
+    ),
+    intersects: Optional[str] = Query(
+        None, description="GeoJSON Polygon/MultiPolygon; edges intersecting it."
+    ),
+    limit: Optional[int] = Query(
+        None, ge=1, le=EDGES_MAX_PAGE_SIZE, description="Page size (ordered by id)."
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from a previous page's next link."
+    ),
+    format_param: Optional[str] = Query(
+        None,
+        alias="format",
+        description="geojson (default), ndjson, fgb or parquet; overrides Accept.",
+    ),
     customer_id: str = Depends(withApiAuth),
-    db=Depends(get_db),
+    db=Depends(get_read_db),
 ):
     ts = ts_or_now(datetime_param)
 
-    # authorize
-    owns = db.execute(
-        sa.text("SELECT 1 FROM networks WHERE id = :nid AND customer_id = :cid"),
-        {"nid": str(network_id), "cid": customer_id},
-    ).scalar_one_or_none()
-    if not owns:
-        raise HTTPException(status_code=404, detail="Network not found")
+    try:
+        bbox_vals = parse_bbox(bbox) if bbox else None
+        polygon = parse_polygon(intersects) if intersects else None
+        page = decode_page_cursor(cursor) if cursor else None
+        fmt = negotiate_format(format_param, request.headers.get("accept"))
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fmt != "geojson" and (limit is not None or page):
+        raise HTTPException(
+            status_code=400, detail="limit and cursor only apply to GeoJSON"
+        )
 
-    # find version
-    version_id = version_at(db, str(network_id), ts)
+    with stage("version"):
+        # authorize
+        timeline = require_network(db, network_id, customer_id)
+
+        # find version (a cursor keeps paging the version it was issued for)
+        after = None
+        if page:
+            version_id, after = page
+            # (the timeline may predate a version opened by another worker)
+            if version_id not in timeline and not version_of_network(
+                db, str(network_id), version_id
+            ):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            if limit is None:
+                limit = EDGES_DEFAULT_PAGE_SIZE
+        else:
+            version_id = timeline.at(ts)
+    if fmt != "geojson":
+        return export_edges(request, fmt, db, version_id, bbox_vals, polygon)
     if not version_id:
-        return JSONResponse(
-            content={"type": "FeatureCollection", "features": []},
-            media_type="application/geo+json",
+        content = {"type": "FeatureCollection", "features": []}
+        if limit is not None:
+            content["links"] = page_links(None)
+        return JSONResponse(content=content, media_type="application/geo+json")
+
+    # whole-version responses are cached and validated by version id
+    whole = bbox_vals is None and polygon is None and limit is None
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if whole:
+        headers = validator_headers(version_id, encoding=encoding)
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if whole:
+        with stage("cache"):
+            body = cached_payload(version_id, encoding)
+        if body is not None:
+            return Response(
+                content=body, media_type="application/geo+json", headers=headers
+            )
+
+    scope, scope_params = version_edges_filter(db, version_id)
+    where, params = edges_query_filter(
+        scope, scope_params, bbox=bbox_vals, polygon=polygon, after=after
+    )
+
+    def next_link(last_id: str) -> str:
+        token = encode_page_cursor(version_id, last_id)
+        return str(request.url.include_query_params(cursor=token, limit=limit))
+
+    if EDGES_STREAMING:
+        chunks = iter_feature_collection(
+            where, params, limit=limit, next_link=next_link, bind=db.get_bind()
+        )
+        chunks = timed_iter(iter_encoded(chunks, encoding), "serialize")
+        if whole:
+            chunks = tee_into_cache(version_id, chunks, encoding)
+        return StreamingResponse(
+            chunks, media_type="application/geo+json", headers=headers
         )
 
     # build FeatureCollection in Postgres
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT :page_limit"
+        params["page_limit"] = limit + 1
     sql = sa.text(
-        """
+        f"""
         WITH f AS (
             SELECT
                 e.id,
@@ -137,8 +519,9 @@ def get_edges_by_id(
                     END
                 )::jsonb AS geom_json
             FROM edges e
-            WHERE e.network_version_id = :vid
+            WHERE {where}
             ORDER BY e.id
+            {limit_sql}
         )
         SELECT jsonb_build_object(
             'type','FeatureCollection',
@@ -159,5 +542,348 @@ def get_edges_by_id(
     """
     )
 
-    fc = db.execute(sql, {"vid": str(version_id)}).scalar_one()
-    return JSONResponse(content=fc, media_type="application/geo+json")
+    with stage("query"):
+        fc = db.execute(sql, params).scalar_one()
+    with stage("serialize"):
+        if limit is not None:
+            features = fc["features"]
+            has_more = len(features) > limit
+            del features[limit:]
+            fc["links"] = page_links(
+                next_link(features[-1]["id"]) if has_more else None
+            )
+        body = encode(JSONResponse(content=fc).body, encoding)
+    if whole:
+        store_payload(version_id, body, encoding)
+    return Response(content=body, media_type="application/geo+json", headers=headers)
+
+
+def export_edges(request: Request, fmt: str, db, version_id, bbox_vals, polygon):
+    # a version as NDJSON, FlatGeobuf or GeoParquet, streamed; without a version the
+    # body holds no features
+    whole = bbox_vals is None and polygon is None
+    # Parquet pages are compressed already
+    encoding = None
+    if fmt != "parquet":
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if version_id:
+        scope, scope_params = version_edges_filter(db, version_id)
+        if whole:
+            headers = validator_headers(version_id, fmt, encoding)
+            if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+        name = f"{version_id}.{FILE_EXTENSIONS[fmt]}"
+        headers["Content-Disposition"] = f'attachment; filename="{name}"'
+    else:
+        scope, scope_params = "false", {}
+    where, params = edges_query_filter(
+        scope, scope_params, bbox=bbox_vals, polygon=polygon
+    )
+    if fmt == "fgb":
+        # PostGIS builds the whole file before sending; without edges there is none
+        body = flatgeobuf_body(where, params, bind=db.get_bind())
+        if body is None:
+            headers.pop("Content-Disposition", None)
+            return Response(status_code=204, headers=headers)
+        chunks = iter_chunks(body)
+    else:
+        chunks = iter_export(fmt, where, params, bind=db.get_bind())
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        iter_encoded(chunks, encoding),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers=headers,
+    )
+
+
+@app.post(
+    "/networks/edges:batch",
+    response_class=StreamingResponse,
+    summary="Edges of many networks at one point in time",
+)
+def get_edges_batch(
+    request: Request,
+    network_ids: Optional[List[UUID]] = Body(
+        None, description="Networks to read. Default: all of the customer's networks."
+    ),
+    datetime_param: Optional[datetime] = Body(
+        None,
+        alias="datetime",
+        description="RFC3339 timestamp shared by all networks. Default: now (UTC).",
+    ),
+    bbox: Optional[str] = Body(
+        None, description="minx,miny,maxx,maxy in lon/lat; edges intersecting it."
+    ),
+    merge: bool = Body(
+        False,
+        description="One FeatureCollection whose features carry network_id, "
+        "instead of one collection per network.",
+    ),
+    customer_id: str = Depends(withApiAuth),
+):
+    ts = ts_or_now(datetime_param)
+    try:
+        bbox_vals = parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ids = None
+    if network_ids is not None:
+        ids = list(dict.fromkeys(str(nid) for nid in network_ids))
+        if len(ids) > EDGES_BATCH_MAX_NETWORKS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {EDGES_BATCH_MAX_NETWORKS} networks per request",
+            )
+
+    # authorize and find every version in one query
+    with read_session(ids) as db, stage("version"):
+        networks = resolve_versions(db, customer_id, ids, ts)
+        bind = db.get_bind()
+    if ids is not None and len(networks) < len(ids):
+        found = {n.network_id for n in networks}
+        missing = ", ".join(nid for nid in ids if nid not in found)
+        raise HTTPException(status_code=404, detail=f"Network not found: {missing}")
+    if len(networks) > EDGES_BATCH_MAX_NETWORKS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"More than {EDGES_BATCH_MAX_NETWORKS} networks; "
+            "pass network_ids",
+        )
+
+    if merge:
+        chunks = iter_tagged_collection(networks, bbox=bbox_vals, bind=bind)
+        media_type = "application/geo+json"
+    else:
+        chunks = iter_network_collections(networks, ts, bbox=bbox_vals, bind=bind)
+        media_type = "application/json"
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        timed_iter(iter_encoded(chunks, encoding), "serialize"),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@app.get(
+    "/networks/{network_id}/tiles/{z}/{x}/{y}.mvt",
+    response_class=Response,
+    summary="Get edges as a Mapbox Vector Tile at a point in time",
+)
+def get_edges_tile(
+    network_id: UUID,
+    z: int,
+    x: int,
+    y: int,
+    datetime_param: Optional[datetime] = Query(
+        None,
+        alias="datetime",
+        description="RFC3339 timestamp (e.g., 2025-09-06T05:10:00Z). Default: now (UTC).",
+    ),
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_read_db),
+):
+    if not valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    ts = ts_or_now(datetime_param)
+
+    # authorize
+    timeline = require_network(db, network_id, customer_id)
+
+    version_id = timeline.at(ts)
+    if not version_id:
+        return Response(content=b"", media_type=MVT_MEDIA_TYPE)
+
+    return Response(
+        content=get_tile(db, version_id, z, x, y), media_type=MVT_MEDIA_TYPE
+    )
+
+
+@app.get(
+    "/networks/{network_id}/route",
+    summary="Shortest path between two points at a point in time",
+)
+def get_route(
+    network_id: UUID,
+    from_param: str = Query(..., alias="from", description="Origin as lon,lat."),
+    to_param: str = Query(..., alias="to", description="Destination as lon,lat."),
+    datetime_param: Optional[datetime] = Query(
+        None,
+        alias="datetime",
+        description="RFC3339 timestamp (e.g., 2025-09-06T05:10:00Z). Default: now (UTC).",
+    ),
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_read_db),
+):
+    try:
+        origin = parse_point(from_param)
+        destination = parse_point(to_param)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ts = ts_or_now(datetime_param)
+
+    # authorize
+    timeline = require_network(db, network_id, customer_id)
+
+    version_id = timeline.at(ts)
+    if not version_id:
+        raise HTTPException(status_code=404, detail="No version at this time")
+    try:
+        feature = route(db, version_id, origin, destination)
+    except RouteNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return JSONResponse(content=feature, media_type="application/geo+json")
+
+
+@app.post(
+    "/networks/{network_id}/snap",
+    summary="Snap a batch of points to their nearest edges at a point in time",
+)
+async def snap_to_edges(
+    request: Request,
+    network_id: UUID,
+    datetime_param: Optional[datetime] = Query(
+        None,
+        alias="datetime",
+        description="RFC3339 timestamp (e.g., 2025-09-06T05:10:00Z). Default: now (UTC).",
+    ),
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_read_db),
+):
+    body = await request.body()
+    try:
+        points = parse_points(body, request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ts = ts_or_now(datetime_param)
+    return await anyio.to_thread.run_sync(
+        partial(_snap_to_edges, db, network_id, customer_id, ts, points)
+    )
+
+
+def _snap_to_edges(db, network_id: UUID, customer_id: str, ts: datetime, points):
+    # authorize
+    timeline = require_network(db, network_id, customer_id)
+
+    version_id = timeline.at(ts)
+    if not version_id:
+        raise HTTPException(status_code=404, detail="No version at this time")
+    return {
+        "version_id": str(version_id),
+        "results": snap_points(db, version_id, points),
+    }
+
+
+@app.get(
+    "/networks/{network_id}/components",
+    summary="Connected components of the network at a point in time",
+)
+def get_components(
+    network_id: UUID,
+    datetime_param: Optional[datetime] = Query(
+        None,
+        alias="datetime",
+        description="RFC3339 timestamp (e.g., 2025-09-06T05:10:00Z). Default: now (UTC).",
+    ),
+    include_edges: bool = Query(
+        False, description="List the edge ids of every component."
+    ),
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_read_db),
+):
+    ts = ts_or_now(datetime_param)
+
+    # authorize
+    timeline = require_network(db, network_id, customer_id)
+
+    version_id = timeline.at(ts)
+    if not version_id:
+        return {"version_id": None, "component_count": 0, "components": []}
+    components = connected_components(db, version_id, include_edges=include_edges)
+    return {
+        "version_id": str(version_id),
+        "component_count": len(components),
+        "components": components,
+    }
+
+
+@app.get(
+    "/networks/{network_id}/dangling",
+    response_class=JSONResponse,
+    summary="Edges with an unconnected endpoint at a point in time",
+)
+def get_dangling_edges(
+    network_id: UUID,
+    datetime_param: Optional[datetime] = Query(
+        None,
+        alias="datetime",
+        description="RFC3339 timestamp (e.g., 2025-09-06T05:10:00Z). Default: now (UTC).",
+    ),
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_read_db),
+):
+    ts = ts_or_now(datetime_param)
+
+    # authorize
+    timeline = require_network(db, network_id, customer_id)
+
+    version_id = timeline.at(ts)
+    if not version_id:
+        return JSONResponse(
+            content={"type": "FeatureCollection", "features": []},
+            media_type="application/geo+json",
+        )
+    return JSONResponse(
+        content=dangling_edges(db, version_id), media_type="application/geo+json"
+    )
+
+
+@app.get(
+    "/networks/{network_id}/diff",
+    response_class=StreamingResponse,
+    summary="Edges added, removed or modified between two points in time",
+)
+def get_diff(
+    network_id: UUID,
+    from_param: datetime = Query(
+        ..., alias="from", description="RFC3339 timestamp of the old state."
+    ),
+    to_param: Optional[datetime] = Query(
+        None,
+        alias="to",
+        description="RFC3339 timestamp of the new state. Default: now (UTC).",
+    ),
+    customer_id: str = Depends(withApiAuth),
+    db=Depends(get_read_db),
+):
+    # authorize
+    timeline = require_network(db, network_id, customer_id)
+
+    old_version = timeline.at(ts_or_now(from_param))
+    new_version = timeline.at(ts_or_now(to_param))
+    if old_version == new_version:
+        return JSONResponse(
+            content={"type": "FeatureCollection", "features": []},
+            media_type="application/geo+json",
+        )
+    sql, params = diff_query(db, old_version, new_version)
+    return StreamingResponse(
+        iter_jsonb_features(sql, params, bind=db.get_bind()),
+        media_type="application/geo+json",
+    )
+
+
+if METRICS_ENABLED:
+
+    @app.get(
+        "/metrics",
+        response_class=Response,
+        include_in_schema=False,
+        summary="Prometheus metrics of this process",
+    )
+    def get_metrics():
+        return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,375 @@
+# app/metrics.py
+#
+# In-process metrics in the Prometheus text format (GET /metrics), per-request stage
+# timings (also sent back as a Server-Timing header) and SQL timing from engine
+# events. Metrics are per process: scrape every worker.
+from __future__ import annotations
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from app.config import SERVER_TIMING_HEADER
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# seconds; uploads of large files take minutes
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    """Monotonic counter per label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, v in items:
+            yield f"{self.name}{_labels(self.labels, values)} {_number(v)}"
+
+
+class Histogram(_Metric):
+    """Cumulative histogram per label values."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # label values -> [bucket counts..., sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            row = self._values.get(label_values)
+            if row is None:
+                row = self._values[label_values] = [0.0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for values, row in items:
+            count = 0.0
+            for bound, n in zip(self.buckets, row):
+                count += n
+                le = f'le="{_number(bound)}"'
+                yield (
+                    f"{self.name}_bucket{_labels(self.labels, values, le)} "
+                    f"{_number(count)}"
+                )
+            yield f"{self.name}_sum{_labels(self.labels, values)} {_number(row[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, values)} {_number(count)}"
+
+
+class CallbackGauge(_Metric):
+    """Gauge (or counter) whose values are read when metrics are scraped.
+
+    fn returns a number, or {label values: number} when the metric has labels.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Any],
+        kind: str = "gauge",
+        labels: Tuple[str, ...] = (),
+    ):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self) -> Iterable[str]:
+        value = self.fn()
+        if not self.labels:
+            yield f"{self.name} {_number(value)}"
+            return
+        for values, v in sorted(value.items()):
+            yield f"{self.name}{_labels(self.labels, values)} {_number(v)}"
+
+
+def render() -> str:
+    return "".join(m.render() for m in _registry)
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start until the last body byte was sent.",
+    ("method", "route"),
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "Requests handled, by response status.",
+    ("method", "route", "status"),
+)
+STAGE_DURATION = Histogram(
+    "stage_duration_seconds",
+    "Time spent in each stage of a request (nested stages are not counted twice).",
+    ("route", "stage"),
+)
+SQL_DURATION = Histogram(
+    "sql_query_duration_seconds",
+    "Statement execution time (until the first rows are available).",
+    ("statement",),
+)
+
+
+class Timings:
+    """Exclusive time per stage of one request, plus SQL time."""
+
+    __slots__ = ("started", "stages", "stack", "sql_seconds", "sql_count")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        # [name, time the stage (re)started]; the innermost stage is running
+        self.stack: List[list] = []
+        self.sql_seconds = 0.0
+        self.sql_count = 0
+
+    def enter(self, name: str, now: float) -> None:
+        if self.stack:
+            parent = self.stack[-1]
+            self.stages[parent[0]] = self.stages.get(parent[0], 0.0) + now - parent[1]
+        self.stack.append([name, now])
+
+    def exit(self, now: float) -> None:
+        name, resumed = self.stack.pop()
+        self.stages[name] = self.stages.get(name, 0.0) + now - resumed
+        if self.stack:
+            self.stack[-1][1] = now
+
+    def header(self, now: float) -> str:
+        parts = [f"{name};dur={s * 1000:.1f}" for name, s in self.stages.items()]
+        if self.sql_count:
+            parts.append(
+                f'db;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_count} queries"'
+            )
+        parts.append(f"total;dur={(now - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[Timings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+
+    # Time a block as stage `name` of the current request. Outside a request the
+    # block is observed on its own (route "").
+
+    timings = _current.get()
+    if timings is None:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            STAGE_DURATION.observe(time.perf_counter() - t0, "", name)
+        return
+    timings.enter(name, time.perf_counter())
+    try:
+        yield
+    finally:
+        timings.exit(time.perf_counter())
+
+
+def timed_iter(items: Iterable, name: str) -> Iterator:
+
+    # Count the time spent producing each item of a lazy iterator (parsing an upload,
+    # serializing a streamed body) as stage `name`
+
+    it = iter(items)
+    while True:
+        with stage(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+_VERB = re.compile(r"^\s*(?:--[^\n]*\n\s*)*(\w+)", re.I)
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+([a-z_][a-z0-9_.]*)", re.I)
+
+
+@lru_cache(maxsize=2048)
+def statement_tag(statement: str) -> str:
+    # "<verb> <first table>", e.g. "SELECT network_versions", "INSERT edges"
+    verb = _VERB.match(statement)
+    table = _TABLE.search(statement)
+    tag = verb.group(1).upper() if verb else "?"
+    if table:
+        tag += " " + table.group(1).lower()
+    return tag
+
+
+# name -> connection pool, for the db_pool_* gauges
+_pools: Dict[str, Any] = {}
+
+
+def _pool_gauge(read: Callable[[QueuePool], int]) -> Callable[[], Dict]:
+    # only QueuePools count their connections
+    return lambda: {
+        (name,): read(pool)
+        for name, pool in list(_pools.items())
+        if isinstance(pool, QueuePool)
+    }
+
+
+for _name, _read, _text in (
+    ("db_pool_size", QueuePool.size, "Connections the pool keeps."),
+    ("db_pool_checked_out", QueuePool.checkedout, "Connections in use."),
+    ("db_pool_checked_in", QueuePool.checkedin, "Idle connections in the pool."),
+    (
+        "db_pool_overflow",
+        # negative while the pool itself isn't full
+        lambda pool: max(0, pool.overflow()),
+        "Connections opened beyond the pool size.",
+    ),
+):
+    CallbackGauge(_name, _text, _pool_gauge(_read), labels=("pool",))
+
+
+def instrument_engine(engine, name: str = "primary") -> None:
+
+    # SQL timing through engine events; the engine's pool is exported as `name`
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        SQL_DURATION.observe(elapsed, statement_tag(statement))
+        timings = _current.get()
+        if timings is not None:
+            timings.sql_seconds += elapsed
+            timings.sql_count += 1
+
+    _pools[name] = engine.pool
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing requests per route and collecting their stage timings.
+
+    Stages that finish before the response starts are reported in a Server-Timing
+    header; a streamed body's serialization is only in the stage histogram.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = Timings()
+        token = _current.set(timings)
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING_HEADER:
+                    value = timings.header(time.perf_counter())
+                    message = {
+                        **message,
+                        "headers": [
+                            *message.get("headers", []),
+                            (b"server-timing", value.encode("latin-1")),
+                        ],
+                    }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - timings.started
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_DURATION.observe(elapsed, scope["method"], path)
+            REQUESTS.inc(scope["method"], path, str(status))
+            for name, seconds in timings.stages.items():
+                STAGE_DURATION.observe(seconds, path, name)
@@ -1,7 +1,7 @@
 # app/models.py
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional, Any
 import sqlalchemy as sa
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
@@ -65,6 +65,10 @@ class Network(Base):
         pg.UUID(as_uuid=True), sa.ForeignKey("customers.id", ondelete="CASCADE")
     )
     name: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    # Retention policy: closed versions beyond the newest retain_versions, or closed
+    # for longer than retain_for, are removed by app.retention. NULL keeps all.
+    retain_versions: Mapped[Optional[int]] = mapped_column(sa.Integer, nullable=True)
+    retain_for: Mapped[Optional[timedelta]] = mapped_column(pg.INTERVAL, nullable=True)
 
     customer: Mapped["Customer"] = relationship(back_populates="networks")
     versions: Mapped[List["NetworkVersion"]] = relationship(
@@ -94,6 +98,17 @@ class NetworkVersion(Base):
     valid_to: Mapped[Optional[datetime]] = mapped_column(
         pg.TIMESTAMP(timezone=True), nullable=True
     )
+    # [valid_from, valid_to) as a range, for GiST lookups and the no-overlap constraint
+    validity: Mapped[Any] = mapped_column(
+        pg.TSTZRANGE,
+        sa.Computed("tstzrange(valid_from, valid_to, '[)')", persisted=True),
+        nullable=False,
+    )
+    # "full": edges rows belong to this version only; "delta": edges are shared
+    # across versions and selected by their own validity window.
+    storage: Mapped[str] = mapped_column(
+        sa.Text, nullable=False, server_default=sa.text("'full'")
+    )
 
     network: Mapped["Network"] = relationship(back_populates="versions")
     edges: Mapped[List["Edge"]] = relationship(
@@ -111,6 +126,14 @@ class NetworkVersion(Base):
         sa.CheckConstraint(
             "valid_to IS NULL OR valid_to > valid_from", name="ck_version_window"
         ),
+        sa.CheckConstraint("storage IN ('full', 'delta')", name="ck_version_storage"),
+        # Versions of a network never overlap in time (needs btree_gist):
+        pg.ExcludeConstraint(
+            ("network_id", "="),
+            ("validity", "&&"),
+            name="ex_version_validity",
+            using="gist",
+        ),
     )
 
 
@@ -122,10 +145,11 @@ class Edge(Base):
         server_default=sa.text("gen_random_uuid()"),
         primary_key=True,
     )
-    network_version_id: Mapped[sa.UUID] = mapped_column(
+    # Version that wrote the row; NULL once retention removed it (delta rows only).
+    network_version_id: Mapped[Optional[sa.UUID]] = mapped_column(
         pg.UUID(as_uuid=True),
         sa.ForeignKey("network_versions.id", ondelete="CASCADE"),
-        nullable=False,
+        nullable=True,
     )
     # Store the centerline geometry; GeoJSON is LINESTRING in SRID 4326.
     geom: Mapped[Any] = mapped_column(
@@ -139,11 +163,166 @@ class Edge(Base):
     created_at: Mapped[datetime] = mapped_column(
         pg.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False
     )
+    # Content address of geometry + properties:
+    content_hash: Mapped[bytes] = mapped_column(
+        pg.BYTEA,
+        sa.Computed("digest(ST_AsHEXEWKB(geom) || properties::text, 'sha256')"),
+        nullable=False,
+    )
+    # Content address of the geometry alone (pairs property edits in diffs):
+    geom_hash: Mapped[bytes] = mapped_column(
+        pg.BYTEA,
+        sa.Computed("digest(ST_AsHEXEWKB(geom), 'sha256')"),
+        nullable=False,
+    )
+    # Partition key (HASH); part of the primary key.
+    network_id: Mapped[sa.UUID] = mapped_column(
+        pg.UUID(as_uuid=True),
+        sa.ForeignKey("networks.id", ondelete="CASCADE", name="fk_edges_network"),
+        primary_key=True,
+    )
+    # Delta storage only: the validity window of a shared edge.
+    valid_from: Mapped[Optional[datetime]] = mapped_column(
+        pg.TIMESTAMP(timezone=True), nullable=True
+    )
+    valid_to: Mapped[Optional[datetime]] = mapped_column(
+        pg.TIMESTAMP(timezone=True), nullable=True
+    )
+    # Topology: nodes.id of the snapped start/end point, filled at ingest.
+    source_node: Mapped[Optional[int]] = mapped_column(sa.BigInteger, nullable=True)
+    target_node: Mapped[Optional[int]] = mapped_column(sa.BigInteger, nullable=True)
 
-    version: Mapped["NetworkVersion"] = relationship(back_populates="edges")
+    version: Mapped[Optional["NetworkVersion"]] = relationship(back_populates="edges")
 
     __table_args__ = (
         # Spatial index (explicit in migration):
         sa.Index("ix_edges_geom", "geom", postgresql_using="gist"),
         sa.Index("ix_edges_version", "network_version_id"),
+        sa.Index(
+            "ix_edges_delta_live",
+            "network_id",
+            "content_hash",
+            postgresql_where=sa.text("valid_from IS NOT NULL AND valid_to IS NULL"),
+        ),
+        sa.Index(
+            "ix_edges_delta_window",
+            "network_id",
+            "valid_from",
+            postgresql_where=sa.text("valid_from IS NOT NULL"),
+        ),
+        sa.Index(
+            "ix_edges_delta_closed",
+            "network_id",
+            "valid_to",
+            postgresql_where=sa.text("valid_from IS NOT NULL AND valid_to IS NOT NULL"),
+        ),
+        sa.CheckConstraint(
+            "valid_to IS NULL OR (valid_from IS NOT NULL AND valid_to > valid_from)",
+            name="ck_edge_window",
+        ),
+        sa.CheckConstraint(
+            "network_version_id IS NOT NULL OR valid_from IS NOT NULL",
+            name="ck_edge_version",
+        ),
+        {"postgresql_partition_by": "HASH (network_id)"},
+    )
+
+
+class VersionStats(Base):
+    __tablename__ = "version_stats"
+
+    # Aggregates materialized when the version is ingested.
+    version_id: Mapped[sa.UUID] = mapped_column(
+        pg.UUID(as_uuid=True),
+        sa.ForeignKey("network_versions.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    edge_count: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
+    total_length_m: Mapped[float] = mapped_column(sa.Float, nullable=False)
+    min_x: Mapped[Optional[float]] = mapped_column(sa.Float, nullable=True)
+    min_y: Mapped[Optional[float]] = mapped_column(sa.Float, nullable=True)
+    max_x: Mapped[Optional[float]] = mapped_column(sa.Float, nullable=True)
+    max_y: Mapped[Optional[float]] = mapped_column(sa.Float, nullable=True)
+    # {"<highway>": {"count": n, "length_m": m}}, "" for edges without the property
+    highway: Mapped[dict] = mapped_column(
+        pg.JSONB, nullable=False, server_default=sa.text("'{}'::jsonb")
+    )
+    # {"<property key>": number of edges having it}
+    property_keys: Mapped[dict] = mapped_column(
+        pg.JSONB, nullable=False, server_default=sa.text("'{}'::jsonb")
+    )
+
+
+class Node(Base):
+    __tablename__ = "nodes"
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, sa.Identity(), primary_key=True)
+    network_id: Mapped[sa.UUID] = mapped_column(
+        pg.UUID(as_uuid=True), sa.ForeignKey("networks.id", ondelete="CASCADE")
+    )
+    # Snapped coordinates; the (network, x, y) key is shared by all versions.
+    x: Mapped[float] = mapped_column(sa.Float, nullable=False)
+    y: Mapped[float] = mapped_column(sa.Float, nullable=False)
+    geom: Mapped[Any] = mapped_column(
+        Geometry(geometry_type="POINT", srid=SRID, spatial_index=False),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        sa.UniqueConstraint("network_id", "x", "y", name="uq_node_per_network_xy"),
+        sa.Index("ix_nodes_geom", "geom", postgresql_using="gist"),
+    )
+
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id: Mapped[sa.UUID] = mapped_column(
+        pg.UUID(as_uuid=True),
+        server_default=sa.text("gen_random_uuid()"),
+        primary_key=True,
+    )
+    customer_id: Mapped[sa.UUID] = mapped_column(
+        pg.UUID(as_uuid=True), sa.ForeignKey("customers.id", ondelete="CASCADE")
+    )
+    # "create" (POST /networks) or "update" (POST /networks/update)
+    kind: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    network_name: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    status: Mapped[str] = mapped_column(
+        sa.Text, nullable=False, server_default=sa.text("'queued'")
+    )
+    # Upload spooled to local disk until a worker has loaded it:
+    spool_path: Mapped[Optional[str]] = mapped_column(sa.Text, nullable=True)
+    features_parsed: Mapped[int] = mapped_column(
+        sa.BigInteger, nullable=False, server_default=sa.text("0")
+    )
+    edges_inserted: Mapped[int] = mapped_column(
+        sa.BigInteger, nullable=False, server_default=sa.text("0")
+    )
+    error: Mapped[Optional[str]] = mapped_column(sa.Text, nullable=True)
+    # Ingest report (rejected features and their errors, throughput) once finished:
+    report: Mapped[Optional[dict]] = mapped_column(pg.JSONB, nullable=True)
+    network_id: Mapped[Optional[sa.UUID]] = mapped_column(
+        pg.UUID(as_uuid=True), nullable=True
+    )
+    version_id: Mapped[Optional[sa.UUID]] = mapped_column(
+        pg.UUID(as_uuid=True), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        pg.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False
+    )
+    started_at: Mapped[Optional[datetime]] = mapped_column(
+        pg.TIMESTAMP(timezone=True), nullable=True
+    )
+    finished_at: Mapped[Optional[datetime]] = mapped_column(
+        pg.TIMESTAMP(timezone=True), nullable=True
+    )
+
+    __table_args__ = (
+        sa.Index("ix_ingest_jobs_customer", "customer_id"),
+        sa.CheckConstraint("kind IN ('create', 'update')", name="ck_job_kind"),
+        sa.CheckConstraint(
+            "status IN ('queued', 'running', 'succeeded', 'failed')",
+            name="ck_job_status",
+        ),
     )
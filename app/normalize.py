@@ -0,0 +1,293 @@
+# app/normalize.py
+#
+# Validation and normalization of uploaded features, run over chunks of features in a
+# process pool. Only shapely/pyproj/numpy here: workers never import the DB layer.
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyproj
+import shapely
+
+from app.config import (
+    INGEST_BATCH_SIZE,
+    INGEST_COORD_PRECISION,
+    INGEST_MAX_REPORTED_ERRORS,
+    INGEST_NORMALIZE_WORKERS,
+    INGEST_REPAIR_GEOMETRY,
+)
+
+Edge = Tuple[Dict[str, Any], Dict[str, Any]]
+# (edges, [(feature index, error)], number of repaired features)
+ChunkResult = Tuple[List[Edge], List[Tuple[int, str]], int]
+
+# CRS names meaning lon/lat WGS84 already (GeoJSON's default)
+_LONLAT = {
+    "urn:ogc:def:crs:ogc:1.3:crs84",
+    "urn:ogc:def:crs:ogc::crs84",
+    "ogc:crs84",
+    "urn:ogc:def:crs:epsg::4326",
+    "epsg:4326",
+}
+
+
+class IngestReport:
+    """Counts and per-feature errors of one upload."""
+
+    def __init__(self, max_errors: int = INGEST_MAX_REPORTED_ERRORS):
+        self.max_errors = max_errors
+        self.features = 0
+        self.edges = 0
+        self.rejected = 0
+        self.repaired = 0
+        self.errors: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+
+    def reject(self, index: int, error: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"feature": index, "error": error})
+
+    def finish(self) -> None:
+        self._finished = time.perf_counter()
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        return {
+            "features": self.features,
+            "edges": self.edges,
+            "rejected": self.rejected,
+            "repaired": self.repaired,
+            "errors": self.errors,
+            "errors_truncated": self.rejected > len(self.errors),
+            "seconds": round(elapsed, 3),
+            "features_per_second": round(self.features / elapsed) if elapsed else None,
+        }
+
+
+@lru_cache(maxsize=32)
+def _transformer(crs: str) -> pyproj.Transformer:
+    return pyproj.Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
+
+
+def source_crs(member: Any) -> Optional[str]:
+
+    # CRS of a GeoJSON "crs" member (legacy named CRS) that must be reprojected, None
+    # for lon/lat WGS84. ValueError when it is malformed or unknown to PROJ.
+
+    if member is None:
+        return None
+    try:
+        name = member["properties"]["name"]
+    except (KeyError, TypeError):
+        raise ValueError("crs must be a named CRS") from None
+    if not isinstance(name, str):
+        raise ValueError("crs must be a named CRS")
+    if name.strip().lower() in _LONLAT:
+        return None
+    try:
+        _transformer(name)
+    except pyproj.exceptions.CRSError:
+        raise ValueError(f"Unknown crs: {name}") from None
+    return name
+
+
+class _Reject(Exception):
+    pass
+
+
+def _line_parts(feat: Any) -> Tuple[List[np.ndarray], Dict[str, Any]]:
+    # (coordinate arrays of every line, properties) of one feature
+    if not isinstance(feat, dict) or feat.get("type") != "Feature":
+        raise _Reject("Not a GeoJSON Feature")
+    geom = feat.get("geometry")
+    if not isinstance(geom, dict):
+        raise _Reject("Feature has no geometry")
+    props = feat.get("properties") or {}
+    if not isinstance(props, dict):
+        raise _Reject("properties must be an object")
+    gtype = geom.get("type")
+    coords = geom.get("coordinates")
+    if gtype == "LineString":
+        lines = [coords]
+    elif gtype == "MultiLineString":
+        if not isinstance(coords, list) or not coords:
+            raise _Reject("MultiLineString has no lines")
+        lines = coords
+    else:
+        raise _Reject(f"Unsupported geometry type: {gtype}")
+    parts = []
+    for line in lines:
+        try:
+            arr = np.asarray(line, dtype=float)
+        except (TypeError, ValueError):
+            raise _Reject("Invalid coordinates") from None
+        if arr.ndim != 2 or arr.shape[1] < 2:
+            raise _Reject("Invalid coordinates")
+        if arr.shape[0] < 2:
+            raise _Reject("LineString needs at least 2 positions")
+        parts.append(arr[:, :2])
+    return parts, props
+
+
+def normalize_chunk(
+    chunk: List[Tuple[int, Any]],
+    crs: Optional[str],
+    precision: Optional[int],
+    repair: bool,
+) -> ChunkResult:
+
+    # Explode, reproject, validate, repair and quantize one chunk of (index, feature).
+    # Everything after the structural checks runs on whole arrays. A feature is kept
+    # or rejected as a whole, never split.
+
+    errors: List[Tuple[int, str]] = []
+    owners: List[Tuple[int, Dict[str, Any]]] = []
+    arrays: List[np.ndarray] = []
+    for index, feat in chunk:
+        try:
+            parts, props = _line_parts(feat)
+        except _Reject as e:
+            errors.append((index, str(e)))
+            continue
+        arrays.extend(parts)
+        owners.extend((index, props) for _ in parts)
+    if not arrays:
+        return [], errors, 0
+
+    counts = np.fromiter((len(a) for a in arrays), dtype=np.int64, count=len(arrays))
+    part_of = np.repeat(np.arange(len(arrays)), counts)
+    coords = np.concatenate(arrays)
+    reason: Dict[int, str] = {}
+    if crs is not None:
+        # PROJ returns a plausible lon/lat for some positions outside a projection's
+        # domain (web mercator wraps around); those don't survive the way back
+        t = _transformer(crs)
+        x, y = t.transform(coords[:, 0], coords[:, 1])
+        bx, by = t.transform(x, y, direction=pyproj.enums.TransformDirection.INVERSE)
+        with np.errstate(invalid="ignore"):
+            lost = (np.abs(bx - coords[:, 0]) > 1e-6 * (1 + np.abs(coords[:, 0]))) | (
+                np.abs(by - coords[:, 1]) > 1e-6 * (1 + np.abs(coords[:, 1]))
+            )
+        for p in np.unique(part_of[lost & np.isfinite(coords).all(axis=1)]):
+            reason.setdefault(owners[p][0], f"Coordinates outside the domain of {crs}")
+        coords = np.column_stack([x, y])
+
+    finite = np.isfinite(coords).all(axis=1)
+    in_range = finite & (np.abs(coords[:, 0]) <= 180) & (np.abs(coords[:, 1]) <= 90)
+    for p in np.unique(part_of[~finite]):
+        reason.setdefault(owners[p][0], "Coordinates must be finite numbers")
+    for p in np.unique(part_of[finite & ~in_range]):
+        reason.setdefault(owners[p][0], "Coordinates out of lon/lat range")
+    coords[~finite] = 0.0
+
+    lines = shapely.linestrings(coords, indices=part_of)
+    size = shapely.get_num_coordinates(lines)
+    lines = shapely.remove_repeated_points(lines)
+    if precision is not None:
+        # points that only coincide once quantized count as repeated points too
+        coords, part_of = shapely.get_coordinates(lines, return_index=True)
+        lines = shapely.remove_repeated_points(
+            shapely.linestrings(np.round(coords, precision), indices=part_of)
+        )
+    changed = shapely.get_num_coordinates(lines) != size
+    degenerate = shapely.is_empty(lines) | (shapely.length(lines) == 0)
+    repaired = set()
+    for p in np.flatnonzero(degenerate):
+        reason.setdefault(
+            owners[p][0], "Degenerate line (fewer than 2 distinct points)"
+        )
+    for p in np.flatnonzero(changed & ~degenerate):
+        if repair:
+            repaired.add(owners[p][0])
+        else:
+            reason.setdefault(owners[p][0], "Repeated consecutive points")
+
+    keep = np.fromiter(
+        (owner[0] not in reason for owner in owners), dtype=bool, count=len(owners)
+    )
+    out, index = shapely.get_coordinates(lines[keep], return_index=True)
+    sizes = np.bincount(index, minlength=int(keep.sum()))
+    edges = [
+        ({"type": "LineString", "coordinates": part.tolist()}, owner[1])
+        for part, owner in zip(
+            np.split(out, np.cumsum(sizes)[:-1]),
+            (o for o, k in zip(owners, keep) if k),
+        )
+    ]
+    errors.extend(reason.items())
+    errors.sort()
+    return edges, errors, len(repaired - reason.keys())
+
+
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    with _pool_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pools[workers]
+
+
+def normalize_features(
+    features: Iterable[Any],
+    crs_of: Callable[[], Optional[str]],
+    report: IngestReport,
+    chunk_size: int = INGEST_BATCH_SIZE,
+    workers: int = INGEST_NORMALIZE_WORKERS,
+    precision: Optional[int] = INGEST_COORD_PRECISION,
+    repair: bool = INGEST_REPAIR_GEOMETRY,
+) -> Iterator[Edge]:
+
+    # Normalized (geometry, properties) edges of a feature stream, in input order.
+    # Chunks go to the worker pool with at most 2 * workers in flight, so parsing,
+    # normalizing and loading overlap and memory stays bounded. crs_of is asked once
+    # the first chunk has been read (the crs member precedes the features) and again
+    # at the end to catch a crs member that came after them.
+
+    it = enumerate(features)
+    pool = _get_pool(workers) if workers > 0 else None
+    pending: deque = deque()
+    crs = None
+    first = True
+
+    def collect(result: ChunkResult) -> List[Edge]:
+        edges, errors, repaired = result
+        for index, error in errors:
+            report.reject(index, error)
+        report.repaired += repaired
+        report.edges += len(edges)
+        return edges
+
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            break
+        if first:
+            crs = crs_of()
+            first = False
+        report.features += len(chunk)
+        if pool is None:
+            yield from collect(normalize_chunk(chunk, crs, precision, repair))
+            continue
+        pending.append(pool.submit(normalize_chunk, chunk, crs, precision, repair))
+        if len(pending) >= 2 * workers:
+            yield from collect(pending.popleft().result())
+    while pending:
+        yield from collect(pending.popleft().result())
+    if not first and crs_of() != crs:
+        raise ValueError("crs must come before features")
+    report.finish()
@@ -0,0 +1,165 @@
+# app/response_cache.py
+from __future__ import annotations
+
+import os
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from app.cache import BytesLRU, DiskCache
+from app.compression import decode, encode
+from app.config import (
+    RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_DISK_MAX_BYTES,
+    RESPONSE_CACHE_ENTRY_MAX_BYTES,
+    RESPONSE_CACHE_GZIP,
+    RESPONSE_CACHE_MAX_BYTES,
+)
+
+# Full FeatureCollections keyed by (version_id, encoding). The edges of a version are
+# fixed when its transaction commits (closing it only sets valid_to, and delta edges
+# added later start after it), so the open version is cached like the closed ones.
+# A version may be cached in several content codings; each is compressed only once.
+
+_disk = (
+    DiskCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_DISK_MAX_BYTES)
+    if RESPONSE_CACHE_DIR
+    else None
+)
+_CODINGS = ("identity", "gzip", "zstd", "br")
+
+
+def _disk_name(key) -> str:
+    version_id, encoding = key
+    return f"{version_id}.{encoding}"
+
+
+def _spill(key, value: bytes) -> None:
+    if _disk is not None:
+        _disk.put(_disk_name(key), value)
+
+
+memory = BytesLRU(RESPONSE_CACHE_MAX_BYTES, on_evict=_spill)
+
+
+def version_etag(version_id: str, variant: Optional[str] = None) -> str:
+    # Strong validator: the payload of a version never changes. Other representations
+    # of the same version (export formats, content codings) get their own tag.
+    if variant is None:
+        return f'"{version_id}"'
+    return f'"{version_id}.{variant}"'
+
+
+def validator_headers(
+    version_id: str, fmt: Optional[str] = None, encoding: Optional[str] = None
+) -> Dict[str, str]:
+    # the edges endpoint picks the representation from Accept and Accept-Encoding.
+    # A content-coded body is only semantically equal across responses: streamed,
+    # cached and transcoded copies differ in bytes, so its tag is weak.
+    variant = ".".join(v for v in (fmt, encoding) if v) or None
+    etag = version_etag(version_id, variant)
+    return {
+        "ETag": f"W/{etag}" if encoding else etag,
+        "Vary": "Accept, Accept-Encoding",
+    }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+
+    if not if_none_match:
+        return False
+    etag = etag.removeprefix("W/")
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _lookup(key) -> Optional[bytes]:
+    body = memory.get(key)
+    if body is None and _disk is not None:
+        body = _disk.get(_disk_name(key))
+        if body is not None and len(body) <= memory.max_bytes:
+            memory.put(key, body)
+    return body
+
+
+def cached_payload(version_id: str, encoding: Optional[str]) -> Optional[bytes]:
+
+    # The cached FeatureCollection of a version in the given content coding (None for
+    # identity). Another cached coding is transcoded once and kept as well.
+
+    vid = str(version_id)
+    wanted = encoding or "identity"
+    body = _lookup((vid, wanted))
+    if body is not None:
+        return body
+    for coding in _CODINGS:
+        if coding == wanted:
+            continue
+        other = _lookup((vid, coding))
+        if other is not None:
+            plain = decode(other, None if coding == "identity" else coding)
+            body = encode(plain, encoding)
+            memory.put((vid, wanted), body)
+            return body
+    return None
+
+
+def store_payload(version_id: str, body: bytes, encoding: Optional[str] = None) -> None:
+    # identity payloads are kept gzipped when RESPONSE_CACHE_GZIP is set
+    if encoding is None and RESPONSE_CACHE_GZIP:
+        body, encoding = encode(body, "gzip"), "gzip"
+    memory.put((str(version_id), encoding or "identity"), body)
+
+
+def tee_into_cache(
+    version_id: str, chunks: Iterable[bytes], encoding: Optional[str] = None
+) -> Iterator[bytes]:
+
+    # Pass a streamed body through unchanged and cache it once it completed. Up to
+    # RESPONSE_CACHE_ENTRY_MAX_BYTES it is buffered in memory; a larger body is
+    # spooled to a temp file in the disk cache directory and moved in place when the
+    # stream ends, or not cached at all without one.
+
+    limit = min(RESPONSE_CACHE_ENTRY_MAX_BYTES, RESPONSE_CACHE_MAX_BYTES)
+    parts: List[bytes] = []
+    size = 0
+    spool: Optional[BinaryIO] = None
+    tmp = ""
+    caching = True
+    try:
+        for chunk in chunks:
+            yield chunk
+            if not caching:
+                continue
+            size += len(chunk)
+            if spool is None and size > limit:
+                if _disk is None or size > _disk.max_bytes:
+                    # too big to ever be cached: stop buffering
+                    caching = False
+                    parts = []
+                    continue
+                spool, tmp = _disk.spool()
+                spool.writelines(parts)
+                parts = []
+            if spool is None:
+                parts.append(chunk)
+            elif size <= _disk.max_bytes:
+                spool.write(chunk)
+            else:
+                caching = False
+        if not caching:
+            return
+        if spool is None:
+            store_payload(version_id, b"".join(parts), encoding)
+        else:
+            spool.close()
+            spool = None
+            _disk.adopt(tmp, _disk_name((str(version_id), encoding or "identity")))
+    finally:
+        # an aborted or oversized stream leaves no temp file behind
+        if spool is not None:
+            spool.close()
+            os.remove(tmp)
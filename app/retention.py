@@ -0,0 +1,229 @@
+# app/retention.py
+#
+# Remove versions that fall outside their network's retention policy:
+#
+#   python -m app.retention [--network-id ID] [--vacuum]
+#
+# Meant to run from cron. Each network is handled in its own transaction.
+from __future__ import annotations
+
+import argparse
+import gzip
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import sqlalchemy as sa
+
+from app.config import RETENTION_ARCHIVE_DIR
+from app.db import SessionLocal, engine
+from app.services import version_edges_filter
+from app.timeline import mark_timeline_changed
+
+log = logging.getLogger(__name__)
+
+
+def expired_versions(db, network_id: str, now: datetime) -> List[sa.Row]:
+
+    # Closed versions beyond the newest retain_versions or closed longer than
+    # retain_for, oldest first. Both rules only ever expire the oldest versions, and the
+    # current version is never expired.
+
+    return db.execute(
+        sa.text(
+            """
+            WITH ranked AS (
+                SELECT v.id, v.valid_from, v.valid_to, v.storage,
+                       row_number() OVER (ORDER BY v.valid_from DESC) AS rank
+                  FROM network_versions v
+                 WHERE v.network_id = :nid
+            )
+            SELECT r.id, r.valid_from, r.valid_to, r.storage
+              FROM ranked r
+              JOIN networks n ON n.id = :nid
+             WHERE r.valid_to IS NOT NULL
+               AND ((n.retain_versions IS NOT NULL AND r.rank > n.retain_versions)
+                    OR (n.retain_for IS NOT NULL AND r.valid_to < :now - n.retain_for))
+             ORDER BY r.valid_from
+        """
+        ),
+        {"nid": network_id, "now": now},
+    ).all()
+
+
+def archive_version(db, network_id: str, version_id: str, directory: str) -> str:
+
+    # Write the edges of a version as gzipped GeoJSON lines, one Feature per line
+
+    scope, params = version_edges_filter(db, version_id)
+    rows = db.execute(
+        sa.text(
+            f"""
+            SELECT jsonb_build_object(
+                'type','Feature',
+                'id', e.id,
+                'geometry', ST_AsGeoJSON(e.geom)::jsonb,
+                'properties', e.properties
+            )::text
+              FROM edges e
+             WHERE {scope}
+        """
+        ),
+        params,
+        execution_options={"yield_per": 10000},
+    )
+    os.makedirs(os.path.join(directory, network_id), exist_ok=True)
+    path = os.path.join(directory, network_id, f"{version_id}.geojsonl.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        for (line,) in rows:
+            fh.write(line)
+            fh.write("\n")
+    return path
+
+
+def apply_retention(
+    db,
+    network_id: str,
+    now: Optional[datetime] = None,
+    archive_dir: Optional[str] = RETENTION_ARCHIVE_DIR,
+) -> Dict[str, int]:
+
+    # Remove the expired versions of one network with set-based statements that all
+    # pin network_id, so each one touches a single edges partition. The caller commits.
+
+    if now is None:
+        now = datetime.now(timezone.utc)
+    expired = expired_versions(db, network_id, now)
+    if not expired:
+        return {"versions_removed": 0, "edges_removed": 0}
+
+    if archive_dir:
+        for v in expired:
+            archive_version(db, network_id, str(v.id), archive_dir)
+
+    # expired versions are the oldest ones, so the last one's end is where the
+    # retained history starts
+    params = {
+        "nid": network_id,
+        "vids": [str(v.id) for v in expired],
+        "full_vids": [str(v.id) for v in expired if v.storage == "full"],
+        "horizon": expired[-1].valid_to,
+    }
+    # rows owned by expired full versions
+    removed = db.execute(
+        sa.text(
+            """
+            DELETE FROM edges
+             WHERE network_id = :nid
+               AND network_version_id = ANY(CAST(:full_vids AS uuid[]))
+        """
+        ),
+        params,
+    ).rowcount
+    # delta rows closed before every retained version started
+    removed += db.execute(
+        sa.text(
+            """
+            DELETE FROM edges
+             WHERE network_id = :nid
+               AND valid_from IS NOT NULL
+               AND valid_to <= :horizon
+        """
+        ),
+        params,
+    ).rowcount
+    # delta rows still in use lose the reference to the version that wrote them;
+    # each row is updated once, after that its version id stays NULL
+    db.execute(
+        sa.text(
+            """
+            UPDATE edges SET network_version_id = NULL
+             WHERE network_id = :nid
+               AND network_version_id = ANY(CAST(:vids AS uuid[]))
+        """
+        ),
+        params,
+    )
+    # version_stats go with the versions (ON DELETE CASCADE)
+    db.execute(
+        sa.text("DELETE FROM network_versions WHERE id = ANY(CAST(:vids AS uuid[]))"),
+        params,
+    )
+    mark_timeline_changed(db, network_id)
+    return {"versions_removed": len(expired), "edges_removed": removed}
+
+
+def vacuum_network(network_id: str) -> None:
+
+    # VACUUM (ANALYZE) the partition holding the network's edges
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        partition = conn.execute(
+            sa.text(
+                """
+                SELECT tableoid::regclass::text
+                  FROM edges
+                 WHERE network_id = :nid
+                 LIMIT 1
+            """
+            ),
+            {"nid": network_id},
+        ).scalar_one_or_none()
+        if partition is not None:
+            conn.execute(sa.text(f"VACUUM (ANALYZE) {partition}"))
+
+
+def run_retention(
+    network_id: Optional[str] = None, vacuum: bool = False
+) -> Dict[str, Dict[str, int]]:
+
+    # Apply retention to every network with a policy (or just network_id)
+
+    db = SessionLocal()
+    try:
+        sql = sa.text(
+            """
+            SELECT id::text
+              FROM networks
+             WHERE (retain_versions IS NOT NULL OR retain_for IS NOT NULL)
+               AND (CAST(:nid AS uuid) IS NULL OR id = CAST(:nid AS uuid))
+        """
+        )
+        ids = db.execute(sql, {"nid": network_id}).scalars().all()
+        results = {}
+        for nid in ids:
+            try:
+                result = apply_retention(db, nid)
+                db.commit()
+            except Exception:
+                db.rollback()
+                log.exception("retention failed for network %s", nid)
+                continue
+            results[nid] = result
+            if vacuum and result["versions_removed"]:
+                vacuum_network(nid)
+        return results
+    finally:
+        db.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--network-id", help="only this network")
+    ap.add_argument(
+        "--vacuum", action="store_true", help="VACUUM partitions that lost rows"
+    )
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    for nid, result in run_retention(args.network_id, args.vacuum).items():
+        log.info(
+            "network %s: %d versions, %d edges removed",
+            nid,
+            result["versions_removed"],
+            result["edges_removed"],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+# app/routing.py
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+import shapely
+import sqlalchemy as sa
+
+from app.config import ROUTING_CACHE_GRAPHS, ROUTING_SNAP_DIGITS
+from app.services import version_edges_filter
+
+EARTH_RADIUS_M = 6371008.8
+# Haversine on the mean sphere can exceed the spheroidal edge lengths by a few
+# tenths of a percent; shrinking it keeps the A* heuristic admissible.
+HEURISTIC_SCALE = 0.99
+
+_ONEWAY_FORWARD = {"true", "yes", "1"}
+_ONEWAY_REVERSE = {"-1", "reverse"}
+
+
+class RouteNotFound(LookupError):
+    """Raised when no path connects the two snapped nodes."""
+
+    pass
+
+
+@dataclass
+class CSR:
+    """Adjacency of one direction: arcs of node v are indptr[v]:indptr[v + 1]."""
+
+    indptr: np.ndarray  # int64, n_nodes + 1
+    head: np.ndarray  # int32, node at the other end of each arc
+    weight: np.ndarray  # float64, meters
+    arc: np.ndarray  # int32, edge index; ~index when the edge is walked backwards
+
+    @classmethod
+    def build(cls, n_nodes, tail, head, weight, arc) -> "CSR":
+        order = np.argsort(tail, kind="stable")
+        counts = np.bincount(tail, minlength=n_nodes)
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(
+            indptr=indptr,
+            head=head[order].astype(np.int32),
+            weight=weight[order],
+            arc=arc[order].astype(np.int32),
+        )
+
+    def arcs(self, v: int):
+        a, b = self.indptr[v], self.indptr[v + 1]
+        return zip(
+            self.head[a:b].tolist(), self.weight[a:b].tolist(), self.arc[a:b].tolist()
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.indptr.nbytes + self.head.nbytes + self.weight.nbytes + self.arc.nbytes
+        )
+
+
+@dataclass
+class RoadGraph:
+    """Routable graph of one network version; nodes are snapped edge endpoints."""
+
+    version_id: str
+    lon: np.ndarray
+    lat: np.ndarray
+    edge_ids: np.ndarray  # S16 uuid bytes, indexed by edge index
+    forward: CSR
+    backward: CSR
+    nodes: shapely.STRtree  # node points, for nearest_node
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.lon.nbytes
+            + self.lat.nbytes
+            + self.edge_ids.nbytes
+            + self.forward.nbytes
+            + self.backward.nbytes
+        )
+
+    def nearest_node(self, lon: float, lat: float) -> int:
+
+        # Closest node by equirectangular distance, which is exact enough here. The
+        # tree's nearest node in plain degrees is d away, so the closest node lies
+        # within d of lat and d / cos(lat) of lon; pick it among the nodes in that box.
+
+        i = int(self.nodes.nearest(shapely.Point(lon, lat)))
+        d = math.hypot(self.lon[i] - lon, self.lat[i] - lat)
+        k = max(math.cos(math.radians(lat)), 1e-9)
+        near = self.nodes.query(shapely.box(lon - d / k, lat - d, lon + d / k, lat + d))
+        dx = (self.lon[near] - lon) * k
+        dy = self.lat[near] - lat
+        return int(near[np.argmin(dx * dx + dy * dy)])
+
+    def distance(self, u: int, v: int) -> float:
+        return haversine(self.lon[u], self.lat[u], self.lon[v], self.lat[v])
+
+    def shortest_path(self, s: int, t: int) -> Tuple[float, List[int]]:
+
+        # Bidirectional A* with average potentials pf(v) = (h_t(v) - h_s(v)) / 2 and
+        # pr = -pf, so both searches see the same non-negative reduced costs. Keys are
+        # dist + potential; stop once the two queue minima sum to the best meeting.
+        # Search state lives in flat lists indexed by node, next to the CSR arrays.
+
+        if s == t:
+            return 0.0, []
+        n = len(self.lon)
+        potential: List[Optional[float]] = [None] * n
+
+        def pf(v: int) -> float:
+            p = potential[v]
+            if p is None:
+                p = 0.5 * HEURISTIC_SCALE * (self.distance(v, t) - self.distance(v, s))
+                potential[v] = p
+            return p
+
+        dist = ([math.inf] * n, [math.inf] * n)
+        dist[0][s] = 0.0
+        dist[1][t] = 0.0
+        parent = ([-1] * n, [-1] * n)
+        via = ([0] * n, [0] * n)
+        settled = (bytearray(n), bytearray(n))
+        heaps = ([(pf(s), s)], [(-pf(t), t)])
+        graphs = (self.forward, self.backward)
+        sign = (1.0, -1.0)
+        best, meet = math.inf, -1
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            _, u = heapq.heappop(heaps[side])
+            if settled[side][u]:
+                continue
+            settled[side][u] = 1
+            this, other = dist[side], dist[1 - side]
+            du = this[u]
+            for v, w, arc in graphs[side].arcs(u):
+                nd = du + w
+                if nd < this[v]:
+                    this[v] = nd
+                    parent[side][v] = u
+                    via[side][v] = arc
+                    heapq.heappush(heaps[side], (nd + sign[side] * pf(v), v))
+                    if nd + other[v] < best:
+                        best, meet = nd + other[v], v
+
+        if meet < 0:
+            raise RouteNotFound("No route found")
+
+        arcs: List[int] = []
+        v = meet
+        while v != s:
+            arcs.append(via[0][v])
+            v = parent[0][v]
+        arcs.reverse()
+        v = meet
+        while v != t:
+            arcs.append(via[1][v])
+            v = parent[1][v]
+        return best, arcs
+
+
+def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _oneway(value: Optional[str]) -> int:
+    # 1: along the geometry only, -1: against it only, 0: both ways
+    v = (value or "").strip().lower()
+    if v in _ONEWAY_FORWARD:
+        return 1
+    if v in _ONEWAY_REVERSE:
+        return -1
+    return 0
+
+
+def build_graph(db, version_id: str) -> RoadGraph:
+
+    # Read endpoints, lengths and oneway of a version's edges into CSR arrays
+
+    scope, params = version_edges_filter(db, version_id)
+    rows = db.execute(
+        sa.text(
+            f"""
+            SELECT e.id,
+                   ST_X(ST_StartPoint(e.geom)), ST_Y(ST_StartPoint(e.geom)),
+                   ST_X(ST_EndPoint(e.geom)), ST_Y(ST_EndPoint(e.geom)),
+                   ST_Length(e.geom::geography),
+                   e.properties->>'oneway'
+              FROM edges e
+             WHERE {scope}
+        """
+        ),
+        params,
+        execution_options={"yield_per": 50000},
+    )
+    ids, coords, length, oneway = [], [], [], []
+    for rid, x1, y1, x2, y2, m, ow in rows:
+        ids.append(UUID(str(rid)).bytes)
+        coords.append((x1, y1, x2, y2))
+        length.append(m)
+        oneway.append(_oneway(ow))
+    return assemble_graph(version_id, ids, coords, length, oneway)
+
+
+def assemble_graph(version_id: str, ids, coords, length, oneway) -> RoadGraph:
+
+    # Edge ids, (x1, y1, x2, y2) endpoints, lengths and oneway flags -> CSR graph
+
+    n_edges = len(ids)
+    xy = np.asarray(coords, dtype=np.float64).reshape(n_edges, 4)
+    # snap endpoints to a grid so touching lines share a node
+    ends = np.round(np.concatenate([xy[:, 0:2], xy[:, 2:4]]), ROUTING_SNAP_DIGITS)
+    nodes, inverse = np.unique(ends, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    src, dst = inverse[:n_edges], inverse[n_edges:]
+    weight = np.asarray(length, dtype=np.float64)
+    ow = np.asarray(oneway, dtype=np.int8)
+    idx = np.arange(n_edges, dtype=np.int64)
+
+    fwd = ow >= 0
+    rev = ow <= 0
+    tail = np.concatenate([src[fwd], dst[rev]])
+    head = np.concatenate([dst[fwd], src[rev]])
+    w = np.concatenate([weight[fwd], weight[rev]])
+    arc = np.concatenate([idx[fwd], ~idx[rev]])
+
+    n_nodes = len(nodes)
+    lon = np.ascontiguousarray(nodes[:, 0])
+    lat = np.ascontiguousarray(nodes[:, 1])
+    return RoadGraph(
+        version_id=str(version_id),
+        lon=lon,
+        lat=lat,
+        edge_ids=np.asarray(ids, dtype="S16"),
+        forward=CSR.build(n_nodes, tail, head, w, arc),
+        backward=CSR.build(n_nodes, head, tail, w, arc),
+        nodes=shapely.STRtree(shapely.points(lon, lat)),
+    )
+
+
+class GraphCache:
+    """LRU of built graphs by version id; each version is built at most once at a time."""
+
+    def __init__(self, max_graphs: int):
+        self.max_graphs = max_graphs
+        self._graphs: "OrderedDict[str, RoadGraph]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+
+    def get(self, db, version_id: str) -> RoadGraph:
+        key = str(version_id)
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                return graph
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            with self._lock:
+                graph = self._graphs.get(key)
+            if graph is None:
+                graph = build_graph(db, key)
+                with self._lock:
+                    self._graphs[key] = graph
+                    while len(self._graphs) > self.max_graphs:
+                        self._graphs.popitem(last=False)
+        with self._lock:
+            self._building.pop(key, None)
+        return graph
+
+
+graph_cache = GraphCache(ROUTING_CACHE_GRAPHS)
+
+
+def parse_point(raw: str) -> Tuple[float, float]:
+
+    # "lon,lat" -> floats, ValueError when malformed
+
+    parts = raw.split(",")
+    if len(parts) != 2:
+        raise ValueError("points must be lon,lat")
+    try:
+        lon, lat = float(parts[0]), float(parts[1])
+    except ValueError:
+        raise ValueError("points must be lon,lat") from None
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError("points must be lon,lat in WGS84 range")
+    return lon, lat
+
+
+def route(
+    db, version_id: str, origin: Tuple[float, float], destination: Tuple[float, float]
+) -> Dict[str, Any]:
+
+    # Shortest path between the nodes nearest to origin and destination, as a Feature
+
+    graph = graph_cache.get(db, version_id)
+    if len(graph.lon) == 0:
+        raise RouteNotFound("No route found")
+    s = graph.nearest_node(*origin)
+    t = graph.nearest_node(*destination)
+    meters, arcs = graph.shortest_path(s, t)
+
+    edge_ids = [str(UUID(bytes=graph.edge_ids[a if a >= 0 else ~a])) for a in arcs]
+    geoms = {}
+    if edge_ids:
+        scope, params = version_edges_filter(db, version_id)
+        geoms = dict(
+            db.execute(
+                sa.text(
+                    f"""
+                    SELECT e.id::text, ST_AsGeoJSON(e.geom)
+                      FROM edges e
+                     WHERE {scope} AND e.id = ANY(CAST(:ids AS uuid[]))
+                """
+                ),
+                {**params, "ids": edge_ids},
+            ).all()
+        )
+    coordinates: List[List[float]] = []
+    for eid, a in zip(edge_ids, arcs):
+        part = json.loads(geoms[eid])["coordinates"]
+        if a < 0:
+            part = part[::-1]
+        if coordinates and coordinates[-1] == part[0]:
+            part = part[1:]
+        coordinates.extend(part)
+    if not coordinates:
+        coordinates = [[float(graph.lon[s]), float(graph.lat[s])]] * 2
+
+    return {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": coordinates},
+        "properties": {
+            "version_id": graph.version_id,
+            "distance_m": round(meters, 2),
+            "edge_ids": edge_ids,
+            "from_node": [float(graph.lon[s]), float(graph.lat[s])],
+            "to_node": [float(graph.lon[t]), float(graph.lat[t])],
+        },
+    }
@@ -1,10 +1,33 @@
 from __future__ import annotations
+import base64
+import codecs
+import io
 import json
+import struct
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+import numpy as np
+import shapely
 import sqlalchemy as sa
 from psycopg2.extras import execute_values
-from app.db import raw_cursor_from_session
+from shapely.errors import GEOSException
+from shapely.geometry import LineString, shape
+from sqlalchemy.engine import Engine
+from app.config import (
+    EDGES_FETCH_SIZE,
+    INGEST_BATCH_SIZE,
+    INGEST_CHUNK_SIZE,
+    INGEST_LOADER,
+    TOPOLOGY_SNAP_TOLERANCE,
+    VERSION_STORAGE,
+)
+from app.db import open_session, raw_cursor_from_session
+from app.metrics import stage
+from app.models import SRID
+from app.normalize import IngestReport, normalize_features, source_crs
+from app.timeline import mark_timeline_changed
 
 
 class GeoJSONParseError(ValueError):
@@ -25,6 +48,7 @@ def ts_or_now(at: Optional[datetime]) -> datetime:
 def version_at(db, network_id: str, ts: datetime) -> Optional[str]:
 
     # Return the version_id valid at ts for this network or None if no version matches
+    # (served by the exclusion constraint's GiST index; windows cannot overlap)
 
     return db.execute(
         sa.text(
@@ -32,22 +56,39 @@ def version_at(db, network_id: str, ts: datetime) -> Optional[str]:
             SELECT id
             FROM network_versions
             WHERE network_id = :nid
-              AND valid_from <= :ts
-              AND (valid_to IS NULL OR :ts < valid_to)
-            ORDER BY valid_from DESC
-            LIMIT 1
+              AND validity @> :ts
         """
         ),
         {"nid": network_id, "ts": ts},
     ).scalar_one_or_none()
 
 
-def open_new_version(db, network_id: str, ts: Optional[datetime] = None) -> str:
+def open_new_version(
+    db, network_id: str, storage: str = "full"
+) -> Tuple[str, datetime]:
 
-    # Close any current version and open a new one starting at ts
+    # Close any current version and open a new one; returns (version_id, valid_from).
+    # The network row lock serializes concurrent writers of one network until the
+    # transaction ends, and the start time is only taken once it is held: on the
+    # database clock, and after the current version's start, so a writer that waited
+    # can never close a newer version before it began.
 
-    if ts is None:
-        ts = datetime.now(timezone.utc)
+    db.execute(
+        sa.text("SELECT 1 FROM networks WHERE id = :nid FOR UPDATE"),
+        {"nid": network_id},
+    )
+    ts = db.execute(
+        sa.text(
+            """
+        SELECT greatest(
+                   clock_timestamp(),
+                   (SELECT max(valid_from) FROM network_versions WHERE network_id = :nid)
+                   + interval '1 microsecond'
+               )
+    """
+        ),
+        {"nid": network_id},
+    ).scalar_one()
 
     db.execute(
         sa.text(
@@ -59,17 +100,284 @@ def open_new_version(db, network_id: str, ts: Optional[datetime] = None) -> str:
         ),
         {"nid": network_id, "ts": ts},
     )
-    # Returns the new version UUID
-    return db.execute(
+    mark_timeline_changed(db, network_id)
+    version_id = db.execute(
         sa.text(
             """
-        INSERT INTO network_versions(network_id, valid_from, valid_to)
-        VALUES (:nid, :ts, NULL)
+        INSERT INTO network_versions(network_id, valid_from, valid_to, storage)
+        VALUES (:nid, :ts, NULL, :storage)
         RETURNING id
     """
         ),
-        {"nid": network_id, "ts": ts},
+        {"nid": network_id, "ts": ts, "storage": storage},
     ).scalar_one()
+    return version_id, ts
+
+
+def version_of_network(db, network_id: str, version_id: str) -> bool:
+
+    # True when version_id is a version of network_id
+
+    return (
+        db.execute(
+            sa.text(
+                """
+            SELECT 1 FROM network_versions WHERE id = :vid AND network_id = :nid
+        """
+            ),
+            {"vid": str(version_id), "nid": network_id},
+        ).scalar_one_or_none()
+        is not None
+    )
+
+
+def version_edges_filter(
+    db, version_id: str, prefix: str = "scope"
+) -> Tuple[str, Dict[str, Any]]:
+
+    # SQL predicate (over alias e) and params selecting the edges that make up a version.
+    # Full versions own their rows; delta versions see every edge of the network whose
+    # validity window covers the version start. prefix keeps params of two scopes apart.
+    # Both pin e.network_id so the planner prunes to the network's partition.
+
+    row = db.execute(
+        sa.text(
+            "SELECT network_id, valid_from, storage FROM network_versions WHERE id = :vid"
+        ),
+        {"vid": str(version_id)},
+    ).one()
+    if row.storage == "delta":
+        return (
+            f"""e.network_id = :{prefix}_nid
+               AND e.valid_from <= :{prefix}_ts
+               AND (e.valid_to IS NULL OR e.valid_to > :{prefix}_ts)""",
+            {f"{prefix}_nid": str(row.network_id), f"{prefix}_ts": row.valid_from},
+        )
+    return (
+        f"e.network_id = :{prefix}_nid AND e.network_version_id = :{prefix}_vid",
+        {f"{prefix}_nid": str(row.network_id), f"{prefix}_vid": str(version_id)},
+    )
+
+
+def parse_bbox(raw: str) -> Tuple[float, float, float, float]:
+
+    # "minx,miny,maxx,maxy" in lon/lat -> floats, ValueError when malformed
+
+    parts = raw.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must be minx,miny,maxx,maxy")
+    try:
+        minx, miny, maxx, maxy = (float(p) for p in parts)
+    except ValueError:
+        raise ValueError("bbox must be minx,miny,maxx,maxy") from None
+    if minx > maxx or miny > maxy:
+        raise ValueError("bbox min must not exceed max")
+    return minx, miny, maxx, maxy
+
+
+def parse_polygon(raw: str) -> str:
+
+    # Validate a GeoJSON Polygon/MultiPolygon query parameter and return it as text
+
+    try:
+        geom = json.loads(raw)
+    except ValueError:
+        raise ValueError("intersects must be a GeoJSON geometry") from None
+    if not isinstance(geom, dict) or geom.get("type") not in (
+        "Polygon",
+        "MultiPolygon",
+    ):
+        raise ValueError("intersects must be a GeoJSON Polygon or MultiPolygon")
+    try:
+        polygon = shape(geom)
+    except (KeyError, IndexError, TypeError, AttributeError, ValueError, GEOSException):
+        raise ValueError("intersects has malformed coordinates") from None
+    if polygon.is_empty:
+        raise ValueError("intersects is an empty polygon")
+    if not polygon.is_valid:
+        raise ValueError(
+            f"intersects is not a valid polygon: {shapely.is_valid_reason(polygon)}"
+        )
+    return json.dumps(geom, separators=(",", ":"))
+
+
+def encode_page_cursor(version_id: str, last_id: str) -> str:
+
+    # Opaque keyset cursor; pins the version so later pages survive new uploads
+
+    raw = json.dumps({"v": str(version_id), "after": str(last_id)}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_page_cursor(token: str) -> Tuple[str, str]:
+
+    # Inverse of encode_page_cursor -> (version_id, last_id), ValueError when tampered
+
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        doc = json.loads(raw)
+        return str(UUID(doc["v"])), str(UUID(doc["after"]))
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor") from None
+
+
+def edges_query_filter(
+    scope: str,
+    scope_params: Dict[str, Any],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    polygon: Optional[str] = None,
+    after: Optional[str] = None,
+) -> Tuple[str, Dict[str, Any]]:
+
+    # Extend a version scope with spatial filters (served by ix_edges_geom) and a keyset bound
+
+    clauses = [f"({scope})"]
+    params = dict(scope_params)
+    if bbox is not None:
+        clauses.append(
+            "ST_Intersects(e.geom, ST_MakeEnvelope(:minx, :miny, :maxx, :maxy, 4326))"
+        )
+        params.update(zip(("minx", "miny", "maxx", "maxy"), bbox))
+    if polygon is not None:
+        clauses.append(
+            "ST_Intersects(e.geom, ST_SetSRID(ST_GeomFromGeoJSON(:polygon), 4326))"
+        )
+        params["polygon"] = polygon
+    if after is not None:
+        clauses.append("e.id > CAST(:after AS uuid)")
+        params["after"] = after
+    return " AND ".join(clauses), params
+
+
+_FC_HEAD = b'{"type":"FeatureCollection","features":['
+_FC_TAIL = b"]}"
+
+
+def dump_json(obj: Any) -> bytes:
+
+    # Serialize exactly like fastapi's JSONResponse.render
+
+    return json.dumps(
+        obj, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def page_links(next_href: Optional[str]) -> List[Dict[str, str]]:
+
+    # OGC API style links member of a paginated FeatureCollection
+
+    if next_href is None:
+        return []
+    return [{"rel": "next", "type": "application/geo+json", "href": next_href}]
+
+
+def iter_jsonb_features(
+    sql: str,
+    params: Dict[str, Any],
+    fetch_size: int = EDGES_FETCH_SIZE,
+    bind: Optional[Engine] = None,
+) -> Iterator[bytes]:
+
+    # Stream a FeatureCollection whose features are the jsonb first column of sql.
+    # Like iter_feature_collection it owns its session and reads from a cursor.
+
+    db = open_session(bind)
+    try:
+        yield _FC_HEAD
+        result = db.execute(
+            sa.text(sql), params, execution_options={"yield_per": fetch_size}
+        )
+        sep = b""
+        for rows in result.partitions():
+            yield sep + b",".join(dump_json(row[0]) for row in rows)
+            sep = b","
+        yield _FC_TAIL
+    finally:
+        db.close()
+
+
+def iter_feature_collection(
+    scope: str,
+    scope_params: Dict[str, Any],
+    limit: Optional[int] = None,
+    next_link: Optional[Callable[[str], str]] = None,
+    fetch_size: int = EDGES_FETCH_SIZE,
+    bind: Optional[Engine] = None,
+) -> Iterator[bytes]:
+
+    # Stream a FeatureCollection from a server-side cursor, one fetch at a time.
+    # Features are built as jsonb like the aggregate query, so the bytes match it.
+    # With a limit, one extra row is read to decide whether a next link is needed.
+    # Runs in its own session on bind (the engine the request was routed to) because
+    # the request's session is closed before the response body is sent.
+
+    params = dict(scope_params)
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT :page_limit"
+        params["page_limit"] = limit + 1
+
+    db = open_session(bind)
+    try:
+        yield _FC_HEAD
+        result = db.execute(
+            sa.text(
+                f"""
+                SELECT e.id, jsonb_build_object(
+                    'type','Feature',
+                    'id', e.id,
+                    'geometry', ST_AsGeoJSON(
+                        CASE
+                            WHEN ST_SRID(e.geom) = 4326 THEN e.geom
+                            ELSE ST_Transform(e.geom, 4326)
+                        END
+                    )::jsonb,
+                    'properties', e.properties
+                )
+                FROM edges e
+                WHERE {scope}
+                ORDER BY e.id
+                {limit_sql}
+            """
+            ),
+            params,
+            execution_options={"yield_per": fetch_size},
+        )
+        sep = b""
+        sent = 0
+        last_id = None
+        has_more = False
+        for rows in result.partitions():
+            if limit is not None and sent + len(rows) > limit:
+                rows = rows[: limit - sent]
+                has_more = True
+            if rows:
+                yield sep + b",".join(dump_json(row[1]) for row in rows)
+                sep = b","
+                sent += len(rows)
+                last_id = rows[-1][0]
+        if limit is None:
+            yield _FC_TAIL
+            return
+        href = next_link(str(last_id)) if has_more and next_link else None
+        yield b'],"links":' + dump_json(page_links(href)) + b"}"
+    finally:
+        db.close()
+
+
+def find_network(db, customer_id: str, name: str) -> Optional[str]:
+
+    # The customer's network with this name, or None
+
+    return db.execute(
+        sa.text(
+            """
+        SELECT id FROM networks
+        WHERE customer_id = :cid AND name = :name
+    """
+        ),
+        {"cid": customer_id, "name": name},
+    ).scalar_one_or_none()
 
 
 def ensure_network(db, customer_id: str, name: str) -> str:
@@ -89,56 +397,627 @@ def ensure_network(db, customer_id: str, name: str) -> str:
     ).scalar_one()
 
 
+class _JSONStream:
+    """Incremental reader over a text buffer refilled from a byte source."""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, read: Callable[[int], bytes], chunk_size: int):
+        self._read = read
+        self._chunk_size = chunk_size
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        try:
+            chunk = self._read(self._chunk_size)
+        except GeoJSONParseError:
+            raise
+        except ValueError as e:
+            # a truncated, corrupt or oversized compressed upload (app.compression)
+            raise GeoJSONParseError(str(e)) from None
+        try:
+            text = self._utf8.decode(chunk or b"", final=not chunk)
+        except UnicodeDecodeError as e:
+            raise GeoJSONParseError("Invalid JSON") from e
+        if not chunk:
+            self.eof = True
+        # drop what has already been consumed so the buffer stays bounded
+        self.buf = self.buf[self.pos :] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            n = len(self.buf)
+            while self.pos < n and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < n:
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise GeoJSONParseError("Invalid JSON")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                val, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # only a value cut off by the end of the buffer is worth more input
+                truncated = e.pos >= len(self.buf) - 6 or e.msg.startswith(
+                    "Unterminated string"
+                )
+                if truncated and self.fill():
+                    continue
+                raise GeoJSONParseError("Invalid JSON") from e
+            # a value ending exactly at the buffer edge may be truncated (e.g. a number)
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return val
+
+
+def _iter_raw_features(
+    read: Callable[[int], bytes], chunk_size: int, header: Dict[str, Any]
+) -> Iterator[Any]:
+
+    # Stream the decoded members of a GeoJSON FeatureCollection's "features" array.
+    # Only one feature is decoded at a time, so memory is bounded by the largest feature.
+    # Other top-level members (crs, name, ...) are put into header as they are read.
+
+    s = _JSONStream(read, chunk_size)
+    if s.peek() != "{":
+        s.value()
+        raise GeoJSONParseError("Expected GeoJSON FeatureCollection")
+    s.pos += 1
+
+    first = True
+    while True:
+        if s.peek() == "}":
+            s.pos += 1
+            break
+        if not first:
+            s.expect(",")
+        first = False
+        if s.peek() != '"':
+            raise GeoJSONParseError("Invalid JSON")
+        key = s.value()
+        s.expect(":")
+
+        if key == "type":
+            header["type"] = s.value()
+            if header["type"] != "FeatureCollection":
+                raise GeoJSONParseError("Expected GeoJSON FeatureCollection")
+        elif key == "features" and s.peek() == "[":
+            s.pos += 1
+            if s.peek() == "]":
+                s.pos += 1
+                continue
+            while True:
+                yield s.value()
+                if s.peek() == "]":
+                    s.pos += 1
+                    break
+                s.expect(",")
+        else:
+            header[key] = s.value()
+
+    if s.peek() != "":
+        raise GeoJSONParseError("Invalid JSON")
+    if header.get("type") != "FeatureCollection":
+        raise GeoJSONParseError("Expected GeoJSON FeatureCollection")
+
+
+def iter_geojson_features(
+    read: Callable[[int], bytes],
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    report: Optional[IngestReport] = None,
+) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+
+    # Stream normalized (geometry, properties) tuples out of a GeoJSON FeatureCollection
+    # read in chunks: MultiLineStrings are exploded, coordinates reprojected from the
+    # declared crs to EPSG:4326, validated, repaired and quantized (see app.normalize).
+    # Features that fail are left out and recorded in report.
+
+    header: Dict[str, Any] = {}
+
+    def crs_of() -> Optional[str]:
+        try:
+            return source_crs(header.get("crs"))
+        except ValueError as e:
+            raise GeoJSONParseError(str(e)) from None
+
+    if report is None:
+        report = IngestReport()
+    found = 0
+    try:
+        for edge in normalize_features(
+            _iter_raw_features(read, chunk_size, header), crs_of, report
+        ):
+            found += 1
+            yield edge
+    except GeoJSONParseError:
+        raise
+    except ValueError as e:
+        raise GeoJSONParseError(str(e)) from None
+    if not found:
+        raise GeoJSONParseError("No valid LineString/MultiLineString features found")
+
+
 def load_geojson_bytes(data: bytes) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
 
-    # Parse a GeoJSON FeatureCollection
+    # Parse a GeoJSON FeatureCollection held in memory
+    return list(iter_geojson_features(io.BytesIO(data).read))
+
+
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_PGCOPY_TRAILER = struct.pack("!h", -1)
+# 4 fields: version uuid, network uuid, then the geometry length
+_EDGE_ROW = struct.Struct("!hi16si16si")
+_JSONB_VERSION = b"\x01"
+
+
+def encode_ewkb(geoms: List[Dict[str, Any]]) -> List[bytes]:
+
+    # Encode a batch of GeoJSON LineStrings as EWKB (SRID 4326) in one vectorized call
+
     try:
-        doc = json.loads(data.decode("utf-8"))
-    except Exception as e:
-        raise GeoJSONParseError("Invalid JSON") from e
+        lines = np.array([LineString(g["coordinates"]) for g in geoms], dtype=object)
+    except (GEOSException, TypeError, ValueError) as e:
+        raise GeoJSONParseError("Invalid LineString coordinates") from e
+    return list(shapely.to_wkb(shapely.set_srid(lines, SRID), include_srid=True))
 
-    if doc.get("type") != "FeatureCollection":
-        raise GeoJSONParseError("Expected GeoJSON FeatureCollection")
 
-    out: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
-    for feat in doc.get("features", []):
-        if not feat or feat.get("type") != "Feature":
-            continue
-        geom = feat.get("geometry")
-        if not geom:
-            continue
-        props = feat.get("properties") or {}
-        gtype = geom.get("type")
+def _copy_edges_batch(
+    cur, table: str, network_uuid: bytes, version_uuid: bytes, batch
+) -> int:
 
-        if gtype == "LineString":
-            if not geom.get("coordinates"):
-                raise GeoJSONParseError("LineString has empty coordinates")
-            out.append((geom, props))
+    # Stream one batch through COPY ... FROM STDIN in binary format
 
-    if not out:
-        raise GeoJSONParseError("No LineString/MultiLineString features found")
+    geoms = [geom for geom, _ in batch]
+    buf = io.BytesIO()
+    buf.write(_PGCOPY_HEADER)
+    for ewkb, (_, props) in zip(encode_ewkb(geoms), batch):
+        doc = _JSONB_VERSION + json.dumps(props, separators=(",", ":")).encode("utf-8")
+        buf.write(_EDGE_ROW.pack(4, 16, version_uuid, 16, network_uuid, len(ewkb)))
+        buf.write(ewkb)
+        buf.write(struct.pack("!i", len(doc)))
+        buf.write(doc)
+    buf.write(_PGCOPY_TRAILER)
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY {table} (network_version_id, network_id, geom, properties)"
+        " FROM STDIN WITH (FORMAT binary)",
+        buf,
+    )
+    return len(batch)
 
-    return out
 
+def _insert_edges_batch(
+    cur, table: str, network_id: str, version_id: str, batch
+) -> int:
 
-def insert_edges(db, version_id: str, features):
-    vals = []
-    for geom, props in features:
-        vals.append(
-            (
-                str(version_id),
-                json.dumps(geom, separators=(",", ":")),
-                json.dumps(props, separators=(",", ":")),
-            )
+    # Multi-row INSERT; PostGIS parses the GeoJSON text of every row
+
+    vals = [
+        (
+            version_id,
+            network_id,
+            json.dumps(geom, separators=(",", ":")),
+            json.dumps(props, separators=(",", ":")),
         )
-    if not vals:
-        return 0
+        for geom, props in batch
+    ]
+    execute_values(
+        cur,
+        f"INSERT INTO {table} (network_version_id, network_id, geom, properties)"
+        " VALUES %s",
+        vals,
+        template="(%s::uuid, %s::uuid, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s::jsonb)",
+        page_size=len(vals),
+    )
+    return len(vals)
+
+
+def insert_edges(
+    db,
+    network_id: str,
+    version_id: str,
+    features,
+    batch_size: int = INGEST_BATCH_SIZE,
+    loader: str = INGEST_LOADER,
+    table: str = "edges",
+    progress: Optional[Callable[[int], None]] = None,
+):
 
+    # Insert edges in fixed-size batches so an iterator of features is never materialized.
+    # progress, if given, is called with the running count after every batch.
+
+    it = iter(features)
+    count = 0
     with raw_cursor_from_session(db) as cur:
-        execute_values(
-            cur,
-            "INSERT INTO edges (network_version_id, geom, properties) VALUES %s",
-            vals,
-            template="(%s::uuid, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s::jsonb)",
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                break
+            if loader == "copy":
+                count += _copy_edges_batch(
+                    cur,
+                    table,
+                    UUID(str(network_id)).bytes,
+                    UUID(str(version_id)).bytes,
+                    batch,
+                )
+            else:
+                count += _insert_edges_batch(
+                    cur, table, str(network_id), str(version_id), batch
+                )
+            if progress is not None:
+                progress(count)
+    return count
+
+
+def insert_edges_delta(
+    db,
+    network_id: str,
+    version_id: str,
+    ts: datetime,
+    features,
+    progress: Optional[Callable[[int], None]] = None,
+):
+
+    # Store only what changed against the network's live edges. Rows are matched on
+    # content_hash (geometry + properties), duplicates pairwise via row_number(), so
+    # unchanged edges keep their row and removed ones get valid_to = ts.
+
+    prev_storage = db.execute(
+        sa.text(
+            """
+            SELECT storage FROM network_versions
+             WHERE network_id = :nid AND valid_to = :ts
+        """
+        ),
+        {"nid": network_id, "ts": ts},
+    ).scalar_one_or_none()
+
+    db.execute(sa.text("DROP TABLE IF EXISTS _edge_stage"))
+    db.execute(
+        sa.text(
+            """
+            CREATE TEMP TABLE _edge_stage
+                (LIKE edges INCLUDING DEFAULTS INCLUDING GENERATED)
+                ON COMMIT DROP
+        """
         )
-    return len(vals)
+    )
+    count = insert_edges(
+        db, network_id, version_id, features, table="_edge_stage", progress=progress
+    )
+
+    if prev_storage != "delta":
+        # the previous version owns its rows: start a fresh delta baseline
+        db.execute(
+            sa.text(
+                """
+                UPDATE edges SET valid_to = :ts
+                 WHERE network_id = :nid
+                   AND valid_from IS NOT NULL AND valid_to IS NULL
+            """
+            ),
+            {"nid": network_id, "ts": ts},
+        )
+
+    params = {"nid": network_id, "vid": str(version_id), "ts": ts}
+    db.execute(
+        sa.text(
+            """
+            WITH live AS (
+                SELECT id, content_hash,
+                       row_number() OVER (PARTITION BY content_hash ORDER BY id) AS ord
+                  FROM edges
+                 WHERE network_id = :nid
+                   AND valid_from IS NOT NULL AND valid_to IS NULL
+            ), incoming AS (
+                SELECT content_hash, count(*) AS n
+                  FROM _edge_stage
+                 GROUP BY content_hash
+            )
+            UPDATE edges e
+               SET valid_to = :ts
+              FROM live l
+              LEFT JOIN incoming i ON i.content_hash = l.content_hash
+             WHERE e.id = l.id
+               AND e.network_id = :nid
+               AND l.ord > COALESCE(i.n, 0)
+        """
+        ),
+        params,
+    )
+    db.execute(
+        sa.text(
+            """
+            WITH live AS (
+                SELECT content_hash, count(*) AS n
+                  FROM edges
+                 WHERE network_id = :nid
+                   AND valid_from IS NOT NULL AND valid_to IS NULL
+                 GROUP BY content_hash
+            ), staged AS (
+                SELECT s.*,
+                       row_number() OVER (PARTITION BY s.content_hash) AS ord
+                  FROM _edge_stage s
+            )
+            INSERT INTO edges (network_version_id, network_id, geom, properties, valid_from)
+            SELECT :vid, :nid, s.geom, s.properties, :ts
+              FROM staged s
+              LEFT JOIN live l ON l.content_hash = s.content_hash
+             WHERE s.ord > COALESCE(l.n, 0)
+        """
+        ),
+        params,
+    )
+    return count
+
+
+def build_topology(
+    db,
+    network_id: str,
+    version_id: str,
+    tolerance: float = TOPOLOGY_SNAP_TOLERANCE,
+    unlinked_only: bool = False,
+) -> None:
+
+    # Snap the endpoints of the edges written for this version to a grid, upsert them
+    # into the network's nodes and set source_node/target_node, all set-based.
+    # unlinked_only skips rows that already carry their nodes (copied forward).
+
+    params = {"nid": network_id, "vid": str(version_id), "tol": tolerance}
+    unlinked = "AND e.source_node IS NULL" if unlinked_only else ""
+    db.execute(
+        sa.text(
+            f"""
+            INSERT INTO nodes (network_id, x, y, geom)
+            SELECT DISTINCT :nid, ST_X(q.p), ST_Y(q.p), q.p
+              FROM edges e
+              CROSS JOIN LATERAL (VALUES
+                    (ST_SnapToGrid(ST_StartPoint(e.geom), :tol)),
+                    (ST_SnapToGrid(ST_EndPoint(e.geom), :tol))
+              ) AS q(p)
+             WHERE e.network_id = :nid AND e.network_version_id = :vid
+                   {unlinked}
+            ON CONFLICT (network_id, x, y) DO NOTHING
+        """
+        ),
+        params,
+    )
+    db.execute(
+        sa.text(
+            f"""
+            UPDATE edges e
+               SET source_node = s.id, target_node = t.id
+              FROM nodes s, nodes t
+             WHERE e.network_id = :nid AND e.network_version_id = :vid
+                   {unlinked}
+               AND s.network_id = :nid
+               AND s.x = ST_X(ST_SnapToGrid(ST_StartPoint(e.geom), :tol))
+               AND s.y = ST_Y(ST_SnapToGrid(ST_StartPoint(e.geom), :tol))
+               AND t.network_id = :nid
+               AND t.x = ST_X(ST_SnapToGrid(ST_EndPoint(e.geom), :tol))
+               AND t.y = ST_Y(ST_SnapToGrid(ST_EndPoint(e.geom), :tol))
+        """
+        ),
+        params,
+    )
+
+
+def materialize_version_stats(db, version_id: str) -> None:
+
+    # Aggregate the version once at ingest so listing versions never scans edges
+
+    scope, params = version_edges_filter(db, version_id)
+    db.execute(
+        sa.text(
+            f"""
+            WITH ve AS (
+                SELECT e.geom, e.properties, ST_Length(e.geom::geography) AS len
+                  FROM edges e
+                 WHERE {scope}
+            ), totals AS (
+                SELECT count(*) AS n, COALESCE(sum(len), 0) AS len, ST_Extent(geom) AS box
+                  FROM ve
+            ), per_class AS (
+                SELECT COALESCE(properties->>'highway', '') AS cls,
+                       count(*) AS n, sum(len) AS len
+                  FROM ve
+                 GROUP BY 1
+            ), per_key AS (
+                SELECT key, count(*) AS n
+                  FROM ve, jsonb_object_keys(ve.properties) AS key
+                 GROUP BY key
+            )
+            INSERT INTO version_stats (version_id, edge_count, total_length_m,
+                                       min_x, min_y, max_x, max_y,
+                                       highway, property_keys)
+            SELECT :stats_vid, t.n, t.len,
+                   ST_XMin(t.box), ST_YMin(t.box), ST_XMax(t.box), ST_YMax(t.box),
+                   COALESCE((SELECT jsonb_object_agg(
+                                cls, jsonb_build_object('count', n, 'length_m', len))
+                               FROM per_class), '{{}}'::jsonb),
+                   COALESCE((SELECT jsonb_object_agg(key, n) FROM per_key), '{{}}'::jsonb)
+              FROM totals t
+            ON CONFLICT (version_id) DO NOTHING
+        """
+        ),
+        {**params, "stats_vid": str(version_id)},
+    )
+
+
+def derive_version_stats(
+    db,
+    network_id: str,
+    base_version_id: str,
+    version_id: str,
+    removed_ids: List[str],
+) -> bool:
+
+    # Stats of a delta version written as a small change to base_version_id: the
+    # base's stats minus the closed rows (removed_ids) plus the rows written for
+    # version_id, so only the change is read. False, with nothing stored, when the
+    # base has no stats or a closed row touches the base bbox (it may shrink); use
+    # materialize_version_stats then.
+
+    row = db.execute(
+        sa.text(
+            """
+            WITH r AS (
+                SELECT e.geom, e.properties, ST_Length(e.geom::geography) AS len,
+                       -1 AS sign
+                  FROM edges e
+                 WHERE e.network_id = :nid AND e.id = ANY(CAST(:removed AS uuid[]))
+            ), a AS (
+                SELECT e.geom, e.properties, ST_Length(e.geom::geography) AS len,
+                       1 AS sign
+                  FROM edges e
+                 WHERE e.network_id = :nid AND e.network_version_id = :vid
+            ), d AS (
+                SELECT * FROM r UNION ALL SELECT * FROM a
+            ), b AS (
+                SELECT * FROM version_stats WHERE version_id = :base_vid
+            ), per_class AS (
+                SELECT cls, sum(n) AS n, sum(len) AS len
+                  FROM (
+                    SELECT c.key AS cls, (c.value->>'count')::bigint AS n,
+                           (c.value->>'length_m')::float8 AS len
+                      FROM b, jsonb_each(b.highway) AS c
+                    UNION ALL
+                    SELECT COALESCE(properties->>'highway', ''), sign, sign * len
+                      FROM d
+                  ) x
+                 GROUP BY cls
+                HAVING sum(n) > 0
+            ), per_key AS (
+                SELECT key, sum(n) AS n
+                  FROM (
+                    SELECT k.key, k.value::bigint AS n
+                      FROM b, jsonb_each_text(b.property_keys) AS k
+                    UNION ALL
+                    SELECT key, sign FROM d, jsonb_object_keys(d.properties) AS key
+                  ) x
+                 GROUP BY key
+                HAVING sum(n) > 0
+            ), boxes AS (
+                SELECT (SELECT ST_Extent(geom) FROM a) AS added,
+                       (SELECT ST_Extent(geom) FROM r) AS removed
+            )
+            INSERT INTO version_stats (version_id, edge_count, total_length_m,
+                                       min_x, min_y, max_x, max_y,
+                                       highway, property_keys)
+            SELECT :vid,
+                   b.edge_count + (SELECT COALESCE(sum(sign), 0) FROM d),
+                   b.total_length_m + (SELECT COALESCE(sum(sign * len), 0) FROM d),
+                   LEAST(b.min_x, ST_XMin(x.added)), LEAST(b.min_y, ST_YMin(x.added)),
+                   GREATEST(b.max_x, ST_XMax(x.added)),
+                   GREATEST(b.max_y, ST_YMax(x.added)),
+                   COALESCE((SELECT jsonb_object_agg(
+                                cls, jsonb_build_object('count', n, 'length_m', len))
+                               FROM per_class), '{}'::jsonb),
+                   COALESCE((SELECT jsonb_object_agg(key, n) FROM per_key), '{}'::jsonb)
+              FROM b, boxes x
+             WHERE b.min_x IS NOT NULL
+               AND (x.removed IS NULL
+                    OR (ST_XMin(x.removed) > b.min_x AND ST_YMin(x.removed) > b.min_y
+                        AND ST_XMax(x.removed) < b.max_x
+                        AND ST_YMax(x.removed) < b.max_y))
+            ON CONFLICT (version_id) DO NOTHING
+            RETURNING version_id
+        """
+        ),
+        {
+            "nid": network_id,
+            "vid": str(version_id),
+            "base_vid": str(base_version_id),
+            "removed": [str(i) for i in removed_ids],
+        },
+    ).first()
+    return row is not None
+
+
+def list_versions(db, network_id: str) -> List[Dict[str, Any]]:
+
+    # Versions of a network with validity windows and their materialized stats
+
+    rows = db.execute(
+        sa.text(
+            """
+            SELECT v.id, v.valid_from, v.valid_to, v.storage,
+                   s.edge_count, s.total_length_m,
+                   s.min_x, s.min_y, s.max_x, s.max_y,
+                   s.highway, s.property_keys
+              FROM network_versions v
+              LEFT JOIN version_stats s ON s.version_id = v.id
+             WHERE v.network_id = :nid
+             ORDER BY v.valid_from
+        """
+        ),
+        {"nid": network_id},
+    )
+    out = []
+    for r in rows:
+        stats = None
+        if r.edge_count is not None:
+            bbox = None
+            if r.min_x is not None:
+                bbox = [r.min_x, r.min_y, r.max_x, r.max_y]
+            stats = {
+                "edge_count": r.edge_count,
+                "total_length_m": round(r.total_length_m, 2),
+                "bbox": bbox,
+                "highway": r.highway,
+                "property_keys": r.property_keys,
+            }
+        out.append(
+            {
+                "version_id": str(r.id),
+                "valid_from": r.valid_from.isoformat(),
+                "valid_to": r.valid_to.isoformat() if r.valid_to else None,
+                "storage": r.storage,
+                "stats": stats,
+            }
+        )
+    return out
+
+
+def store_version(
+    db,
+    network_id: str,
+    features,
+    storage: str = VERSION_STORAGE,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Tuple[str, int]:
+
+    # Open a new version of the network and write its edges; returns (version_id, count)
+
+    with stage("insert"):
+        version_id, ts = open_new_version(db, network_id, storage=storage)
+        if storage == "delta":
+            count = insert_edges_delta(
+                db, network_id, version_id, ts, features, progress=progress
+            )
+        else:
+            count = insert_edges(
+                db, network_id, version_id, features, progress=progress
+            )
+    with stage("topology"):
+        build_topology(db, network_id, version_id)
+    with stage("stats"):
+        materialize_version_stats(db, version_id)
+    return version_id, count
@@ -0,0 +1,98 @@
+# app/snap.py
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import sqlalchemy as sa
+
+from app.config import SNAP_BATCH_SIZE, SNAP_MAX_POINTS
+from app.services import version_edges_filter
+
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+
+def parse_points(body: bytes, content_type: Optional[str]) -> np.ndarray:
+
+    # Request body -> (n, 2) float64 lon/lat array, ValueError when malformed.
+    # JSON: [[lon, lat], ...] or {"points": [...]}; binary: little-endian float64
+    # pairs lon0, lat0, lon1, lat1, ...
+
+    if (content_type or "").split(";")[0].strip() == BINARY_MEDIA_TYPE:
+        if len(body) % 16:
+            raise ValueError("binary body must hold float64 lon/lat pairs")
+        pts = np.frombuffer(body, dtype="<f8").reshape(-1, 2)
+    else:
+        try:
+            doc = json.loads(body)
+        except ValueError:
+            raise ValueError("body must be a JSON array of [lon, lat] pairs") from None
+        if isinstance(doc, dict):
+            doc = doc.get("points")
+        try:
+            pts = np.asarray(doc, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError("body must be a JSON array of [lon, lat] pairs") from None
+        if pts.size == 0:
+            pts = pts.reshape(0, 2)
+        if pts.ndim != 2 or pts.shape[1] != 2:
+            raise ValueError("body must be a JSON array of [lon, lat] pairs")
+    if len(pts) > SNAP_MAX_POINTS:
+        raise ValueError(f"at most {SNAP_MAX_POINTS} points per request")
+    if (
+        not np.isfinite(pts).all()
+        or (np.abs(pts[:, 0]) > 180).any()
+        or (np.abs(pts[:, 1]) > 90).any()
+    ):
+        raise ValueError("points must be lon,lat in WGS84 range")
+    return pts
+
+
+def snap_points(
+    db, version_id: str, points: np.ndarray
+) -> List[Optional[Dict[str, Any]]]:
+
+    # Nearest edge of the version for every point, one set-based KNN query per batch.
+    # The LATERAL ... ORDER BY geom <-> point LIMIT 1 is answered by ix_edges_geom;
+    # <-> ranks by planar distance in degrees, the reported distance is geodesic.
+
+    scope, params = version_edges_filter(db, version_id)
+    sql = sa.text(
+        f"""
+        WITH pts AS (
+            SELECT p.ord, ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326) AS g
+              FROM unnest(CAST(:lons AS float8[]), CAST(:lats AS float8[]))
+                   WITH ORDINALITY AS p(lon, lat, ord)
+        )
+        SELECT pts.ord,
+               n.id::text,
+               ST_Distance(n.geom::geography, pts.g::geography),
+               ST_X(ST_ClosestPoint(n.geom, pts.g)),
+               ST_Y(ST_ClosestPoint(n.geom, pts.g)),
+               ST_LineLocatePoint(n.geom, pts.g)
+          FROM pts
+          CROSS JOIN LATERAL (
+                SELECT e.id, e.geom
+                  FROM edges e
+                 WHERE {scope}
+                 ORDER BY e.geom <-> pts.g
+                 LIMIT 1
+          ) n
+    """
+    )
+    out: List[Optional[Dict[str, Any]]] = [None] * len(points)
+    for start in range(0, len(points), SNAP_BATCH_SIZE):
+        batch = points[start : start + SNAP_BATCH_SIZE]
+        rows = db.execute(
+            sql,
+            {**params, "lons": batch[:, 0].tolist(), "lats": batch[:, 1].tolist()},
+        )
+        for ord_, edge_id, dist, x, y, frac in rows:
+            out[start + ord_ - 1] = {
+                "edge_id": edge_id,
+                "distance_m": round(dist, 3),
+                "point": [x, y],
+                "fraction": frac,
+            }
+    return out
@@ -0,0 +1,81 @@
+# app/tiles.py
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from app.cache import BytesLRU
+from app.config import TILE_CACHE_MAX_BYTES
+from app.services import version_edges_filter
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+MAX_ZOOM = 22
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+# Width of the web mercator world in meters.
+WORLD_SIZE = 40075016.685578488
+
+# Edges of a version never change once written, so tiles are keyed by version and
+# only need evicting for space.
+tile_cache = BytesLRU(TILE_CACHE_MAX_BYTES)
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+def render_tile(db, version_id: str, z: int, x: int, y: int) -> bytes:
+
+    # Build one MVT tile of a version's edges, simplified to ~1 tile pixel at zoom z
+
+    scope, params = version_edges_filter(db, version_id)
+    tile = db.execute(
+        sa.text(
+            f"""
+            WITH bounds AS (
+                SELECT
+                    ST_TileEnvelope(:z, :x, :y) AS env,
+                    ST_Transform(
+                        ST_TileEnvelope(:z, :x, :y, margin => :margin), 4326
+                    ) AS query_env
+            ), mvt AS (
+                SELECT
+                    e.id::text AS id,
+                    e.properties,
+                    ST_AsMVTGeom(
+                        ST_Simplify(ST_Transform(e.geom, 3857), :tolerance),
+                        b.env,
+                        {TILE_EXTENT},
+                        {TILE_BUFFER},
+                        true
+                    ) AS geom
+                FROM edges e, bounds b
+                WHERE {scope}
+                  AND e.geom && b.query_env
+            )
+            SELECT ST_AsMVT(mvt, 'edges', {TILE_EXTENT}, 'geom')
+              FROM mvt
+             WHERE geom IS NOT NULL
+        """
+        ),
+        {
+            **params,
+            "z": z,
+            "x": x,
+            "y": y,
+            "margin": TILE_BUFFER / TILE_EXTENT,
+            "tolerance": WORLD_SIZE / (1 << z) / TILE_EXTENT,
+        },
+    ).scalar_one()
+    return bytes(tile or b"")
+
+
+def get_tile(db, version_id: str, z: int, x: int, y: int) -> bytes:
+
+    # Serve a tile from the per-version cache, rendering it on a miss
+
+    key = (str(version_id), z, x, y)
+    tile = tile_cache.get(key)
+    if tile is None:
+        tile = render_tile(db, version_id, z, x, y)
+        tile_cache.put(key, tile)
+    return tile
@@ -0,0 +1,112 @@
+# app/timeline.py
+from __future__ import annotations
+
+from bisect import bisect_right
+from datetime import datetime
+from typing import List, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.cache import TTLCache
+from app.config import TIMELINE_CACHE_SIZE, TIMELINE_CACHE_TTL
+from app.db import note_write
+
+
+class Timeline:
+    """Owner and versions of one network, sorted by valid_from (windows never overlap)."""
+
+    __slots__ = ("customer_id", "starts", "ends", "ids")
+
+    def __init__(
+        self,
+        customer_id: str,
+        starts: List[datetime],
+        ends: List[Optional[datetime]],
+        ids: List[str],
+    ):
+        self.customer_id = customer_id
+        self.starts = starts
+        self.ends = ends
+        self.ids = ids
+
+    def at(self, ts: datetime) -> Optional[str]:
+        # Same answer as services.version_at, without a round trip
+        i = bisect_right(self.starts, ts) - 1
+        if i < 0:
+            return None
+        end = self.ends[i]
+        return self.ids[i] if end is None or ts < end else None
+
+    def __contains__(self, version_id: object) -> bool:
+        return str(version_id) in self.ids
+
+
+# network_id -> Timeline, or _MISSING for ids that are not a network
+_MISSING = object()
+_timelines = TTLCache(TIMELINE_CACHE_SIZE, TIMELINE_CACHE_TTL)
+
+
+def network_timeline(db, network_id: str) -> Optional[Timeline]:
+
+    # Cached timeline of network_id, loaded with one query on a miss; None when the
+    # network does not exist
+
+    key = str(network_id)
+    timeline = _timelines.get(key, None)
+    if timeline is not None:
+        return None if timeline is _MISSING else timeline
+
+    rows = db.execute(
+        sa.text(
+            """
+            SELECT n.customer_id, v.id, v.valid_from, v.valid_to
+              FROM networks n
+              LEFT JOIN network_versions v ON v.network_id = n.id
+             WHERE n.id = :nid
+             ORDER BY v.valid_from
+        """
+        ),
+        {"nid": key},
+    ).all()
+    if not rows:
+        _timelines.put(key, _MISSING)
+        return None
+    versions = [r for r in rows if r.id is not None]
+    timeline = Timeline(
+        str(rows[0].customer_id),
+        [r.valid_from for r in versions],
+        [r.valid_to for r in versions],
+        [str(r.id) for r in versions],
+    )
+    _timelines.put(key, timeline)
+    return timeline
+
+
+def invalidate_timeline(network_id: Optional[str] = None) -> None:
+    # Without an id the whole cache is dropped
+    if network_id is None:
+        _timelines.clear()
+    else:
+        _timelines.discard(str(network_id))
+
+
+def mark_timeline_changed(db, network_id: str) -> None:
+    # Called when a session changes the versions of a network; the cached timeline
+    # is dropped once that transaction commits, so no reader can cache it too early
+    db.info.setdefault("timeline_changed", set()).add(str(network_id))
+
+
+def _after_commit(session) -> None:
+    for network_id in session.info.pop("timeline_changed", ()):
+        invalidate_timeline(network_id)
+        # reads of it stay on the primary until replicas have caught up
+        note_write(network_id)
+
+
+def _after_rollback(session) -> None:
+    session.info.pop("timeline_changed", None)
+
+
+sa.event.listen(Session, "after_commit", _after_commit)
+sa.event.listen(Session, "after_rollback", _after_rollback)
@@ -0,0 +1,121 @@
+# app/topology.py
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import numpy as np
+import sqlalchemy as sa
+
+from app.services import version_edges_filter
+
+
+def _find(parent: List[int], v: int) -> int:
+    while parent[v] != v:
+        parent[v] = parent[parent[v]]
+        v = parent[v]
+    return v
+
+
+def connected_components(
+    db, version_id: str, include_edges: bool = False
+) -> List[Dict[str, Any]]:
+
+    # Weakly connected components from the precomputed source/target nodes,
+    # largest first; no geometry is read. Edges not linked to nodes yet are skipped.
+
+    scope, params = version_edges_filter(db, version_id)
+    rows = db.execute(
+        sa.text(
+            f"""
+            SELECT e.id::text, e.source_node, e.target_node
+              FROM edges e
+             WHERE {scope}
+               AND e.source_node IS NOT NULL AND e.target_node IS NOT NULL
+        """
+        ),
+        params,
+    ).all()
+    if not rows:
+        return []
+
+    ids = [r[0] for r in rows]
+    ends = np.array([(r[1], r[2]) for r in rows], dtype=np.int64)
+    nodes, local = np.unique(ends, return_inverse=True)
+    local = local.reshape(-1, 2).tolist()
+
+    parent = list(range(len(nodes)))
+    for a, b in local:
+        ra, rb = _find(parent, a), _find(parent, b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    roots = np.array([_find(parent, v) for v in range(len(nodes))])
+    edge_root = roots[np.array([a for a, _ in local])]
+
+    labels, edge_label = np.unique(edge_root, return_inverse=True)
+    edge_counts = np.bincount(edge_label)
+    node_counts = np.bincount(np.searchsorted(labels, roots), minlength=len(labels))
+    order = np.argsort(-edge_counts, kind="stable")
+
+    members: Dict[int, List[str]] = {}
+    if include_edges:
+        for eid, lab in zip(ids, edge_label.tolist()):
+            members.setdefault(lab, []).append(eid)
+
+    out = []
+    for rank, lab in enumerate(order.tolist()):
+        comp: Dict[str, Any] = {
+            "component": rank,
+            "edges": int(edge_counts[lab]),
+            "nodes": int(node_counts[lab]),
+        }
+        if include_edges:
+            comp["edge_ids"] = members[lab]
+        out.append(comp)
+    return out
+
+
+def dangling_edges(db, version_id: str) -> Dict[str, Any]:
+
+    # FeatureCollection of edges with an endpoint no other edge of the version touches
+
+    scope, params = version_edges_filter(db, version_id)
+    rows = db.execute(
+        sa.text(
+            f"""
+            WITH ve AS (
+                SELECT e.id, e.geom, e.source_node, e.target_node
+                  FROM edges e
+                 WHERE {scope}
+            ), degree AS (
+                SELECT node, count(*) AS n
+                  FROM (
+                        SELECT source_node AS node FROM ve
+                        UNION ALL
+                        SELECT target_node FROM ve
+                  ) ends
+                 GROUP BY node
+            )
+            SELECT jsonb_build_object(
+                'type','Feature',
+                'id', ve.id,
+                'geometry', ST_AsGeoJSON(ve.geom)::jsonb,
+                'properties', jsonb_build_object(
+                    'dangling', CASE
+                        WHEN ds.n = 1 AND dt.n = 1 THEN 'both'
+                        WHEN ds.n = 1 THEN 'source'
+                        ELSE 'target'
+                    END,
+                    'source_node', ve.source_node,
+                    'target_node', ve.target_node
+                )
+            )
+              FROM ve
+              JOIN degree ds ON ds.node = ve.source_node
+              JOIN degree dt ON dt.node = ve.target_node
+             WHERE ds.n = 1 OR dt.n = 1
+             ORDER BY ve.id
+        """
+        ),
+        params,
+    )
+    return {"type": "FeatureCollection", "features": [row[0] for row in rows]}
@@ -0,0 +1,100 @@
+# GET latency while uploads are in flight.
+#
+#   python benchmarks/bench_concurrency.py --network-id <ID> --uploads 4
+#
+# Measures GET /networks/{id}/edges latency percentiles first on an idle server and
+# then while --uploads clients post ingest_bundle/file-2.geojson to /networks/update
+# in a loop. Run against a server started with uvicorn (one worker).
+
+import argparse
+import os
+import statistics
+import threading
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FILE = os.path.join(HERE, "..", "ingest_bundle", "file-2.geojson")
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[k]
+
+
+def measure_gets(client, url, duration, params):
+    samples = []
+    stop = time.perf_counter() + duration
+    while time.perf_counter() < stop:
+        t0 = time.perf_counter()
+        client.get(url, params=params).raise_for_status()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def upload_loop(base_url, headers, name, payload, stop, counts):
+    with httpx.Client(base_url=base_url, headers=headers, timeout=None) as client:
+        while not stop.is_set():
+            r = client.post(
+                "/networks/update",
+                data={"name": name},
+                files={"file": ("upload.geojson", payload, "application/geo+json")},
+            )
+            r.raise_for_status()
+            counts.append(1)
+
+
+def report(label, samples):
+    print(
+        f"{label:>14}: n={len(samples)} p50={statistics.median(samples):.1f}ms "
+        f"p95={percentile(samples, 95):.1f}ms p99={percentile(samples, 99):.1f}ms"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://localhost:8000")
+    ap.add_argument("--api-key", default="dev-123")
+    ap.add_argument("--network-id", required=True)
+    ap.add_argument("--network-name", default="Network 1")
+    ap.add_argument("--file", default=DEFAULT_FILE)
+    ap.add_argument("--uploads", type=int, default=4)
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--bbox", default=None, help="keep GETs cheap with a bbox")
+    args = ap.parse_args()
+
+    headers = {"X-API-Key": args.api_key}
+    url = f"/networks/{args.network_id}/edges"
+    params = {"bbox": args.bbox, "limit": 100} if args.bbox else {"limit": 100}
+    with open(args.file, "rb") as fh:
+        payload = fh.read()
+
+    with httpx.Client(base_url=args.base_url, headers=headers, timeout=None) as client:
+        report("idle", measure_gets(client, url, args.duration, params))
+
+        stop = threading.Event()
+        counts = []
+        workers = [
+            threading.Thread(
+                target=upload_loop,
+                args=(args.base_url, headers, args.network_name, payload, stop, counts),
+                daemon=True,
+            )
+            for _ in range(args.uploads)
+        ]
+        for w in workers:
+            w.start()
+        time.sleep(1.0)
+        report(
+            f"{args.uploads} uploads", measure_gets(client, url, args.duration, params)
+        )
+        stop.set()
+        for w in workers:
+            w.join()
+    print(f"uploads completed during run: {len(counts)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Compare edge loaders (execute_values vs binary COPY) in edges/second.
+#
+#   python benchmarks/bench_loaders.py --scale 200
+#
+# Replicates the features of ingest_bundle/file-2.geojson --scale times, loads them
+# into a throwaway network version with each loader and rolls the transaction back.
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.db import SessionLocal  # noqa: E402
+from app.services import (  # noqa: E402
+    ensure_network,
+    insert_edges,
+    load_geojson_bytes,
+    open_new_version,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FILE = os.path.join(HERE, "..", "ingest_bundle", "file-2.geojson")
+
+
+def scaled(features, scale):
+    for _ in range(scale):
+        yield from features
+
+
+def run(loader, features, scale, batch_size, customer_id):
+    db = SessionLocal()
+    try:
+        network_id = ensure_network(db, customer_id, f"bench-{uuid.uuid4()}")
+        version_id, _ = open_new_version(db, network_id)
+        t0 = time.perf_counter()
+        count = insert_edges(
+            db,
+            network_id,
+            version_id,
+            scaled(features, scale),
+            batch_size=batch_size,
+            loader=loader,
+        )
+        db.flush()
+        elapsed = time.perf_counter() - t0
+    finally:
+        db.rollback()
+        db.close()
+    return count, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", default=DEFAULT_FILE)
+    ap.add_argument("--scale", type=int, default=100)
+    ap.add_argument("--batch-size", type=int, default=5000)
+    ap.add_argument("--customer-id", required=True, help="existing customers.id")
+    ap.add_argument("--loaders", default="insert,copy")
+    args = ap.parse_args()
+
+    with open(args.file, "rb") as fh:
+        features = load_geojson_bytes(fh.read())
+
+    for loader in args.loaders.split(","):
+        count, elapsed = run(
+            loader, features, args.scale, args.batch_size, args.customer_id
+        )
+        print(
+            f"{loader:>6}: {count} edges in {elapsed:.2f}s -> {count / elapsed:,.0f} edges/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
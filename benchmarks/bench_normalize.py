@@ -0,0 +1,65 @@
+# Validation/normalization throughput in features/second per worker count.
+#
+#   python benchmarks/bench_normalize.py --scale 200 --workers 0,1,2,4
+#
+# Replicates the features of ingest_bundle/file-2.geojson --scale times and runs them
+# through app.normalize (no parsing, no database), once per worker count.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.normalize import IngestReport, normalize_features  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FILE = os.path.join(HERE, "..", "ingest_bundle", "file-2.geojson")
+
+
+def scaled(features, scale):
+    for _ in range(scale):
+        yield from features
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", default=DEFAULT_FILE)
+    ap.add_argument("--scale", type=int, default=200)
+    ap.add_argument("--workers", default="0,1,2,4")
+    ap.add_argument("--chunk-size", type=int, default=5000)
+    ap.add_argument("--precision", type=int, default=None)
+    args = ap.parse_args()
+
+    with open(args.file, "rb") as fh:
+        doc = json.load(fh)
+    features = doc["features"]
+
+    for workers in (int(w) for w in args.workers.split(",")):
+        # start the worker processes outside the timed run
+        for _ in normalize_features(
+            features, lambda: None, IngestReport(), chunk_size=1, workers=workers
+        ):
+            pass
+        report = IngestReport()
+        t0 = time.perf_counter()
+        for _ in normalize_features(
+            scaled(features, args.scale),
+            lambda: None,
+            report,
+            chunk_size=args.chunk_size,
+            workers=workers,
+            precision=args.precision,
+        ):
+            pass
+        elapsed = time.perf_counter() - t0
+        print(
+            f"workers={workers}: {report.features} features in {elapsed:.2f}s -> "
+            f"{report.features / elapsed:,.0f} features/s ({report.rejected} rejected)"
+        )
+
+
+if __name__ == "__main__":
+    main()
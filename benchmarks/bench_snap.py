@@ -0,0 +1,59 @@
+# Snapping throughput in points/second.
+#
+#   python benchmarks/bench_snap.py --network-id <ID> --points 100000 --batch 20000
+#
+# Posts random points inside --bbox to POST /networks/{id}/snap, as JSON or as the
+# binary float64 body, and reports points/second per encoding.
+
+import argparse
+import time
+
+import httpx
+import numpy as np
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://localhost:8000")
+    ap.add_argument("--api-key", default="dev-123")
+    ap.add_argument("--network-id", required=True)
+    ap.add_argument(
+        "--bbox", default="11.36,48.06,11.72,48.25", help="minx,miny,maxx,maxy"
+    )
+    ap.add_argument("--points", type=int, default=100000)
+    ap.add_argument("--batch", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    minx, miny, maxx, maxy = (float(v) for v in args.bbox.split(","))
+    rng = np.random.default_rng(args.seed)
+    pts = np.column_stack(
+        [rng.uniform(minx, maxx, args.points), rng.uniform(miny, maxy, args.points)]
+    )
+    url = f"/networks/{args.network_id}/snap"
+
+    with httpx.Client(
+        base_url=args.base_url, headers={"X-API-Key": args.api_key}, timeout=None
+    ) as client:
+        for encoding in ("json", "binary"):
+            t0 = time.perf_counter()
+            for start in range(0, len(pts), args.batch):
+                batch = pts[start : start + args.batch]
+                if encoding == "json":
+                    r = client.post(url, json=batch.tolist())
+                else:
+                    r = client.post(
+                        url,
+                        content=batch.astype("<f8").tobytes(),
+                        headers={"Content-Type": "application/octet-stream"},
+                    )
+                r.raise_for_status()
+            elapsed = time.perf_counter() - t0
+            print(
+                f"{encoding:>6}: {len(pts)} points in {elapsed:.2f}s -> "
+                f"{len(pts) / elapsed:,.0f} points/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
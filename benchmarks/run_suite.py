@@ -0,0 +1,342 @@
+# Benchmark suite: ingest throughput and edges query latency/memory per network size.
+#
+#   python benchmarks/run_suite.py --sizes 1000,100000,1000000 --server-pid <PID> \
+#       --out benchmarks/results/$(date +%Y%m%d-%H%M).json
+#   python benchmarks/run_suite.py ... --compare benchmarks/results/baseline.json
+#
+# Against a running API backed by a local PostGIS (one uvicorn worker, so
+# --server-pid covers every request). For each size it:
+#   1. generates a synthetic network and its update variant (benchmarks/synth.py,
+#      cached in --work-dir),
+#   2. uploads them with POST /networks and POST /networks/update (?job=true with
+#      --jobs) and records edges/second,
+#   3. runs GET /networks/{id}/edges --requests times per scenario: current and
+#      time-travel (?datetime= between the two uploads), whole network and a bbox,
+#      and records latency percentiles, bytes and the server's peak RSS while it
+#      runs. Whole-network responses are served from the response cache after the
+#      first request, so their first (cold) request is recorded on its own as
+#      <scenario>_cold and the other --requests as <scenario> (warm).
+#
+# Results are one JSON document (meta + flat list of records keyed by size/scenario).
+# --compare prints the change against an earlier document and exits with 1 when a
+# metric regressed by more than --tolerance.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synth import ORIGIN, SPACING, Grid, write_network  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# server settings worth recording with the results (as seen by this process)
+CONFIG_PREFIXES = ("INGEST_", "EDGES_", "VERSION_", "RESPONSE_", "JOBS_", "DB_")
+# metric -> True when higher is better
+METRICS = {
+    "edges_per_second": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "rss_peak_mb": False,
+}
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[k]
+
+
+class RssSampler:
+    """Samples VmRSS of a process (Linux /proc) in a thread; peak in MB."""
+
+    def __init__(self, pid, interval=0.01):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def rss_mb(self):
+        with open(f"/proc/{self.pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = self.rss_mb()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self.pid:
+            self.before = self.rss_mb()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+
+    def fields(self):
+        if not self.pid:
+            return {}
+        return {
+            "rss_before_mb": round(self.before, 1),
+            "rss_peak_mb": round(self.peak, 1),
+            "rss_growth_mb": round(self.peak - self.before, 1),
+        }
+
+
+def dataset(work_dir, size, layout, seed, change_ratio):
+    # (base, update) paths, generated on first use
+    os.makedirs(work_dir, exist_ok=True)
+    base = os.path.join(work_dir, f"{layout}-{size}-s{seed}.geojson.gz")
+    update = os.path.join(
+        work_dir, f"{layout}-{size}-s{seed}-r{change_ratio:g}.geojson.gz"
+    )
+    for path, ratio in ((base, 0.0), (update, change_ratio)):
+        if not os.path.exists(path):
+            t0 = time.perf_counter()
+            n = write_network(path + ".tmp", size, layout, seed, ratio)
+            os.replace(path + ".tmp", path)
+            print(f"  generated {n} features in {time.perf_counter() - t0:.1f}s")
+    return base, update
+
+
+def upload(client, endpoint, name, path, jobs):
+    # POST one file; returns (response document, seconds)
+    t0 = time.perf_counter()
+    with open(path, "rb") as fh:
+        r = client.post(
+            endpoint,
+            params={"job": "true"} if jobs else None,
+            data={"name": name},
+            files={"file": (os.path.basename(path), fh, "application/gzip")},
+        )
+    r.raise_for_status()
+    doc = r.json()
+    if jobs:
+        while doc.get("status") not in ("succeeded", "failed"):
+            time.sleep(0.5)
+            doc = client.get(f"/jobs/{doc['job_id']}").json()
+        if doc["status"] == "failed":
+            raise RuntimeError(f"ingest job failed: {doc.get('error')}")
+    return doc, time.perf_counter() - t0
+
+
+def ingest_record(size, scenario, path, doc, seconds):
+    report = doc.get("report") or {}
+    return {
+        "size": size,
+        "scenario": scenario,
+        "edges": doc["edges_inserted"],
+        "rejected": report.get("rejected"),
+        "upload_bytes": os.path.getsize(path),
+        "seconds": round(seconds, 3),
+        "edges_per_second": round(doc["edges_inserted"] / seconds, 1),
+    }
+
+
+def measure_gets(client, url, params, requests, pid):
+    # latency (ms, whole body read) and server RSS over `requests` GETs
+    samples, ttfb, size = [], [], 0
+    with RssSampler(pid) as rss:
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            with client.stream("GET", url, params=params) as r:
+                r.raise_for_status()
+                first = None
+                size = 0
+                for chunk in r.iter_raw():
+                    if first is None:
+                        first = time.perf_counter()
+                    size += len(chunk)
+            end = time.perf_counter()
+            samples.append((end - t0) * 1000)
+            ttfb.append(((first or end) - t0) * 1000)
+    return {
+        "requests": requests,
+        "bytes": size,
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+        "mean_ms": round(statistics.fmean(samples), 2),
+        "ttfb_p50_ms": round(statistics.median(ttfb), 2),
+        **rss.fields(),
+    }
+
+
+def small_bbox(size, layout, seed):
+    # ~1% of the network's extent, at its centre
+    grid = Grid(size, seed, layout)
+    w, h = grid.cols * SPACING[0], grid.rows * SPACING[1]
+    cx, cy = ORIGIN[0] + w / 2, ORIGIN[1] + h / 2
+    return f"{cx - w / 20:.6f},{cy - h / 20:.6f},{cx + w / 20:.6f},{cy + h / 20:.6f}"
+
+
+def run_size(client, args, size, run_id):
+    print(f"size {size}:")
+    base, update = dataset(
+        args.work_dir, size, args.layout, args.seed, args.change_ratio
+    )
+    name = f"bench-{args.layout}-{size}-{run_id}"
+    records = []
+
+    doc, seconds = upload(client, "/networks", name, base, args.jobs)
+    records.append(ingest_record(size, "ingest_create", base, doc, seconds))
+    network_id = doc["network_id"]
+    # versions are opened at server time; this host runs the database
+    time.sleep(1.0)
+    between = datetime.now(timezone.utc).isoformat()
+    time.sleep(1.0)
+    doc, seconds = upload(client, "/networks/update", name, update, args.jobs)
+    records.append(ingest_record(size, "ingest_update", update, doc, seconds))
+
+    url = f"/networks/{network_id}/edges"
+    bbox = small_bbox(size, args.layout, args.seed)
+    # (scenario, params, whole-version response, i.e. response-cached)
+    scenarios = [
+        ("get_current_bbox", {"bbox": bbox}, False),
+        ("get_time_travel_bbox", {"bbox": bbox, "datetime": between}, False),
+    ]
+    if size <= args.full_max_edges:
+        scenarios += [
+            ("get_current", {}, True),
+            ("get_time_travel", {"datetime": between}, True),
+        ]
+    for scenario, params, cached in scenarios:
+        if cached:
+            # the version is new, so only its first request misses the cache
+            rec = {"size": size, "scenario": scenario + "_cold"}
+            rec.update(measure_gets(client, url, params, 1, args.server_pid))
+            records.append(rec)
+        else:
+            # one untimed request warms the database the way steady traffic would
+            client.get(url, params=params).raise_for_status()
+        rec = {"size": size, "scenario": scenario}
+        rec.update(measure_gets(client, url, params, args.requests, args.server_pid))
+        records.append(rec)
+
+    for rec in records:
+        print("  " + json.dumps(rec))
+    return records
+
+
+def meta(args, run_id):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "run_id": run_id,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "base_url": args.base_url,
+        "layout": args.layout,
+        "seed": args.seed,
+        "change_ratio": args.change_ratio,
+        "requests": args.requests,
+        "jobs": args.jobs,
+        "config": {
+            k: v for k, v in os.environ.items() if k.startswith(CONFIG_PREFIXES)
+        },
+    }
+
+
+def compare(old, new, tolerance):
+    # print metric changes; returns the number of regressions
+    before = {(r["size"], r["scenario"]): r for r in old["results"]}
+    regressions = 0
+    for rec in new["results"]:
+        prev = before.get((rec["size"], rec["scenario"]))
+        if prev is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if not prev.get(metric) or rec.get(metric) is None:
+                continue
+            change = rec[metric] / prev[metric] - 1
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(
+                f"{rec['size']:>10} {rec['scenario']:<22} {metric:<17}"
+                f" {prev[metric]:>12} -> {rec[metric]:>12} ({change:+.1%}){flag}"
+            )
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://localhost:8000")
+    ap.add_argument("--api-key", default="dev-123")
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    ap.add_argument("--layout", choices=("grid", "organic"), default="organic")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--change-ratio", type=float, default=0.05)
+    ap.add_argument("--requests", type=int, default=20)
+    ap.add_argument(
+        "--full-max-edges",
+        type=int,
+        default=1000000,
+        help="skip whole-network GETs above this size",
+    )
+    ap.add_argument("--jobs", action="store_true", help="upload with ?job=true")
+    ap.add_argument("--server-pid", type=int, default=None, help="sample its RSS")
+    ap.add_argument("--work-dir", default=os.path.join(HERE, "data"))
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    ap.add_argument("--compare", default=None, help="earlier results JSON")
+    ap.add_argument("--tolerance", type=float, default=0.15)
+    args = ap.parse_args()
+
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    results = {"meta": meta(args, run_id), "results": []}
+    with httpx.Client(
+        base_url=args.base_url,
+        headers={"X-API-Key": args.api_key, "Accept-Encoding": "identity"},
+        timeout=None,
+    ) as client:
+        for size in (int(s) for s in args.sizes.split(",")):
+            results["results"].extend(run_size(client, args, size, run_id))
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"results -> {args.out}")
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(json.load(fh), results, args.tolerance)
+        if regressions:
+            print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
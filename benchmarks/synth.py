@@ -0,0 +1,305 @@
+# Deterministic synthetic road networks as GeoJSON FeatureCollections.
+#
+#   python benchmarks/synth.py --edges 1000000 --layout organic --out net.geojson.gz
+#   python benchmarks/synth.py --edges 1000000 --layout organic --change-ratio 0.05 \
+#       --out net-update.geojson.gz
+#
+# Layouts:
+#   grid     straight two-point streets on a regular block grid
+#   organic  jittered nodes, curved streets (2-5 points) and ~15% of the grid missing
+#
+# Every edge is a pure function of (seed, edge number), so a network is generated in
+# fixed-size blocks and streamed to disk (10M edges never sit in memory), and an
+# "update" variant with --change-ratio R reproduces the base network with about R of
+# its edges changed: half of them modified (properties, and for half of those the
+# geometry), a quarter deleted, and a quarter's worth of new service roads added.
+# Edges carry a stable osm_id so base and update can be compared.
+#
+# .gz / .zst outputs are compressed while written (the API accepts both).
+
+import argparse
+import gzip
+import json
+import math
+import sys
+
+import numpy as np
+
+# Munich, like the default bbox of bench_snap.py; ~90 m x ~100 m blocks
+ORIGIN = (11.36, 48.06)
+SPACING = (0.0012, 0.0009)
+BLOCK = 10000
+
+# highway class of a street line -> (lanes choices, maxspeed)
+CLASSES = {
+    "primary": ((3, 4), 70),
+    "secondary": ((2, 3), 50),
+    "tertiary": ((2,), 50),
+    "residential": ((1, 2), 30),
+    "service": ((1,), 20),
+}
+_M64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _mix(x):
+    # splitmix64 finalizer on a uint64 array
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return (x ^ (x >> np.uint64(31))) & _M64
+
+
+def unit(seed, ids, salt):
+    # Uniform [0, 1) values that only depend on (seed, id, salt)
+    with np.errstate(over="ignore"):
+        key = np.asarray(ids, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        key ^= _mix(np.uint64(seed) * np.uint64(1000003) + np.uint64(salt))
+    return (_mix(key) >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class Grid:
+    """Block grid sized for n edges; edge i joins two neighbouring nodes."""
+
+    def __init__(self, n, seed, layout):
+        self.seed = seed
+        self.layout = layout
+        # organic drops ~15% of candidate edges, so it needs a larger grid
+        target = n / 0.85 if layout == "organic" else n
+        self.cols = int(math.ceil(math.sqrt(target / 2))) + 1
+        self.per_row = 2 * self.cols - 1
+        self.rows = int(math.ceil(target / self.per_row)) + 1
+
+    def candidates(self, ids):
+        # (from node, to node, street line index, horizontal) of candidate edges
+        r, j = np.divmod(ids, self.per_row)
+        horizontal = j < self.cols - 1
+        c = np.where(horizontal, j, j - (self.cols - 1))
+        a = r * self.cols + c
+        b = np.where(horizontal, a + 1, a + self.cols)
+        line = np.where(horizontal, r, c)
+        valid = horizontal | (r < self.rows - 1)
+        return a, b, line, horizontal, valid
+
+    def nodes(self, ids):
+        r, c = np.divmod(ids, self.cols)
+        x = ORIGIN[0] + c * SPACING[0]
+        y = ORIGIN[1] + r * SPACING[1]
+        if self.layout == "organic":
+            x = x + (unit(self.seed, ids, 1) - 0.5) * 0.7 * SPACING[0]
+            y = y + (unit(self.seed, ids, 2) - 0.5) * 0.7 * SPACING[1]
+        return x, y
+
+
+def _highway(line, ids, seed):
+    # arterials every 16th / 8th / 4th street line, a few service roads in between
+    cls = np.full(len(line), "residential", dtype=object)
+    cls[line % 4 == 0] = "tertiary"
+    cls[line % 8 == 0] = "secondary"
+    cls[line % 16 == 0] = "primary"
+    cls[(cls == "residential") & (unit(seed, ids, 3) < 0.05)] = "service"
+    return cls
+
+
+def _coords(grid, a, b, ids, seed):
+    # list of (x, y) arrays per edge; organic streets bend through 0-3 inner points
+    ax, ay = grid.nodes(a)
+    bx, by = grid.nodes(b)
+    if grid.layout != "organic":
+        return [
+            np.array([[x0, y0], [x1, y1]]) for x0, y0, x1, y1 in zip(ax, ay, bx, by)
+        ]
+    inner = (unit(seed, ids, 4) * 4).astype(int)
+    amount = (unit(seed, ids, 5) - 0.5) * 0.3
+    ts = [np.linspace(0.0, 1.0, m + 2) for m in range(4)]
+    arcs = [np.sin(np.pi * t) for t in ts]
+    out = []
+    for x0, y0, x1, y1, m, k in zip(ax, ay, bx, by, inner, amount):
+        t = ts[m]
+        bend = arcs[m] * k
+        xs = x0 + (x1 - x0) * t - (y1 - y0) * bend
+        ys = y0 + (y1 - y0) * t + (x1 - x0) * bend
+        out.append(np.column_stack([xs, ys]))
+    return out
+
+
+_props_cache = {}
+
+
+def _props(highway, lanes, maxspeed, oneway, name):
+    key = (highway, lanes, maxspeed, oneway, name)
+    text = _props_cache.get(key)
+    if text is None:
+        text = json.dumps(
+            {
+                "highway": highway,
+                "lanes": int(lanes),
+                "maxspeed": int(maxspeed),
+                "oneway": oneway,
+                "name": name,
+            }
+        )[1:-1]
+        if len(_props_cache) < 100000:
+            _props_cache[key] = text
+    return text
+
+
+def _feature(osm_id, props, coords):
+    pts = ",".join(f"[{x:.7f},{y:.7f}]" for x, y in coords)
+    return (
+        f'{{"type":"Feature","properties":{{"osm_id":{osm_id},{props}}},'
+        f'"geometry":{{"type":"LineString","coordinates":[{pts}]}}}}'
+    )
+
+
+def iter_features(edges, layout="grid", seed=1, change_ratio=0.0, update_seed=2):
+
+    # GeoJSON Feature strings of the network, in blocks; deterministic for the args
+
+    grid = Grid(edges, seed, layout)
+    emitted = 0
+    start = 0
+    while emitted < edges:
+        ids = np.arange(start, start + BLOCK, dtype=np.int64)
+        start += BLOCK
+        a, b, line, horizontal, valid = grid.candidates(ids)
+        if layout == "organic":
+            valid &= unit(seed, ids, 6) >= 0.15
+        keep = np.flatnonzero(valid)[: edges - emitted]
+        emitted += len(keep)
+        ids, a, b, line, horizontal = (
+            ids[keep],
+            a[keep],
+            b[keep],
+            line[keep],
+            horizontal[keep],
+        )
+        if not len(ids):
+            continue
+
+        highway = _highway(line, ids, seed)
+        pick = unit(seed, ids, 7)
+        oneway = np.where(
+            (highway == "residential") & (unit(seed, ids, 8) < 0.1), "yes", "no"
+        )
+        modified = deleted = np.zeros(len(ids), dtype=bool)
+        reshaped = modified
+        if change_ratio:
+            u = unit(update_seed, ids, 9)
+            modified = u < change_ratio / 2
+            reshaped = u < change_ratio / 4
+            deleted = (u >= change_ratio / 2) & (u < change_ratio * 0.75)
+        coords = _coords(grid, a, b, ids, seed)
+
+        for k in range(len(ids)):
+            if deleted[k]:
+                continue
+            lanes_choices, maxspeed = CLASSES[highway[k]]
+            lanes = lanes_choices[int(pick[k] * len(lanes_choices))]
+            pts = coords[k]
+            if modified[k]:
+                maxspeed += 10
+                lanes += 1
+            if reshaped[k]:
+                mid = (pts[0] + pts[-1]) / 2 + np.array([0.00002, 0.00002])
+                pts = np.vstack([pts[:1], mid, pts[-1:]])
+            street = "Street" if horizontal[k] else "Avenue"
+            props = _props(
+                highway[k],
+                lanes,
+                maxspeed,
+                str(oneway[k]),
+                f"{street} {int(line[k])}",
+            )
+            yield _feature(int(ids[k]), props, pts)
+
+    if change_ratio:
+        # new diagonal service roads, numbered after every candidate edge
+        added = int(round(edges * change_ratio / 4))
+        base = grid.rows * grid.per_row
+        for s in range(0, added, BLOCK):
+            ids = np.arange(s, min(added, s + BLOCK), dtype=np.int64)
+            nodes = (unit(update_seed, ids, 10) * (grid.rows - 1) * grid.cols).astype(
+                np.int64
+            )
+            nodes -= (nodes % grid.cols == grid.cols - 1).astype(np.int64)
+            ax, ay = grid.nodes(nodes)
+            bx, by = grid.nodes(nodes + grid.cols + 1)
+            props = _props("service", 1, 20, "no", "")
+            for k in range(len(ids)):
+                yield _feature(
+                    base + int(ids[k]),
+                    props,
+                    ((ax[k], ay[k]), (bx[k], by[k])),
+                )
+
+
+def _open(path):
+    if path == "-":
+        return sys.stdout.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, "wb", compresslevel=3)
+    if path.endswith(".zst"):
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"))
+    return open(path, "wb")
+
+
+def write_network(path, edges, layout="grid", seed=1, change_ratio=0.0, update_seed=2):
+
+    # Write the FeatureCollection to path; returns the number of features
+
+    name = f"synthetic-{layout}-{edges}-s{seed}"
+    if change_ratio:
+        name += f"-u{update_seed}-r{change_ratio:g}"
+    count = 0
+    fh = _open(path)
+    try:
+        fh.write(
+            f'{{"type":"FeatureCollection","name":"{name}","features":[\n'.encode()
+        )
+        buf = []
+        for feat in iter_features(edges, layout, seed, change_ratio, update_seed):
+            if count:
+                buf.append(",\n")
+            buf.append(feat)
+            count += 1
+            if len(buf) >= 2 * BLOCK:
+                fh.write("".join(buf).encode())
+                buf.clear()
+        buf.append("\n]}\n")
+        fh.write("".join(buf).encode())
+    finally:
+        if fh is not sys.stdout.buffer:
+            fh.close()
+    return count
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--edges", type=int, default=10000)
+    ap.add_argument("--layout", choices=("grid", "organic"), default="grid")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument(
+        "--change-ratio",
+        type=float,
+        default=0.0,
+        help="write the update variant with this share of edges changed",
+    )
+    ap.add_argument("--update-seed", type=int, default=2)
+    ap.add_argument("--out", default="-", help="path (.gz/.zst compress) or -")
+    args = ap.parse_args()
+    count = write_network(
+        args.out,
+        args.edges,
+        args.layout,
+        args.seed,
+        args.change_ratio,
+        args.update_seed,
+    )
+    if args.out != "-":
+        print(f"{count} features -> {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+#!/bin/bash
+# Runs once when the primary's data directory is initialized: lets the
+# db-replica service (docker compose --profile replica) stream from it.
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# app.db needs a URL at import time but never connects unless a query runs;
+# normalization stays in-process so tests don't spawn worker pools
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/road_networks_test")
+os.environ.setdefault("INGEST_NORMALIZE_WORKERS", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,82 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import auth, db as app_db
+from app.main import app
+
+KEY = "key-123"
+CUSTOMER = "00000000-0000-0000-0000-000000000001"
+
+
+class _Result:
+    def __init__(self, value=None, rowcount=0):
+        self.value = value
+        self.rowcount = rowcount
+
+    def scalar_one_or_none(self):
+        return self.value
+
+
+class _Keys:
+    """Session stand-in holding the api_keys table as a dict."""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.lookups = 0
+
+    def execute(self, stmt, params):
+        sql = str(stmt)
+        if sql.lstrip().startswith("DELETE"):
+            return _Result(
+                rowcount=int(self.keys.pop(params["hash"], None) is not None)
+            )
+        self.lookups += 1
+        return _Result(self.keys.get(params["hash"]))
+
+    def get_bind(self):
+        return app_db.engine
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client():
+    keys = _Keys({auth.hash_api_key(KEY): CUSTOMER})
+
+    def session():
+        yield keys
+
+    auth.invalidate_api_key()
+    app.dependency_overrides[app_db.get_db] = session
+    app.dependency_overrides[app_db.get_read_db] = session
+    yield TestClient(app), keys
+    app.dependency_overrides.clear()
+    auth.invalidate_api_key()
+
+
+def test_revoked_key_is_rejected_before_the_cache_ttl(client):
+    client, keys = client
+    headers = {"X-API-Key": KEY}
+    assert auth.withApiAuth(KEY, keys) == CUSTOMER
+    assert auth.withApiAuth(KEY, keys) == CUSTOMER
+    assert keys.lookups == 1  # served from the cache
+
+    assert client.delete("/api-keys/current", headers=headers).status_code == 204
+    assert not keys.keys
+    r = client.delete("/api-keys/current", headers=headers)
+    assert r.status_code == 401
+
+
+def test_invalidate_drops_a_cached_key(client):
+    _, keys = client
+    assert auth.withApiAuth(KEY, keys) == CUSTOMER
+    keys.keys.clear()  # revoked directly in the database
+    assert auth.withApiAuth(KEY, keys) == CUSTOMER  # still cached
+    auth.invalidate_api_key(auth.hash_api_key(KEY))
+    with pytest.raises(auth.HTTPException) as exc:
+        auth.withApiAuth(KEY, keys)
+    assert exc.value.status_code == 401
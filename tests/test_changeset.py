@@ -0,0 +1,87 @@
+import uuid
+
+import pytest
+
+from app.changeset import InvalidChangeset, parse_changeset
+
+EDGE = str(uuid.uuid4())
+OTHER = str(uuid.uuid4())
+
+
+def _line(coords):
+    return {"type": "LineString", "coordinates": coords}
+
+
+def _feature(coords, **props):
+    return {"type": "Feature", "properties": props, "geometry": _line(coords)}
+
+
+def _errors(**kwargs):
+    with pytest.raises(InvalidChangeset) as exc:
+        parse_changeset(**kwargs)
+    return exc.value.errors
+
+
+def test_valid_changeset_is_normalized():
+    cs = parse_changeset(
+        add=[_feature([[0, 0], [0, 0], [1, 1]], highway="service")],
+        remove=[EDGE.upper()],
+        modify=[
+            {"id": OTHER, "geometry": _line([[2, 2], [3, 3]])},
+            {"id": str(uuid.uuid4()), "properties": {"lanes": 2}},
+        ],
+        precision=None,
+        repair=True,
+    )
+    assert cs.added == [(_line([[0.0, 0.0], [1.0, 1.0]]), {"highway": "service"})]
+    assert cs.repaired == 1
+    assert cs.removed == [EDGE]
+    assert cs.modified[0] == (OTHER, _line([[2.0, 2.0], [3.0, 3.0]]), None)
+    assert cs.modified[1][1:] == (None, {"lanes": 2})
+    assert cs.changed_ids() == [EDGE, OTHER, cs.modified[1][0]]
+
+
+def test_empty_changeset():
+    with pytest.raises(InvalidChangeset, match="Empty"):
+        parse_changeset(None, [], None)
+
+
+def test_too_many_entries():
+    with pytest.raises(InvalidChangeset, match="More than 2"):
+        parse_changeset(None, [EDGE, OTHER, str(uuid.uuid4())], None, max_entries=2)
+
+
+def test_every_problem_is_reported():
+    errors = _errors(
+        add=[_feature([[0, 0], [500, 0]]), {"type": "Feature", "geometry": None}],
+        remove=["not-a-uuid", EDGE],
+        modify=[
+            "x",
+            {"id": EDGE, "properties": {}},
+            {"id": OTHER},
+            {"id": str(uuid.uuid4()), "properties": []},
+            {"id": str(uuid.uuid4()), "geometry": {"type": "Point"}},
+            {"id": str(uuid.uuid4()), "geometry": _line([[1, 1], [1, 1]])},
+        ],
+    )
+    assert errors == [
+        {"add": 0, "error": "Coordinates out of lon/lat range"},
+        {"add": 1, "error": "Feature has no geometry"},
+        {"remove": 0, "error": "not an edge id"},
+        {"modify": 0, "error": "must be an object"},
+        {"modify": 1, "error": "edge changed twice"},
+        {"modify": 2, "error": "needs geometry or properties"},
+        {"modify": 3, "error": "properties must be an object"},
+        {"modify": 4, "error": "geometry must be a LineString"},
+        {"modify": 5, "error": "Degenerate line (fewer than 2 distinct points)"},
+    ]
+
+
+def test_repeated_points_rejected_without_repair():
+    errors = _errors(
+        add=[_feature([[0, 0], [0, 0], [1, 1]])],
+        remove=None,
+        modify=None,
+        repair=False,
+    )
+    assert errors == [{"add": 0, "error": "Repeated consecutive points"}]
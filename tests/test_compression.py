@@ -0,0 +1,165 @@
+import gzip
+import io
+
+import pytest
+import zstandard
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app import compression
+from app.compression import (
+    RequestDecompressionMiddleware,
+    StreamDecoder,
+    decode,
+    open_decompressed,
+)
+from app.response_cache import etag_matches, validator_headers
+from app.services import GeoJSONParseError, iter_geojson_features
+
+PAYLOAD = b'{"type": "FeatureCollection", "features": []}\n' * 2000
+
+
+def _frames(encoding, parts=3):
+    step = len(PAYLOAD) // parts + 1
+    pieces = [PAYLOAD[i : i + step] for i in range(0, len(PAYLOAD), step)]
+    if encoding == "gzip":
+        return b"".join(gzip.compress(p) for p in pieces)
+    cctx = zstandard.ZstdCompressor()
+    return b"".join(cctx.compress(p) for p in pieces)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_stream_decoder_reads_every_member_or_frame(encoding):
+    data = _frames(encoding)
+    dec = StreamDecoder(encoding)
+    out = b""
+    for i in range(0, len(data), 100):
+        out += dec.decompress(data[i : i + 100])
+    dec.finish()
+    assert out == PAYLOAD
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_stream_decoder_bounds_output_per_call(encoding):
+    bomb = (gzip.compress if encoding == "gzip" else zstandard.compress)(
+        b"\0" * (256 << 20)
+    )
+    dec = StreamDecoder(encoding)
+    pieces = [dec.decompress(bomb, 1 << 16)]
+    while dec.pending:
+        pieces.append(len(dec.decompress(b"", 1 << 16)))
+    pieces[0] = len(pieces[0])
+    dec.finish()
+    assert sum(pieces) == 256 << 20
+    # gzip stops at max_length; zstd within what one input step can decode to
+    assert max(pieces) <= (1 << 16 if encoding == "gzip" else 32 << 20)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_stream_decoder_rejects_truncated_input(encoding):
+    dec = StreamDecoder(encoding)
+    dec.decompress(_frames(encoding)[:-10])
+    with pytest.raises(ValueError, match="Truncated"):
+        dec.finish()
+
+
+def test_decode_multi_frame_zstd():
+    assert decode(_frames("zstd"), "zstd") == PAYLOAD
+
+
+def test_open_decompressed_limit(monkeypatch):
+    monkeypatch.setattr(compression, "UPLOAD_MAX_DECOMPRESSED_BYTES", 1000)
+    fh = open_decompressed(io.BytesIO(_frames("zstd")))
+    with pytest.raises(compression.DecompressedTooLarge):
+        while fh.read(256):
+            pass
+
+
+def _client():
+    app = FastAPI()
+    app.add_middleware(RequestDecompressionMiddleware)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.body()
+        return {"size": len(body), "ok": body == PAYLOAD}
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_middleware_decodes_concatenated_bodies(encoding):
+    r = _client().post(
+        "/echo", content=_frames(encoding), headers={"Content-Encoding": encoding}
+    )
+    assert r.status_code == 200
+    assert r.json() == {"size": len(PAYLOAD), "ok": True}
+
+
+def test_middleware_rejects_bombs(monkeypatch):
+    monkeypatch.setattr(compression, "UPLOAD_MAX_DECOMPRESSED_BYTES", 1 << 20)
+    bomb = zstandard.compress(b"\0" * (64 << 20))
+    r = _client().post("/echo", content=bomb, headers={"Content-Encoding": "zstd"})
+    assert r.status_code == 413
+
+
+def test_middleware_rejects_truncated_body():
+    r = _client().post(
+        "/echo",
+        content=_frames("gzip")[:-10],
+        headers={"Content-Encoding": "gzip"},
+    )
+    assert r.status_code == 400
+
+
+def test_coded_variants_get_weak_etags():
+    assert validator_headers("v1")["ETag"] == '"v1"'
+    assert validator_headers("v1", "fgb")["ETag"] == '"v1.fgb"'
+    etag = validator_headers("v1", encoding="gzip")["ETag"]
+    assert etag == 'W/"v1.gzip"'
+    assert etag_matches('W/"v1.gzip"', etag)
+    assert etag_matches('"v1.gzip"', etag)
+    assert not etag_matches('W/"v1.zstd"', etag)
+
+
+def _upload(encoding):
+    if encoding == "gzip":
+        return gzip.compress(PAYLOAD)
+    return zstandard.ZstdCompressor().compress(PAYLOAD)
+
+
+def _read_all(fh):
+    out = b""
+    while True:
+        chunk = fh.read(256)
+        if not chunk:
+            return out
+        out += chunk
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_open_decompressed_reads_whole_upload(encoding):
+    assert _read_all(open_decompressed(io.BytesIO(_frames(encoding)))) == PAYLOAD
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_open_decompressed_rejects_truncated_upload(encoding):
+    fh = open_decompressed(io.BytesIO(_upload(encoding)[:-10]))
+    with pytest.raises(ValueError):
+        _read_all(fh)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_open_decompressed_rejects_corrupt_upload(encoding):
+    data = bytearray(_upload(encoding))
+    data[12:40] = b"\xff" * 28
+    fh = open_decompressed(io.BytesIO(bytes(data)))
+    with pytest.raises(ValueError):
+        _read_all(fh)
+
+
+def test_corrupt_upload_is_a_parse_error():
+    body = gzip.compress(b'{"type": "FeatureCollection", "features": []}')
+    fh = open_decompressed(io.BytesIO(body[:20] + b"\xff" * 20))
+    with pytest.raises(GeoJSONParseError):
+        list(iter_geojson_features(fh.read))
@@ -0,0 +1,61 @@
+import gc
+import io
+
+import pyarrow.parquet as pq
+import pytest
+import shapely
+
+from app import export
+
+
+class _Result:
+    def __init__(self, partitions):
+        self._partitions = partitions
+
+    def partitions(self):
+        for rows in self._partitions:
+            if isinstance(rows, Exception):
+                raise rows
+            yield rows
+
+
+class _Session:
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.closed = False
+
+    def execute(self, *args, **kwargs):
+        return _Result(self.partitions)
+
+    def close(self):
+        self.closed = True
+
+
+def _rows(start, n):
+    wkb = shapely.to_wkb(shapely.LineString([(0, 0), (1, 1)]))
+    return [(f"e{i}", wkb, '{"highway": "service"}') for i in range(start, start + n)]
+
+
+def _export(monkeypatch, partitions):
+    session = _Session(partitions)
+    monkeypatch.setattr(export, "open_session", lambda bind=None: session)
+    return session, export.iter_geoparquet("true", {}, row_group_size=2)
+
+
+def test_geoparquet_row_groups(monkeypatch):
+    session, chunks = _export(monkeypatch, [_rows(0, 3), _rows(3, 2)])
+    table = pq.read_table(io.BytesIO(b"".join(chunks)))
+    assert table.column("id").to_pylist() == [f"e{i}" for i in range(5)]
+    assert session.closed
+
+
+def test_geoparquet_error_is_not_masked_by_footer(monkeypatch):
+    session, chunks = _export(monkeypatch, [_rows(0, 3), RuntimeError("db gone")])
+    body = b""
+    with pytest.raises(RuntimeError, match="db gone"):
+        for chunk in chunks:
+            body += chunk
+    gc.collect()
+    assert session.closed
+    # no footer: the truncated body is not a readable Parquet file
+    assert not body.endswith(b"PAR1")
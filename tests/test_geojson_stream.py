@@ -0,0 +1,125 @@
+import io
+import json
+
+import pytest
+
+from app.services import GeoJSONParseError, _iter_raw_features, iter_geojson_features
+
+
+def _features(n=3):
+    return [
+        {
+            "type": "Feature",
+            "properties": {"name": f"Straße {i} – ünïcödé ✓", "lanes": i, "ok": True},
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[11.5 + i * 0.001, 48.1], [11.5 + i * 0.001, 48.1001]],
+            },
+        }
+        for i in range(n)
+    ]
+
+
+def _doc(features, **members):
+    return json.dumps(
+        {"type": "FeatureCollection", **members, "features": features},
+        ensure_ascii=False,
+        indent=1,
+    ).encode("utf-8")
+
+
+def _raw(data, chunk_size):
+    header = {}
+    return list(_iter_raw_features(io.BytesIO(data).read, chunk_size, header)), header
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 13, 64, 1 << 16])
+def test_every_chunk_boundary_parses_like_json_loads(chunk_size):
+    # chunk size 1 splits every token and every multi-byte UTF-8 sequence
+    features = _features()
+    data = _doc(features, name="net", crs=None)
+    got, header = _raw(data, chunk_size)
+    assert got == features
+    assert header == {"type": "FeatureCollection", "name": "net", "crs": None}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4096])
+def test_numbers_and_literals_split_at_chunk_end(chunk_size):
+    features = [{"type": "Feature", "properties": {"a": 12345.678e-3, "b": False}}]
+    data = (
+        b'{"type":"FeatureCollection","features":'
+        + json.dumps(features, separators=(",", ":")).encode()
+        + b"}"
+    )
+    assert _raw(data, chunk_size)[0] == features
+
+
+def test_members_after_features_and_empty_features():
+    data = b'{"features": [], "type": "FeatureCollection", "name": "x"}'
+    got, header = _raw(data, 4)
+    assert got == []
+    assert header["name"] == "x"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+@pytest.mark.parametrize("cut", [1, 10, 45, 80, -30, -2, -1])
+def test_truncated_input_is_rejected(chunk_size, cut):
+    data = _doc(_features(2))[:cut]
+    with pytest.raises(GeoJSONParseError):
+        _raw(data, chunk_size)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"[]",
+        b'{"type": "Feature"}',
+        b'{"type": "FeatureCollection", "features": [1 2]}',
+        b'{"type": "FeatureCollection", "features": []} trailing',
+        b'{"type": "FeatureCollection" "features": []}',
+        b'{"type": "FeatureCollection", "features": [tru]}',
+        b'{"type": "FeatureCollection", "features": ["\xff"]}',
+    ],
+)
+def test_invalid_json_is_rejected(data):
+    with pytest.raises(GeoJSONParseError):
+        _raw(data, 3)
+
+
+def test_multibyte_character_cut_at_end_of_input():
+    # the last byte of a 3-byte character is missing
+    data = _doc(_features(1)).replace(b"]\n}", b"") + "✓".encode()[:2]
+    with pytest.raises(GeoJSONParseError):
+        _raw(data, 2)
+
+
+def test_iter_geojson_features_explodes_and_reports_rejections():
+    features = _features(2) + [
+        {"type": "Feature", "properties": {}, "geometry": {"type": "Point"}},
+        {
+            "type": "Feature",
+            "properties": {"m": 1},
+            "geometry": {
+                "type": "MultiLineString",
+                "coordinates": [[[0, 0], [1, 1]], [[2, 2], [3, 3]]],
+            },
+        },
+    ]
+    from app.normalize import IngestReport
+
+    report = IngestReport()
+    edges = list(iter_geojson_features(io.BytesIO(_doc(features)).read, 5, report))
+    assert len(edges) == 4
+    assert edges[-1] == (
+        {"type": "LineString", "coordinates": [[2, 2], [3, 3]]},
+        {"m": 1},
+    )
+    assert report.rejected == 1
+    assert report.errors[0]["feature"] == 2
+
+
+def test_iter_geojson_features_without_valid_features():
+    data = _doc([{"type": "Feature", "properties": {}, "geometry": None}])
+    with pytest.raises(GeoJSONParseError, match="No valid"):
+        list(iter_geojson_features(io.BytesIO(data).read, 16))
@@ -0,0 +1,92 @@
+import math
+
+import pytest
+
+from app.normalize import normalize_chunk
+
+
+def _feature(coords, gtype="LineString", **props):
+    return {
+        "type": "Feature",
+        "properties": props,
+        "geometry": {"type": gtype, "coordinates": coords},
+    }
+
+
+def _run(features, crs=None, precision=None, repair=True):
+    return normalize_chunk(list(enumerate(features)), crs, precision, repair)
+
+
+def test_valid_lines_pass_unchanged():
+    edges, errors, repaired = _run([_feature([[11.5, 48.1], [11.6, 48.2]], a=1)])
+    assert edges == [
+        ({"type": "LineString", "coordinates": [[11.5, 48.1], [11.6, 48.2]]}, {"a": 1})
+    ]
+    assert errors == []
+    assert repaired == 0
+
+
+def test_multilinestring_is_exploded():
+    coords = [[[0, 0], [1, 1]], [[2, 2], [3, 3]]]
+    edges, errors, _ = _run([_feature(coords, "MultiLineString")])
+    assert [e[0]["coordinates"] for e in edges] == [[[0, 0], [1, 1]], [[2, 2], [3, 3]]]
+
+
+@pytest.mark.parametrize(
+    "feature, error",
+    [
+        ({"type": "Feature", "geometry": None}, "no geometry"),
+        (_feature([[0, 0], [1, 1]], "Point"), "Unsupported geometry type"),
+        (_feature([[0, 0]]), "at least 2 positions"),
+        (_feature([["a", 0], [1, 1]]), "Invalid coordinates"),
+        (_feature([[0, 0], [math.inf, 1]]), "finite"),
+        (_feature([[0, 0], [200, 1]]), "out of lon/lat range"),
+        (_feature([[1, 1], [1, 1]]), "Degenerate"),
+        ([1, 2], "Not a GeoJSON Feature"),
+    ],
+)
+def test_rejections(feature, error):
+    edges, errors, _ = _run([_feature([[0, 0], [1, 1]]), feature])
+    assert len(edges) == 1
+    assert len(errors) == 1
+    assert errors[0][0] == 1
+    assert error in errors[0][1]
+
+
+def test_multilinestring_is_rejected_as_a_whole():
+    coords = [[[0, 0], [1, 1]], [[0, 0], [500, 1]]]
+    edges, errors, _ = _run([_feature(coords, "MultiLineString")])
+    assert edges == []
+    assert errors == [(0, "Coordinates out of lon/lat range")]
+
+
+def test_repeated_points_are_repaired_or_rejected():
+    line = [[0, 0], [0, 0], [1, 1]]
+    edges, errors, repaired = _run([_feature(line)])
+    assert edges[0][0]["coordinates"] == [[0, 0], [1, 1]]
+    assert (errors, repaired) == ([], 1)
+
+    edges, errors, repaired = _run([_feature(line)], repair=False)
+    assert edges == []
+    assert errors == [(0, "Repeated consecutive points")]
+
+
+def test_points_that_coincide_after_quantization_follow_the_repair_rule():
+    line = [[11.50000001, 48.1], [11.50000002, 48.1], [11.6, 48.2]]
+    edges, errors, repaired = _run([_feature(line)], precision=7)
+    assert edges[0][0]["coordinates"] == [[11.5, 48.1], [11.6, 48.2]]
+    assert (errors, repaired) == ([], 1)
+
+    edges, errors, repaired = _run([_feature(line)], precision=7, repair=False)
+    assert edges == []
+    assert errors == [(0, "Repeated consecutive points")]
+
+
+def test_reprojection_from_web_mercator():
+    edges, errors, _ = _run(
+        [_feature([[0, 0], [111319.49079327357, 0]])], crs="EPSG:3857"
+    )
+    assert errors == []
+    (x1, y1), (x2, y2) = edges[0][0]["coordinates"]
+    assert (x1, y1) == pytest.approx((0, 0))
+    assert (x2, y2) == pytest.approx((1, 0))
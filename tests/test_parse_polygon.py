@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from app.services import parse_polygon
+
+
+def _polygon(ring):
+    return json.dumps({"type": "Polygon", "coordinates": [ring]})
+
+
+def test_valid_polygon_is_returned_compact():
+    raw = _polygon([[0, 0], [1, 0], [1, 1], [0, 0]])
+    assert parse_polygon(raw) == raw.replace(" ", "")
+
+
+@pytest.mark.parametrize(
+    "raw, message",
+    [
+        ("not json", "GeoJSON geometry"),
+        ('{"type": "Point", "coordinates": [0, 0]}', "Polygon or MultiPolygon"),
+        ('{"type": "MultiPolygon"}', "malformed"),
+        ('{"type": "Polygon", "coordinates": [[[0, 0], [1]]]}', "malformed"),
+        ('{"type": "Polygon", "coordinates": []}', "empty"),
+        (_polygon([[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]), "Self-intersection"),
+    ],
+)
+def test_invalid_polygons_raise_value_error(raw, message):
+    with pytest.raises(ValueError, match=message):
+        parse_polygon(raw)
@@ -0,0 +1,37 @@
+from app import db as app_db
+
+A = "00000000-0000-0000-0000-00000000000a"
+B = "00000000-0000-0000-0000-00000000000b"
+
+
+def _primary(monkeypatch, versions):
+    calls = []
+
+    def latest_versions(ids):
+        calls.append(list(ids))
+        return {nid: versions[nid] for nid in ids if nid in versions}
+
+    monkeypatch.setattr(app_db, "_latest_versions", latest_versions)
+    monkeypatch.setattr(app_db, "_latest", app_db.TTLCache(100, 60))
+    return calls
+
+
+def test_latest_versions_are_asked_once_per_network(monkeypatch):
+    calls = _primary(monkeypatch, {A: "v1"})
+    assert app_db._cached_latest_versions([A, B]) == ["v1"]
+    assert app_db._cached_latest_versions([A, B]) == ["v1"]
+    assert app_db._cached_latest_versions([A]) == ["v1"]
+    assert calls == [[A, B]]
+
+
+def test_a_write_drops_the_cached_version(monkeypatch):
+    versions = {A: "v1"}
+    calls = _primary(monkeypatch, versions)
+    monkeypatch.setattr(app_db, "replica_engines", [object()])
+    monkeypatch.setattr(app_db, "_recent_writes", app_db.TTLCache(100, 60))
+    monkeypatch.setattr(app_db, "_last_write", app_db._last_write)
+    app_db._cached_latest_versions([A])
+    versions[A] = "v2"
+    app_db.note_write(A)
+    assert app_db._cached_latest_versions([A]) == ["v2"]
+    assert calls == [[A], [A]]
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from app import response_cache
+from app.cache import BytesLRU, DiskCache
+
+
+@pytest.fixture
+def small_cache(tmp_path, monkeypatch):
+    disk = DiskCache(str(tmp_path), 100)
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_MAX_BYTES", 100)
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_ENTRY_MAX_BYTES", 10)
+    monkeypatch.setattr(response_cache, "_disk", disk)
+    monkeypatch.setattr(response_cache, "memory", BytesLRU(100))
+    return disk
+
+
+def _tee(version_id, chunks):
+    return list(response_cache.tee_into_cache(version_id, iter(chunks)))
+
+
+def test_small_body_is_kept_in_memory(small_cache):
+    assert _tee("v1", [b"abc", b"def"]) == [b"abc", b"def"]
+    assert response_cache.memory.get(("v1", "identity")) == b"abcdef"
+    assert os.listdir(small_cache.directory) == []
+
+
+def test_large_body_is_spooled_to_disk(small_cache):
+    chunks = [b"x" * 8, b"y" * 8, b"z" * 8]
+    assert _tee("v2", chunks) == chunks
+    assert response_cache.memory.get(("v2", "identity")) is None
+    assert os.listdir(small_cache.directory) == ["v2.identity"]
+    assert response_cache.cached_payload("v2", None) == b"".join(chunks)
+
+
+def test_body_over_disk_budget_is_not_cached(small_cache):
+    chunks = [b"x" * 60, b"y" * 60]
+    assert _tee("v3", chunks) == chunks
+    assert os.listdir(small_cache.directory) == []
+    assert response_cache.cached_payload("v3", None) is None
+
+
+def test_aborted_stream_leaves_no_spool(small_cache):
+    stream = response_cache.tee_into_cache("v4", iter([b"x" * 20, b"y" * 20]))
+    next(stream)
+    next(stream)
+    stream.close()
+    assert os.listdir(small_cache.directory) == []
+
+
+def test_large_body_is_not_buffered_without_disk(small_cache, monkeypatch):
+    monkeypatch.setattr(response_cache, "_disk", None)
+    chunks = [b"x" * 8, b"y" * 8, b"z" * 8]
+    assert _tee("v5", chunks) == chunks
+    assert response_cache.cached_payload("v5", None) is None
+    assert len(response_cache.memory) == 0
@@ -0,0 +1,91 @@
+import heapq
+import math
+import random
+import uuid
+
+import numpy as np
+import pytest
+
+from app.routing import RouteNotFound, assemble_graph
+
+
+def _grid(n=12, seed=7):
+    # n x n lattice around Munich with random lengths and some one-way streets
+    rng = random.Random(seed)
+    ids, coords, length, oneway = [], [], [], []
+    step = 0.001
+    for i in range(n):
+        for j in range(n):
+            x, y = 11.5 + i * step, 48.1 + j * step
+            for dx, dy in ((step, 0), (0, step)):
+                if (dx and i == n - 1) or (dy and j == n - 1):
+                    continue
+                ids.append(uuid.uuid4().bytes)
+                coords.append((x, y, x + dx, y + dy))
+                length.append(100 + rng.random() * 50)
+                oneway.append(rng.choice([0, 0, 0, 1, -1]))
+    return assemble_graph("v", ids, coords, length, oneway)
+
+
+def _dijkstra(graph, s, t):
+    dist = {s: 0.0}
+    heap = [(0.0, s)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u == t:
+            return d
+        if d > dist[u]:
+            continue
+        for v, w, _ in graph.forward.arcs(u):
+            if d + w < dist.get(v, math.inf):
+                dist[v] = d + w
+                heapq.heappush(heap, (d + w, v))
+    return None
+
+
+def test_bidirectional_search_matches_dijkstra():
+    graph = _grid()
+    rng = random.Random(1)
+    n = len(graph.lon)
+    for _ in range(60):
+        s, t = rng.randrange(n), rng.randrange(n)
+        expected = _dijkstra(graph, s, t)
+        if expected is None:
+            with pytest.raises(RouteNotFound):
+                graph.shortest_path(s, t)
+            continue
+        meters, arcs = graph.shortest_path(s, t)
+        assert meters == pytest.approx(expected)
+        # the arcs form a walk from s to t
+        v = s
+        for a in arcs:
+            lo, hi = graph.forward.indptr[v], graph.forward.indptr[v + 1]
+            step = [
+                h
+                for h, arc in zip(graph.forward.head[lo:hi], graph.forward.arc[lo:hi])
+                if arc == a
+            ]
+            assert step
+            v = int(step[0])
+        assert v == t
+
+
+def test_nearest_node_matches_linear_scan():
+    graph = _grid()
+    rng = random.Random(2)
+    for _ in range(200):
+        lon = 11.49 + rng.random() * 0.03
+        lat = 48.09 + rng.random() * 0.03
+        dx = (graph.lon - lon) * math.cos(math.radians(lat))
+        dy = graph.lat - lat
+        expected = np.min(dx * dx + dy * dy)
+        i = graph.nearest_node(lon, lat)
+        got = ((graph.lon[i] - lon) * math.cos(math.radians(lat))) ** 2 + (
+            graph.lat[i] - lat
+        ) ** 2
+        assert got == pytest.approx(expected)
+
+
+def test_same_node_is_an_empty_route():
+    graph = _grid(3)
+    assert graph.shortest_path(4, 4) == (0.0, [])
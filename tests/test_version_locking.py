@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from app.services import open_new_version
+
+# needs a migrated database: TEST_DATABASE_URL=postgresql://... pytest
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"
+)
+
+
+@pytest.fixture
+def sessions():
+    engine = sa.create_engine(TEST_DATABASE_URL, future=True)
+    Session = sessionmaker(bind=engine, future=True)
+    with engine.begin() as conn:
+        customer_id = conn.execute(
+            sa.text("INSERT INTO customers(name) VALUES (:n) RETURNING id"),
+            {"n": f"test-{uuid.uuid4()}"},
+        ).scalar_one()
+        network_id = conn.execute(
+            sa.text(
+                "INSERT INTO networks(customer_id, name) VALUES (:c, 'n') RETURNING id"
+            ),
+            {"c": customer_id},
+        ).scalar_one()
+    yield Session, str(network_id)
+    with engine.begin() as conn:
+        conn.execute(sa.text("DELETE FROM customers WHERE id = :c"), {"c": customer_id})
+    engine.dispose()
+
+
+def test_waiting_writer_starts_after_the_version_it_waited_for(sessions):
+    Session, network_id = sessions
+    first, second = Session(), Session()
+    try:
+        first_id, first_ts = open_new_version(first, network_id)
+
+        # the second writer blocks on the network row until the first commits
+        result = {}
+
+        def write():
+            try:
+                result["version"] = open_new_version(second, network_id)
+                second.commit()
+            except Exception as e:
+                second.rollback()
+                result["error"] = e
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        time.sleep(0.5)
+        assert thread.is_alive()
+        first.commit()
+        thread.join(10)
+
+        assert "error" not in result
+        second_id, second_ts = result["version"]
+        assert second_ts > first_ts
+        rows = first.execute(
+            sa.text(
+                """
+                SELECT id, valid_from, valid_to FROM network_versions
+                 WHERE network_id = :nid ORDER BY valid_from
+            """
+            ),
+            {"nid": network_id},
+        ).all()
+        assert [r.id for r in rows] == [first_id, second_id]
+        assert rows[0].valid_to == rows[1].valid_from
+        assert rows[1].valid_to is None
+    finally:
+        first.close()
+        second.close()